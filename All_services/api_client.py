@@ -1,9 +1,11 @@
 import httpx
 import os
 from dotenv import load_dotenv
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from fastapi import HTTPException, status
+from http_client import get_http_client
 from llm_service import LLMService
+import fake_llm
 import logging
 
 logger = logging.getLogger(__name__)
@@ -17,13 +19,13 @@ print(f"OpenAI API Key: {'Exists' if os.getenv('OPENAI_API_KEY') else 'Missing'}
 
 class AIService:
     @staticmethod
-    def enhance_resume_text(raw_text: str, job_description: str = "") -> str:
-        if not os.getenv("OPENAI_API_KEY"):
+    def enhance_resume_text(raw_text: str, job_description: str = "", bypass_cache: bool = False) -> str:
+        if not fake_llm.has_api_key("OPENAI_API_KEY"):
             logger.warning("OpenAI API key not configured - skipping enhancement")
             return raw_text
         try:
             prompt = f"Improve this resume for job application:\n{raw_text}\n\nJob Description: {job_description}\nKeep the original structure but enhance the wording."
-            return llm_service.generate_text(prompt, tone="professional")
+            return llm_service.generate_text(prompt, tone="professional", bypass_cache=bypass_cache)
         except Exception as e:
             logger.error(f"OpenAI service error: {str(e)}")
             return raw_text
@@ -42,17 +44,17 @@ class APIClient:
 
     async def get_user_profile(self, user_id: str) -> dict:
         try:
-            async with httpx.AsyncClient() as client:
-                profile_url = f"{self.profile_api}/get-profile/{user_id}"
-                response = await client.get(profile_url, timeout=self.timeout)
-                response.raise_for_status()
-                data = response.json()
-                resume_url = data.get("data", {}).get("resume")
-                if isinstance(resume_url, str):
-                    resume_response = await client.get(resume_url, timeout=self.timeout)
-                    resume_response.raise_for_status()
-                    data["data"]["resume_content"] = base64.b64encode(resume_response.content).decode()
-                return self._normalize_profile(data)
+            client = get_http_client()
+            profile_url = f"{self.profile_api}/get-profile/{user_id}"
+            response = await client.get(profile_url, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+            resume_url = data.get("data", {}).get("resume")
+            if isinstance(resume_url, str):
+                resume_response = await client.get(resume_url, timeout=self.timeout)
+                resume_response.raise_for_status()
+                data["data"]["resume_content"] = base64.b64encode(resume_response.content).decode()
+            return self._normalize_profile(data)
         except Exception as e:
             logger.error(f"Profile fetch failed: {str(e)}")
             return self._get_mock_profile(user_id)
@@ -95,18 +97,27 @@ class APIClient:
         }
 
     async def get_job_listing(self, job_id: str) -> Dict[str, Any]:
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(
-                    f"{self.job_api}/{job_id}",
-                    timeout=self.timeout
-                )
-                response.raise_for_status()
-                return response.json()
-            except httpx.HTTPStatusError as e:
-                raise HTTPException(
-                    status_code=status.HTTP_502_BAD_GATEWAY,
-                    detail=f"Job API error: {str(e)}"
-                )
+        client = get_http_client()
+        try:
+            response = await client.get(
+                f"{self.job_api}/{job_id}",
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPStatusError as e:
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail=f"Job API error: {str(e)}"
+            )
+
+    async def get_recent_job_listings(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Newest listings, used to pre-warm the job analysis cache"""
+        client = get_http_client()
+        response = await client.get(self.job_api, params={"limit": limit, "sort": "-createdAt"}, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        listings = data.get("data", []) if isinstance(data, dict) else data
+        return listings if isinstance(listings, list) else []
 
 api_client = APIClient()
\ No newline at end of file
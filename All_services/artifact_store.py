@@ -0,0 +1,126 @@
+import logging
+import os
+from abc import ABC, abstractmethod
+from io import BytesIO
+from typing import Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ArtifactStore(ABC):
+    """Where generated documents live; task results only carry the refs returned by put()"""
+
+    backend = "none"
+
+    @abstractmethod
+    def put(self, key: str, content: bytes, content_type: str) -> Dict:
+        ...
+
+    @abstractmethod
+    def size(self, key: str) -> int:
+        ...
+
+    @abstractmethod
+    def iter_range(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Yield bytes start..end (inclusive) of the artifact"""
+
+    def url(self, key: str) -> str:
+        return ""
+
+    def read(self, key: str) -> bytes:
+        return b"".join(self.iter_range(key))
+
+    def _ref(self, key: str, content: bytes, content_type: str) -> Dict:
+        return {
+            "backend": self.backend,
+            "key": key,
+            "size": len(content),
+            "content_type": content_type,
+            "url": self.url(key)
+        }
+
+
+class LocalArtifactStore(ArtifactStore):
+    backend = "local"
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, os.path.basename(key))
+
+    def put(self, key: str, content: bytes, content_type: str) -> Dict:
+        tmp_path = self._path(key) + ".part"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, self._path(key))
+        return self._ref(key, content, content_type)
+
+    def size(self, key: str) -> int:
+        return os.path.getsize(self._path(key))
+
+    def iter_range(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        with open(self._path(key), "rb") as f:
+            f.seek(start)
+            remaining = (end - start + 1) if end is not None else None
+            while remaining is None or remaining > 0:
+                chunk = f.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+
+class MinioArtifactStore(ArtifactStore):
+    backend = "minio"
+
+    def __init__(self, client, bucket: str, endpoint: str):
+        self.client = client
+        self.bucket = bucket
+        self.endpoint = endpoint
+        if not client.bucket_exists(bucket):
+            client.make_bucket(bucket)
+
+    def put(self, key: str, content: bytes, content_type: str) -> Dict:
+        self.client.put_object(self.bucket, key, BytesIO(content), length=len(content), content_type=content_type)
+        return self._ref(key, content, content_type)
+
+    def size(self, key: str) -> int:
+        return self.client.stat_object(self.bucket, key).size
+
+    def iter_range(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        length = (end - start + 1) if end is not None else 0
+        response = self.client.get_object(self.bucket, key, offset=start, length=length)
+        try:
+            yield from response.stream(CHUNK_SIZE)
+        finally:
+            response.close()
+            response.release_conn()
+
+    def url(self, key: str) -> str:
+        return f"http://{self.endpoint}/{self.bucket}/{key}"
+
+
+def build_artifact_store() -> ArtifactStore:
+    """MinIO when MINIO_* is configured, otherwise files under ARTIFACT_DIR"""
+    endpoint = os.getenv("MINIO_ENDPOINT")
+    if endpoint and os.getenv("MINIO_ACCESS_KEY") and os.getenv("MINIO_SECRET_KEY"):
+        try:
+            from minio import Minio
+            client = Minio(
+                endpoint,
+                access_key=os.getenv("MINIO_ACCESS_KEY"),
+                secret_key=os.getenv("MINIO_SECRET_KEY"),
+                secure=False  # Set to True if using HTTPS
+            )
+            return MinioArtifactStore(client, os.getenv("MINIO_BUCKET_NAME", "job-docs"), endpoint)
+        except Exception as e:
+            logger.error(f"MinIO artifact store unavailable, using local files: {str(e)}")
+    return LocalArtifactStore(os.getenv("ARTIFACT_DIR", "artifacts"))
+
+
+artifact_store = build_artifact_store()
@@ -0,0 +1,182 @@
+"""Bulk resume ingest: extract, parse and write structured profiles as JSONL.
+
+Usage:
+    python bulk_ingest.py resumes/ --output profiles.jsonl
+    python bulk_ingest.py resumes.jsonl --output profiles.jsonl --n-process 4 --extract-workers 8
+
+A source is either a directory of .pdf/.txt files or a JSONL file whose lines
+carry an "id" plus one of "content" (base64 CV bytes), "text" or "path".
+The output file doubles as the checkpoint: ids already present are skipped, so
+re-running the same command after a crash resumes where it stopped. Failed
+records go to a separate errors file (default: <output>.errors.jsonl, rewritten
+on every run) and are retried by the next run.
+"""
+import argparse
+import base64
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+from cv_cache import extract_pdf_text
+from resume_parser import ParsedResume, get_nlp
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_SUFFIXES = (".pdf", ".txt")
+
+
+def iter_records(source: str, done: Set[str]) -> Iterator[Dict]:
+    """Stream input records lazily, skipping ids already written to the output"""
+    if os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for filename in sorted(files):
+                if not filename.lower().endswith(SUPPORTED_SUFFIXES):
+                    continue
+                path = os.path.join(root, filename)
+                record_id = os.path.relpath(path, source)
+                if record_id not in done:
+                    yield {"id": record_id, "path": path}
+        return
+
+    with open(source, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            record["id"] = str(record.get("id", line_no))
+            if record["id"] not in done:
+                yield record
+
+
+def load_text(record: Dict) -> Tuple[str, Optional[str], Optional[str]]:
+    """Worker-side extraction; returns (id, text, error)"""
+    try:
+        if "text" in record:
+            return record["id"], record["text"], None
+        if "path" in record:
+            with open(record["path"], "rb") as f:
+                cv_bytes = f.read()
+        else:
+            cv_bytes = base64.b64decode(record["content"])
+        if cv_bytes.startswith(b'%PDF-'):
+            return record["id"], extract_pdf_text(cv_bytes), None
+        return record["id"], cv_bytes.decode("utf-8"), None
+    except Exception as e:
+        return record["id"], None, f"Text extraction failed: {str(e)}"
+
+
+def load_checkpoint(output_path: str) -> Set[str]:
+    """Collect finished ids from the output file, dropping a torn trailing line.
+
+    Error rows (written to the output by older versions) do not count as finished.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    valid_bytes = 0
+    with open(output_path, "rb") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+                if "error" not in row:
+                    done.add(row["id"])
+            except (ValueError, KeyError, TypeError):
+                break
+            valid_bytes += len(line)
+    if valid_bytes != os.path.getsize(output_path):
+        logger.warning(f"Truncating partial record at byte {valid_bytes} of {output_path}")
+        with open(output_path, "r+b") as f:
+            f.truncate(valid_bytes)
+    return done
+
+
+def extracted_texts(records: Iterator[Dict], pool: ProcessPoolExecutor, window: int, failures: list):
+    """Extract text in bounded windows so the whole source is never held in memory"""
+    while True:
+        chunk = list(islice(records, window))
+        if not chunk:
+            return
+        for record_id, text, error in pool.map(load_text, chunk, chunksize=max(1, window // 32)):
+            if error or not (text or "").strip():
+                failures.append({"id": record_id, "error": error or "Empty resume text"})
+            else:
+                yield text, record_id
+
+
+def run(source: str, output_path: str, n_process: int = 1, batch_size: int = 64,
+        extract_workers: int = os.cpu_count() or 1, window: int = 512,
+        errors_path: Optional[str] = None) -> Dict:
+    errors_path = errors_path or f"{output_path}.errors.jsonl"
+    done = load_checkpoint(output_path)
+    if done:
+        print(f"Resuming: {len(done)} documents already in {output_path}")
+
+    failures = []
+    processed = errors = 0
+    started = time.perf_counter()
+    with open(output_path, "a", encoding="utf-8") as out, \
+            open(errors_path, "w", encoding="utf-8") as errors_out, \
+            ProcessPoolExecutor(max_workers=extract_workers) as pool:
+
+        def write(row: Dict):
+            out.write(json.dumps(row) + "\n")
+
+        def write_error(row: Dict):
+            errors_out.write(json.dumps(row) + "\n")
+
+        texts = extracted_texts(iter_records(source, done), pool, window, failures)
+        docs = get_nlp().pipe(texts, as_tuples=True, n_process=n_process, batch_size=batch_size)
+        for doc, record_id in docs:
+            parsed = ParsedResume(doc.text, doc=doc)
+            write({"id": record_id, **parsed.to_dict()})
+            processed += 1
+            while failures:
+                write_error(failures.pop())
+                errors += 1
+            if processed % batch_size == 0:
+                out.flush()
+                os.fsync(out.fileno())
+                elapsed = time.perf_counter() - started
+                print(f"{processed} documents, {processed / elapsed:.1f} docs/s")
+        for failure in failures:
+            write_error(failure)
+            errors += 1
+        out.flush()
+        os.fsync(out.fileno())
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        "processed": processed,
+        "errors": errors,
+        "errors_file": errors_path,
+        "skipped": len(done),
+        "seconds": round(elapsed, 2),
+        "docs_per_second": round(processed / elapsed, 2) if elapsed else 0.0
+    }
+    print(json.dumps(summary))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-ingest resumes into structured profiles")
+    parser.add_argument("source", help="Directory of .pdf/.txt files or a JSONL file")
+    parser.add_argument("--output", required=True, help="JSONL output; also used as the checkpoint")
+    parser.add_argument("--n-process", type=int, default=1, help="spaCy nlp.pipe worker processes")
+    parser.add_argument("--batch-size", type=int, default=64, help="spaCy nlp.pipe batch size")
+    parser.add_argument("--extract-workers", type=int, default=os.cpu_count() or 1,
+                        help="Processes used for PDF text extraction")
+    parser.add_argument("--window", type=int, default=512,
+                        help="Records extracted per round trip to the extraction pool")
+    parser.add_argument("--errors", help="JSONL of failed records, retried on the next run "
+                                         "(default: <output>.errors.jsonl)")
+    args = parser.parse_args()
+    run(args.source, args.output, args.n_process, args.batch_size, args.extract_workers, args.window,
+        args.errors)
+
+
+if __name__ == "__main__":
+    main()
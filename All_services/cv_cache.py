@@ -0,0 +1,422 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO, StringIO
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from pdfminer.converter import TextConverter
+from pdfminer.layout import LAParams
+from pdfminer.pdfdevice import PDFTextDevice
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdffont import PDFUnicodeNotDefined
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdftypes import resolve1
+from pdfminer.utils import apply_matrix_rect
+
+logger = logging.getLogger(__name__)
+
+# Uploads above PDF_MAX_BYTES are rejected; pages past PDF_MAX_PAGES are not
+# extracted. With PDF_POOL_WORKERS > 0, documents of at least
+# PDF_POOL_MIN_PAGES pages are laid out in page ranges across a process pool.
+PDF_MAX_BYTES = int(os.getenv("PDF_MAX_BYTES", str(20 * 1024 * 1024)))
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "50"))
+PDF_POOL_WORKERS = int(os.getenv("PDF_POOL_WORKERS", "0"))
+PDF_POOL_MIN_PAGES = int(os.getenv("PDF_POOL_MIN_PAGES", "8"))
+
+# PDF_EXTRACTION_MODE picks how page text is assembled:
+# - full: pdfminer layout analysis (LAParams()), lines grouped into ordered boxes
+# - balanced: pdfminer line grouping without the box ordering pass (boxes_flow=None)
+# - fast: no layout objects at all; glyphs are joined into lines in content-stream order
+# - auto: fast, switching a page to full layout analysis when it has rotated
+#   text, looks multi-column, or its fast text looks garbled
+EXTRACTION_MODES = ("fast", "balanced", "full", "auto")
+PDF_EXTRACTION_MODE = os.getenv("PDF_EXTRACTION_MODE", "full")
+
+
+class PDFTooLarge(ValueError):
+    pass
+
+
+class ExtractionCache:
+    """Content-addressed cache of extracted CV text.
+
+    Entries are keyed by the SHA-256 of the decoded CV bytes, so the same resume
+    is only run through pdfminer once. Lookups go to an in-process LRU first
+    (bounded by entry count and total characters), then to Redis (bounded by TTL
+    and per-entry size), and only then to the extractor.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        max_bytes: int = 64 * 1024 * 1024,
+        redis_url: Optional[str] = None,
+        ttl: int = 7 * 24 * 3600,
+        max_entry_bytes: int = 2 * 1024 * 1024,
+        prefix: str = "cv_text",
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_entry_bytes = max_entry_bytes
+        self.prefix = prefix
+        self._local: "OrderedDict[str, str]" = OrderedDict()
+        self._local_bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {"local_hits": 0, "redis_hits": 0, "misses": 0, "evictions": 0}
+        self._observers: List[Callable[[str], None]] = []
+        self._redis = None
+        if redis_url:
+            try:
+                import redis
+                self._redis = redis.Redis.from_url(
+                    redis_url, socket_connect_timeout=0.5, socket_timeout=0.5
+                )
+            except Exception as e:
+                logger.warning(f"CV cache Redis tier disabled: {str(e)}")
+
+    @classmethod
+    def from_env(cls) -> "ExtractionCache":
+        return cls(
+            max_entries=int(os.getenv("CV_CACHE_MAX_ENTRIES", "256")),
+            max_bytes=int(os.getenv("CV_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+            redis_url=os.getenv("CV_CACHE_REDIS_URL", os.getenv("CELERY_RESULT_BACKEND")),
+            ttl=int(os.getenv("CV_CACHE_TTL", str(7 * 24 * 3600))),
+        )
+
+    @staticmethod
+    def key_for(cv_bytes: bytes) -> str:
+        return hashlib.sha256(cv_bytes).hexdigest()
+
+    def add_observer(self, observer: Callable[[str], None]):
+        """`observer("hit" | "miss")` is called for every lookup, e.g. to export metrics"""
+        self._observers.append(observer)
+
+    def _count(self, event: str):
+        with self._lock:
+            self._counters[event] += 1
+        if event != "evictions":
+            for observer in self._observers:
+                try:
+                    observer("miss" if event == "misses" else "hit")
+                except Exception as e:
+                    logger.debug(f"CV cache observer failed: {str(e)}")
+        if self._redis is not None:
+            try:
+                self._redis.hincrby(f"{self.prefix}:stats", event, 1)
+            except Exception as e:
+                logger.debug(f"CV cache stats update failed: {str(e)}")
+
+    def _store_local(self, key: str, text: str):
+        evicted = 0
+        with self._lock:
+            if key in self._local:
+                self._local_bytes -= len(self._local.pop(key))
+            self._local[key] = text
+            self._local_bytes += len(text)
+            while self._local and (
+                len(self._local) > self.max_entries or self._local_bytes > self.max_bytes
+            ):
+                _, old = self._local.popitem(last=False)
+                self._local_bytes -= len(old)
+                evicted += 1
+        for _ in range(evicted):
+            self._count("evictions")
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            text = self._local.get(key)
+            if text is not None:
+                self._local.move_to_end(key)
+        if text is not None:
+            self._count("local_hits")
+            return text
+
+        if self._redis is not None:
+            try:
+                raw = self._redis.get(f"{self.prefix}:{key}")
+            except Exception as e:
+                logger.warning(f"CV cache Redis read failed: {str(e)}")
+                raw = None
+            if raw is not None:
+                text = zlib.decompress(raw).decode("utf-8")
+                self._store_local(key, text)
+                self._count("redis_hits")
+                return text
+
+        self._count("misses")
+        return None
+
+    def set(self, key: str, text: str):
+        self._store_local(key, text)
+        if self._redis is None:
+            return
+        payload = zlib.compress(text.encode("utf-8"))
+        if len(payload) > self.max_entry_bytes:
+            return
+        try:
+            self._redis.set(f"{self.prefix}:{key}", payload, ex=self.ttl)
+        except Exception as e:
+            logger.warning(f"CV cache Redis write failed: {str(e)}")
+
+    def get_or_extract(self, cv_bytes: bytes, extractor: Callable[[bytes], str],
+                       key: Optional[str] = None) -> str:
+        """`key` lets callers that already hashed the bytes (e.g. blob-store refs) skip re-hashing"""
+        key = key or self.key_for(cv_bytes)
+        text = self.get(key)
+        if text is None:
+            text = extractor(cv_bytes)
+            self.set(key, text)
+        return text
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for this process plus the totals shared through Redis"""
+        with self._lock:
+            local = dict(self._counters, entries=len(self._local), bytes=self._local_bytes)
+        shared = {}
+        if self._redis is not None:
+            try:
+                shared = {
+                    k.decode(): int(v)
+                    for k, v in self._redis.hgetall(f"{self.prefix}:stats").items()
+                }
+            except Exception as e:
+                logger.warning(f"CV cache stats read failed: {str(e)}")
+        return {"process": local, "shared": shared}
+
+
+def _check_size(cv_bytes: bytes):
+    if len(cv_bytes) > PDF_MAX_BYTES:
+        raise PDFTooLarge(f"PDF is {len(cv_bytes)} bytes, the limit is {PDF_MAX_BYTES}")
+
+
+class _GlyphCollector(PDFTextDevice):
+    """Records (x, y, x_end, size, text) per glyph instead of building pdfminer layout objects"""
+
+    def begin_page(self, page, ctm):
+        x0, _, x1, _ = apply_matrix_rect(ctm, page.mediabox)
+        self.width = abs(x1 - x0)
+        self.glyphs: List[Tuple[float, float, float, float, str]] = []
+        self.rotated = 0
+
+    def render_char(self, matrix, font, fontsize, scaling, rise, cid, ncs, graphicstate) -> float:
+        try:
+            text = font.to_unichr(cid)
+        except PDFUnicodeNotDefined:
+            text = f"(cid:{cid})"
+        advance = font.char_width(cid) * fontsize * scaling
+        a, b, c, d, x, y = matrix
+        if b or c:
+            self.rotated += 1
+        self.glyphs.append((x, y, x + advance * a, abs(fontsize * d), text))
+        return advance
+
+
+def _join_glyphs(glyphs: List[Tuple[float, float, float, float, str]], width: float) -> Tuple[str, bool]:
+    """Page text from glyphs in stream order, and whether the page looked single-column.
+
+    A glyph starts a new line when the baseline moves by half a glyph height
+    or the pen jumps back; a gap wider than a tenth of the height is a space
+    (pdfminer's default word margin).
+    """
+    lines, line, starts = [], [], []
+    previous = None
+    for x, y, end, size, text in glyphs:
+        if previous is not None:
+            px, py, pend, psize = previous
+            if abs(y - py) > psize * 0.5 or x < px - psize:
+                lines.append("".join(line))
+                line = []
+                starts.append(x)
+            elif x - pend > psize * 0.1 and line[-1] != " " and text != " ":
+                line.append(" ")
+        line.append(text)
+        previous = (x, y, end, size or 1.0)
+    lines.append("".join(line))
+    indented = sum(1 for x in starts if x > width * 0.4)
+    single_column = len(starts) < 8 or indented <= len(starts) * 0.25
+    return "\n".join(lines) + "\n\f", single_column
+
+
+def _looks_garbled(text: str) -> bool:
+    """Undecodable glyphs, words run together or words spelled out letter by letter"""
+    words = text.split()
+    if len(words) < 20:
+        return False
+    single = sum(1 for word in words if len(word) == 1)
+    run_together = sum(1 for word in words if len(word) > 25)
+    return (
+        text.count("(cid:") > len(words) * 0.05
+        or single > len(words) * 0.3
+        or run_together > len(words) * 0.05
+    )
+
+
+class _AutoConverter(TextConverter):
+    """auto mode: pages are joined like fast mode, and a page that needs layout
+    analysis is analysed from the characters of the same interpreter pass"""
+
+    def __init__(self, resources: PDFResourceManager, output: StringIO):
+        super().__init__(resources, output, laparams=None)
+        self.collector = _GlyphCollector(resources)
+        self.full = LAParams()
+
+    def begin_page(self, page, ctm):
+        super().begin_page(page, ctm)
+        self.collector.begin_page(page, ctm)
+
+    def render_char(self, matrix, font, fontsize, scaling, rise, cid, ncs, graphicstate) -> float:
+        self.collector.render_char(matrix, font, fontsize, scaling, rise, cid, ncs, graphicstate)
+        return super().render_char(matrix, font, fontsize, scaling, rise, cid, ncs, graphicstate)
+
+    def end_page(self, page):
+        collector = self.collector
+        text, single_column = _join_glyphs(collector.glyphs, collector.width)
+        if single_column and not collector.rotated and not _looks_garbled(text):
+            self.pageno += 1
+            self.write_text(text)
+            return
+        logger.debug("Page layout is not simple; using full layout analysis")
+        self.cur_item.analyze(self.full)
+        self.pageno += 1
+        self.receive_layout(self.cur_item)
+
+
+def _iter_pages(cv_bytes: bytes, pagenos: Optional[Set[int]] = None, mode: str = "full",
+                max_pages: int = 0) -> Iterator[str]:
+    """One page of text at a time; full mode matches pdfminer's extract_text_to_fp.
+
+    Pages past `max_pages` (0: no limit) are never interpreted.
+    """
+    if mode not in EXTRACTION_MODES:
+        raise ValueError(f"Unknown PDF extraction mode: {mode}")
+    resources = PDFResourceManager(caching=True)
+    output = StringIO()
+    if mode == "fast":
+        device = _GlyphCollector(resources)
+    elif mode == "auto":
+        device = _AutoConverter(resources, output)
+    else:
+        device = TextConverter(
+            resources, output, laparams=LAParams(boxes_flow=None) if mode == "balanced" else LAParams()
+        )
+    interpreter = PDFPageInterpreter(resources, device)
+    try:
+        for page in PDFPage.get_pages(BytesIO(cv_bytes), pagenos, maxpages=max_pages, caching=True):
+            interpreter.process_page(page)
+            if mode == "fast":
+                yield _join_glyphs(device.glyphs, device.width)[0]
+                continue
+            text = output.getvalue()
+            output.seek(0)
+            output.truncate()
+            yield text
+    finally:
+        device.close()
+
+
+def iter_pdf_pages(cv_bytes: bytes, max_pages: Optional[int] = None, mode: Optional[str] = None) -> Iterator[str]:
+    """Yield page texts lazily; callers that stop iterating skip the remaining pages"""
+    _check_size(cv_bytes)
+    limit = PDF_MAX_PAGES if max_pages is None else min(max_pages, PDF_MAX_PAGES)
+    if limit <= 0:
+        return
+    produced = 0
+    for text in _iter_pages(cv_bytes, mode=mode or PDF_EXTRACTION_MODE, max_pages=limit):
+        produced += 1
+        yield text
+    if max_pages is None and produced == limit:
+        try:
+            if count_pdf_pages(cv_bytes) > limit:
+                logger.warning(f"PDF has more than {PDF_MAX_PAGES} pages; ignoring the rest")
+        except Exception as e:
+            logger.debug(f"PDF page count unavailable: {str(e)}")
+
+
+def count_pdf_pages(cv_bytes: bytes) -> int:
+    document = PDFDocument(PDFParser(BytesIO(cv_bytes)))
+    return int(resolve1(document.catalog["Pages"])["Count"])
+
+
+def _extract_page_range(cv_bytes: bytes, start: int, stop: int, mode: str) -> str:
+    return "".join(_iter_pages(cv_bytes, set(range(start, stop)), mode))
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _page_pool() -> Optional[ProcessPoolExecutor]:
+    """Shared layout pool, or None when disabled or inside a daemonic (e.g. prefork) worker"""
+    global _pool
+    if PDF_POOL_WORKERS <= 0 or multiprocessing.current_process().daemon:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a threaded worker or API process is not safe
+            _pool = ProcessPoolExecutor(PDF_POOL_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _extract_parallel(cv_bytes: bytes, mode: str) -> Optional[str]:
+    pool = _page_pool()
+    if pool is None:
+        return None
+    try:
+        pages = count_pdf_pages(cv_bytes)
+    except Exception as e:
+        logger.debug(f"PDF page count unavailable, extracting serially: {str(e)}")
+        return None
+    if pages < PDF_POOL_MIN_PAGES:
+        return None
+    if pages > PDF_MAX_PAGES:
+        logger.warning(f"PDF has {pages} pages; extracting the first {PDF_MAX_PAGES}")
+        pages = PDF_MAX_PAGES
+    chunk = -(-pages // PDF_POOL_WORKERS)
+    futures = [
+        pool.submit(_extract_page_range, cv_bytes, start, min(start + chunk, pages), mode)
+        for start in range(0, pages, chunk)
+    ]
+    return "".join(future.result() for future in futures)
+
+
+def _pdfminer_extract(cv_bytes: bytes, mode: Optional[str] = None) -> str:
+    mode = mode or PDF_EXTRACTION_MODE
+    _check_size(cv_bytes)
+    text = _extract_parallel(cv_bytes, mode)
+    if text is None:
+        text = "".join(iter_pdf_pages(cv_bytes, mode=mode))
+    return text
+
+
+extraction_cache = ExtractionCache.from_env()
+
+
+def extract_pdf_text(cv_bytes: bytes, key: Optional[str] = None, mode: Optional[str] = None) -> str:
+    """Extract text from PDF bytes, reusing earlier extractions of identical content.
+
+    Entries are cached per extraction mode; full-mode entries keep the bare content key.
+    """
+    mode = mode or PDF_EXTRACTION_MODE
+    key = key or ExtractionCache.key_for(cv_bytes)
+    if mode != "full":
+        key = f"{key}:{mode}"
+    return extraction_cache.get_or_extract(cv_bytes, lambda data: _pdfminer_extract(data, mode), key)
+
+
+def extract_first_page_text(cv_bytes: bytes, key: Optional[str] = None, mode: Optional[str] = None) -> str:
+    """Text of page one only, cached under its own key; enough for a name or contact details"""
+    mode = mode or PDF_EXTRACTION_MODE
+    key = f"{key or ExtractionCache.key_for(cv_bytes)}:page1"
+    if mode != "full":
+        key = f"{key}:{mode}"
+    return extraction_cache.get_or_extract(
+        cv_bytes, lambda data: next(iter_pdf_pages(data, max_pages=1, mode=mode), ""), key
+    )
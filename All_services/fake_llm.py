@@ -0,0 +1,219 @@
+"""Deterministic local stand-in for the Gemini and OpenAI clients.
+
+Selected with LLM_BACKEND=fake so benchmarks and CI can run the generation
+pipelines offline. It fakes the provider clients rather than the services,
+so caching, rate limiting and routing still run as in production:
+
+- `FakeGenerativeModel` mirrors `genai.GenerativeModel(...).generate_content`
+- `FakeOpenAIClient` mirrors `openai.OpenAI().chat.completions.create`
+
+Outputs are templated from the prompt (structured-CV JSON, cover letters,
+follow-up emails, enhanced resumes) and identical for identical prompts.
+Latency follows a log-normal distribution fitted to FAKE_LLM_P50_MS and
+FAKE_LLM_P95_MS. Failures are injected with FAKE_LLM_ERROR_RATE and
+FAKE_LLM_RATE_LIMIT_RATE (raised as HTTP 429). FAKE_LLM_MODELS (JSON) can
+override any of these per model. Random draws come from FAKE_LLM_SEED, so
+a run is reproducible.
+"""
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Dict, Iterator, List, Optional
+
+
+def enabled() -> bool:
+    return os.getenv("LLM_BACKEND", "").lower() == "fake"
+
+
+def has_api_key(env_var: str) -> bool:
+    """Whether LLM calls can be made: a provider key is set or the fake backend is on"""
+    return enabled() or bool(os.getenv(env_var))
+
+
+class FakeLLMError(RuntimeError):
+    """Simulated provider failure"""
+
+
+class FakeRateLimitError(FakeLLMError):
+    status_code = 429
+
+    def __init__(self, model: str):
+        super().__init__(f"429 Resource exhausted: simulated quota limit for {model}")
+
+
+_rng = random.Random(int(os.getenv("FAKE_LLM_SEED", "0")))
+_rng_lock = threading.Lock()
+_WORD = re.compile(r"[A-Za-z][A-Za-z+#.]{3,}")
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.]+")
+_COMMON = frozenset(
+    "with that this from have will your they their about into using used team work "
+    "experience years role resume text description candidate data json skills need needs "
+    "looking seeking built strong".split()
+)
+
+
+def _settings(model: str) -> Dict[str, float]:
+    settings = {
+        "p50_ms": float(os.getenv("FAKE_LLM_P50_MS", "800")),
+        "p95_ms": float(os.getenv("FAKE_LLM_P95_MS", "2500")),
+        "error_rate": float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+        "rate_limit_rate": float(os.getenv("FAKE_LLM_RATE_LIMIT_RATE", "0")),
+        "chunk_words": float(os.getenv("FAKE_LLM_CHUNK_WORDS", "8")),
+    }
+    settings.update(json.loads(os.getenv("FAKE_LLM_MODELS", "{}")).get(model, {}))
+    return settings
+
+
+def _draw(settings: Dict[str, float]):
+    """Latency in seconds and the failure to inject, if any"""
+    with _rng_lock:
+        p50 = max(settings["p50_ms"], 0.0) / 1000
+        sigma = math.log(max(settings["p95_ms"], settings["p50_ms"], 1e-3) / max(settings["p50_ms"], 1e-3)) / 1.645
+        latency = p50 * math.exp(_rng.gauss(0, sigma)) if p50 else 0.0
+        roll = _rng.random()
+    if roll < settings["rate_limit_rate"]:
+        return latency, "rate_limit"
+    if roll < settings["rate_limit_rate"] + settings["error_rate"]:
+        return latency, "error"
+    return latency, None
+
+
+def _section(prompt: str, heading: str) -> str:
+    """Text between the `---` fences that follow `heading` in the prompt"""
+    lines = [line.strip() for line in prompt.splitlines()]
+    for i, line in enumerate(lines):
+        if heading.lower() in line.lower():
+            fences = [j for j in range(i + 1, len(lines)) if lines[j] == "---"]
+            if len(fences) >= 2:
+                return "\n".join(lines[fences[0] + 1:fences[1]]).strip()
+    return ""
+
+
+def _keywords(text: str, limit: int) -> List[str]:
+    words = _WORD.findall(_EMAIL.sub(" ", text))
+    counts = Counter(w.strip(".") for w in words if w.strip(".").lower() not in _COMMON)
+    return [word for word, _ in counts.most_common(limit)]
+
+
+def _structured_cv(prompt: str) -> str:
+    resume = _section(prompt, "Resume Text") or prompt
+    lines = [line for line in resume.splitlines() if line.strip()]
+    email = _EMAIL.search(resume)
+    return json.dumps({
+        "name": lines[0][:60] if lines else "Candidate Name",
+        "contact": {"email": email.group(0) if email else "candidate@example.com"},
+        "summary": " ".join(lines[1:3])[:300],
+        "experience": [{"description": line[:200]} for line in lines[3:8]],
+        "skills": _keywords("\n".join(lines[1:]), 8)
+    })
+
+
+def _letter(prompt: str, digest: int) -> str:
+    job = _section(prompt, "Job Description") or _section(prompt, "Job Details")
+    skills = _keywords(_section(prompt, "Resume Data") or prompt, 3) or ["problem solving"]
+    focus = _keywords(job, 2) or ["your team"]
+    openings = ["I am excited to apply for this role.", "I am writing to express my interest in this role.",
+                "I would welcome the opportunity to join your team."]
+    if "follow-up email" in prompt.lower():
+        return (
+            f"Dear Hiring Team,\n\nI am following up on my application submitted today. "
+            f"My background in {', '.join(skills)} aligns closely with your needs around {' and '.join(focus)}.\n\n"
+            f"I would appreciate the chance to discuss next steps.\n\nBest regards,\n[Your Name]"
+        )
+    return (
+        f"Dear Hiring Manager at [Company Name],\n\n{openings[digest % len(openings)]} "
+        f"In my recent work I have applied {', '.join(skills)}, which maps directly to your focus on {' and '.join(focus)}.\n\n"
+        f"I would be glad to bring that experience to your team and discuss how I can help.\n\n"
+        f"Sincerely,\n[Your Name]"
+    )
+
+
+def render(prompt: str) -> str:
+    """Canned output for the prompt kinds used in this repo"""
+    digest = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8], 16)
+    lowered = prompt.lower()
+    if "json" in lowered and "resume text" in lowered:
+        return _structured_cv(prompt)
+    if "improve this resume" in lowered:
+        resume = prompt.split("\n", 1)[-1].split("\n\nJob Description:", 1)[0]
+        return "\n".join(line.strip() for line in resume.splitlines() if line.strip())
+    if "cover letter" in lowered or "follow-up email" in lowered:
+        return _letter(prompt, digest)
+    return f"Generated response ({len(prompt)} prompt characters)."
+
+
+def _chunks(text: str, words_per_chunk: int) -> List[str]:
+    words = re.findall(r"\S+\s*", text)
+    size = max(int(words_per_chunk), 1)
+    return ["".join(words[i:i + size]) for i in range(0, len(words), size)] or [""]
+
+
+def _complete(model: str, prompt: str, stream: bool, timeout: Optional[float]):
+    settings = _settings(model)
+    latency, failure = _draw(settings)
+    if timeout is not None and latency > timeout:
+        time.sleep(timeout)
+        raise TimeoutError(f"Simulated timeout after {timeout:.1f}s on {model}")
+    text = render(prompt)
+    if not stream:
+        time.sleep(latency)
+        if failure == "rate_limit":
+            raise FakeRateLimitError(model)
+        if failure == "error":
+            raise FakeLLMError(f"Simulated provider error on {model}")
+        return text
+
+    def events() -> Iterator[str]:
+        parts = _chunks(text, settings["chunk_words"])
+        # A third of the latency goes to the first token, the rest is spread over the stream
+        time.sleep(latency / 3)
+        if failure == "rate_limit":
+            raise FakeRateLimitError(model)
+        for i, part in enumerate(parts):
+            if failure == "error" and i == len(parts) // 2:
+                raise FakeLLMError(f"Simulated stream interruption on {model}")
+            yield part
+            time.sleep(latency * 2 / 3 / len(parts))
+    return events()
+
+
+class FakeGenerativeModel:
+    """Drop-in for `genai.GenerativeModel`"""
+
+    def __init__(self, model_name: str = "gemini-1.5-flash", **kwargs):
+        self.model_name = model_name
+
+    def generate_content(self, prompt, stream: bool = False, request_options: Optional[Dict] = None, **kwargs):
+        timeout = (request_options or {}).get("timeout")
+        result = _complete(self.model_name, str(prompt), stream, timeout)
+        if not stream:
+            return SimpleNamespace(text=result)
+        return (SimpleNamespace(text=part) for part in result)
+
+
+class _FakeCompletions:
+    def create(self, model: str, messages: List[Dict], stream: bool = False,
+               timeout: Optional[float] = None, **kwargs):
+        prompt = "\n".join(m.get("content", "") for m in messages)
+        result = _complete(model, prompt, stream, timeout)
+        if not stream:
+            message = SimpleNamespace(content=result)
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+        return (
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=part))])
+            for part in result
+        )
+
+
+class FakeOpenAIClient:
+    """Drop-in for `openai.OpenAI(...)` as used by LLMService"""
+
+    def __init__(self, *args, **kwargs):
+        self.chat = SimpleNamespace(completions=_FakeCompletions())
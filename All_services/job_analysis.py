@@ -0,0 +1,193 @@
+"""Job-listing analysis shared by every letter generated for the same job.
+
+A listing is fetched and analyzed (title, company, contact, required
+skills) once, then reused by all users applying to that job:
+
+- `job_analysis:content:{hash}` holds the analysis for one version of the
+  listing content (JOB_ANALYSIS_TTL, default 24h);
+- `job_analysis:job:{job_id}` points at the current content hash and
+  expires sooner (JOB_ANALYSIS_REFRESH, default 1h), so edited listings
+  are refetched and a new hash gets a fresh analysis.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_EMAIL = re.compile(r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}")
+_LABELLED = r"(?im)^\s*{label}\s*[:\-]\s*(.+)$"
+_SKILL_HEADINGS = re.compile(r"(?i)^\s*(requirements|qualifications|skills|must have|what you.ll need|you have)\b.*:?\s*$")
+_BULLET = re.compile(r"^\s*(?:[-*•▪◦]|\d+[.)])\s+(.+)$")
+KNOWN_SKILLS = (
+    "python", "java", "javascript", "typescript", "go", "rust", "c++", "c#", "ruby", "php", "kotlin", "swift",
+    "sql", "postgresql", "mysql", "mongodb", "redis", "elasticsearch", "kafka", "rabbitmq", "celery",
+    "django", "flask", "fastapi", "spring", "react", "angular", "vue", "node.js", "graphql", "rest",
+    "aws", "gcp", "azure", "docker", "kubernetes", "terraform", "linux", "git", "ci/cd",
+    "machine learning", "nlp", "pandas", "numpy", "spark", "airflow", "tableau", "excel",
+    "agile", "scrum", "communication", "leadership", "project management"
+)
+
+
+def normalize_listing(raw: Dict) -> Dict:
+    """Job API responses may wrap the listing in `data`"""
+    return raw["data"] if isinstance(raw.get("data"), dict) else raw
+
+
+def content_hash(listing: Dict) -> str:
+    payload = json.dumps(
+        {k: listing.get(k) for k in ("title", "company", "description", "contact_email")},
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _labelled(text: str, *labels: str) -> str:
+    for label in labels:
+        match = re.search(_LABELLED.format(label=label), text)
+        if match:
+            return match.group(1).strip()
+    return ""
+
+
+def extract_skills(description: str) -> List[str]:
+    """Known skills mentioned anywhere plus bullet items under requirement headings"""
+    lowered = description.lower()
+    skills = [s for s in KNOWN_SKILLS if re.search(rf"(?<![\w+#]){re.escape(s)}(?![\w+#])", lowered)]
+    in_requirements = False
+    for line in description.splitlines():
+        if _SKILL_HEADINGS.match(line):
+            in_requirements = True
+            continue
+        bullet = _BULLET.match(line)
+        if in_requirements and bullet:
+            item = bullet.group(1).strip().rstrip(".;")
+            if item and item.lower() not in skills and len(item) <= 120:
+                skills.append(item)
+        elif in_requirements and line.strip() and not bullet:
+            in_requirements = False
+    return skills
+
+
+def analyze_listing(job_id: str, listing: Dict) -> Dict:
+    description = listing.get("description", "") or ""
+    contact = listing.get("contact_email") or _labelled(description, "contact", "email")
+    email = _EMAIL.search(contact or "") or _EMAIL.search(description)
+    return {
+        "job_id": job_id,
+        "title": listing.get("title") or _labelled(description, "title", "position", "role"),
+        "company": listing.get("company") or _labelled(description, "company"),
+        "contact_email": email.group(0) if email else "",
+        "skills": extract_skills(description),
+        "description": description,
+        "content_hash": content_hash(listing),
+        "analyzed_at": datetime.utcnow().isoformat()
+    }
+
+
+class JobAnalysisStore:
+    def __init__(self, redis_url: Optional[str] = None, ttl: int = 24 * 3600, refresh: int = 3600,
+                 prefix: str = "job_analysis"):
+        self.ttl = ttl
+        self.refresh = refresh
+        self.prefix = prefix
+        self._local: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._observers: List[Callable[[str], None]] = []
+        self._redis = None
+        if redis_url:
+            try:
+                import redis
+                self._redis = redis.Redis.from_url(
+                    redis_url, socket_connect_timeout=0.5, socket_timeout=1.0
+                )
+            except Exception as e:
+                logger.warning(f"Job analysis store falling back to memory: {str(e)}")
+
+    @classmethod
+    def from_env(cls) -> "JobAnalysisStore":
+        return cls(
+            redis_url=os.getenv("JOB_ANALYSIS_REDIS_URL", os.getenv("CELERY_RESULT_BACKEND")),
+            ttl=int(os.getenv("JOB_ANALYSIS_TTL", str(24 * 3600))),
+            refresh=int(os.getenv("JOB_ANALYSIS_REFRESH", "3600"))
+        )
+
+    def _get(self, key: str) -> Optional[str]:
+        if self._redis is not None:
+            try:
+                value = self._redis.get(key)
+                return value.decode() if value is not None else None
+            except Exception as e:
+                logger.warning(f"Job analysis store read failed: {str(e)}")
+                return None
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None or entry[0] < time.time():
+                return None
+            return entry[1]
+
+    def _set(self, key: str, value: str, ttl: int):
+        if self._redis is not None:
+            try:
+                self._redis.set(key, value, ex=ttl)
+            except Exception as e:
+                logger.warning(f"Job analysis store write failed: {str(e)}")
+            return
+        with self._lock:
+            self._local[key] = (time.time() + ttl, value)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        digest = self._get(f"{self.prefix}:job:{job_id}")
+        if digest is None:
+            return None
+        cached = self._get(f"{self.prefix}:content:{digest}")
+        return {**json.loads(cached), "job_id": job_id} if cached is not None else None
+
+    def put(self, job_id: str, listing: Dict) -> Dict:
+        """Analyze `listing` unless this content was analyzed before, and point `job_id` at it"""
+        digest = content_hash(listing)
+        cached = self._get(f"{self.prefix}:content:{digest}")
+        if cached is not None:
+            analysis = json.loads(cached)
+        else:
+            analysis = analyze_listing(job_id, listing)
+            self._set(f"{self.prefix}:content:{digest}", json.dumps(analysis), self.ttl)
+        self._set(f"{self.prefix}:job:{job_id}", digest, self.refresh)
+        return {**analysis, "job_id": job_id}
+
+    def add_observer(self, observer: Callable[[str], None]):
+        """`observer("hit" | "miss")` is called for every lookup, e.g. to export metrics"""
+        self._observers.append(observer)
+
+    def _notify(self, result: str):
+        for observer in self._observers:
+            try:
+                observer(result)
+            except Exception as e:
+                logger.debug(f"Job analysis observer failed: {str(e)}")
+
+    async def get_or_analyze(self, job_id: str, fetch: Callable[[str], Awaitable[Dict]],
+                             refresh: bool = False) -> Dict:
+        """Cached analysis for `job_id`, fetching the listing only when it is missing or stale.
+
+        The store's Redis round trips are blocking, so they run in the loop's
+        executor rather than stalling the other coroutines on the shared loop.
+        """
+        loop = asyncio.get_running_loop()
+        if not refresh:
+            analysis = await loop.run_in_executor(None, self.get, job_id)
+            self._notify("miss" if analysis is None else "hit")
+            if analysis is not None:
+                return analysis
+        listing = normalize_listing(await fetch(job_id))
+        return await loop.run_in_executor(None, self.put, job_id, listing)
+
+
+job_analysis_store = JobAnalysisStore.from_env()
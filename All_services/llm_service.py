@@ -1,11 +1,63 @@
+from typing import Callable, Optional
+
+import fake_llm
+from llm_cache import cached_completion
+from llm_gateway import SlotTimeout, llm_gateway
+from model_router import ModelRouter
+
+# Quality tier per model, in preference order (override with OPENAI_ROUTER_MODELS)
+OPENAI_MODELS = {"gpt-4": "premium", "gpt-4o": "premium", "gpt-3.5-turbo": "standard"}
+
+
 class LLMService:
-    def __init__(self, api_key: str):
-        import openai
-        self.client = openai.OpenAI(api_key=api_key)
-
-    def generate_text(self, prompt: str, model: str = "gpt-4", tone: str = "professional") -> str:
-        response = self.client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": f"{tone} tone: {prompt}"}]
+    def __init__(self, api_key: Optional[str]):
+        if fake_llm.enabled():
+            self.client = fake_llm.FakeOpenAIClient()
+        else:
+            import openai
+            self.client = openai.OpenAI(api_key=api_key)
+        self.router = ModelRouter.from_env("OPENAI_ROUTER_MODELS", OPENAI_MODELS, default_tier="premium")
+
+    def generate_text(self, prompt: str, model: Optional[str] = None, tone: str = "professional",
+                      bypass_cache: bool = False,
+                      validate: Optional[Callable[[str], bool]] = None,
+                      on_chunk: Optional[Callable[[str], None]] = None,
+                      tier: Optional[str] = None) -> str:
+        """Complete `prompt`; with `on_chunk` the provider's streaming API is used
+        and every text delta is passed to it as it arrives.
+
+        Without an explicit `model` the router picks the fastest healthy model
+        in `tier` (default LLM_ROUTER_TIER) and falls back on failure."""
+        messages = [{"role": "user", "content": f"{tone} tone: {prompt}"}]
+
+        def complete(name: str, timeout: float) -> str:
+            if on_chunk is None:
+                response = self.client.chat.completions.create(model=name, messages=messages, timeout=timeout)
+                return response.choices[0].message.content.strip()
+            parts = []
+            for event in self.client.chat.completions.create(model=name, messages=messages, stream=True, timeout=timeout):
+                delta = event.choices[0].delta.content if event.choices else None
+                if delta:
+                    parts.append(delta)
+                    on_chunk(delta)
+            return "".join(parts).strip()
+
+        def generate(name: str, timeout: float) -> str:
+            return llm_gateway.call(name, messages[0]["content"], self.router.timed(lambda: complete(name, timeout)))
+
+        if model is not None:
+            return cached_completion(
+                model, prompt, lambda: generate(model, self.router.max_timeout),
+                bypass_cache=bypass_cache, validate=validate, tone=tone
+            )
+        tier = tier or self.router.default_tier
+        # Cached per tier: any healthy model of the tier may answer a repeated prompt.
+        # Streams are not retried on another model, which would repeat chunks.
+        return cached_completion(
+            f"tier:{tier}", prompt,
+            lambda: self.router.call(
+                generate, tier=tier, fallback=on_chunk is None,
+                ignore=lambda error: isinstance(error, SlotTimeout)
+            ),
+            bypass_cache=bypass_cache, validate=validate, tone=tone
         )
-        return response.choices[0].message.content.strip()
\ No newline at end of file
@@ -1,12 +1,25 @@
 import os
 import httpx
-from fastapi import FastAPI, HTTPException, Form, Query
-from fastapi.responses import JSONResponse, FileResponse
-from celery.result import AsyncResult
-from tasks import celery_app, generation_pipeline_task, generate_resume, generate_followup_email
+import re
+from fastapi import FastAPI, HTTPException, Form, Header, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse
+from celery.result import AsyncResult, GroupResult
+from tasks import celery_app, generation_pipeline_task, generate_resume, generate_followup_email, dispatch_cover_letter_batch, profile_store, after_cv_extraction, llm_service
+from cv_cache import extraction_cache
+from llm_gateway import llm_gateway
+from cv_store import structured_cv_store
+from http_client import get_http_client, close_http_client
+from letter_stream import stream_events
+from api_client import api_client
+from job_analysis import job_analysis_store
+from artifact_store import artifact_store
+import metrics
+import profiling
+import routing
 from dotenv import load_dotenv
 from pydantic import BaseModel
-from typing import Literal
+from typing import List, Literal
 
 load_dotenv()
 
@@ -15,6 +28,8 @@ app = FastAPI(
     description="Integrated API for Cover Letter, Resume, and Follow-up Email Generation",
     version="1.0.0"
 )
+metrics.add_metrics_endpoint(app)
+profiling.add_profile_endpoint(app, profile_store)
 
 class ResumeRequest(BaseModel):
     user_id: str
@@ -24,49 +39,70 @@ class JobApplicationRequest(BaseModel):
     user_id: str
     job_id: str
 
+class BatchCoverLetterRequest(BaseModel):
+    user_id: str
+    job_descriptions: List[str] = []
+    job_ids: List[str] = []
+    tone: str = "Professional"
+    skills: str = ""
+    experience: str = ""
+    bypass_cache: bool = False
+
 # Configuration
 PROFILE_API = "https://sandbox.appleazy.com/api/v1/user"
 JOB_API = "https://server.appleazy.com/api/v1/job-listing"
 HOST_URL = "https://your-deployed-domain.com"
 
+@app.on_event("shutdown")
+async def shutdown_http_pool():
+    await close_http_client()
+
 async def fetch_job_description(job_id: str):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(f"{JOB_API}/{job_id}")
-        if response.status_code != 200:
-            raise HTTPException(502, "Failed to fetch job details")
-        return response.json().get("description", "")
+    try:
+        job = await job_analysis_store.get_or_analyze(job_id, api_client.get_job_listing)
+    except Exception:
+        raise HTTPException(502, "Failed to fetch job details")
+    return job["description"]
 
 async def fetch_profile_cv(user_id: str):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{PROFILE_API}/get-profile/{user_id}",
-            params={"field": "userId"},
-            timeout=30.0
-        )
-        response.raise_for_status()
-        data = response.json()
-        if not data.get("resume") or not data["resume"].get("content"):
-            raise HTTPException(400, "No resume found in profile")
-        return data["resume"]["content"]
+    client = get_http_client()
+    response = await client.get(
+        f"{PROFILE_API}/get-profile/{user_id}",
+        params={"field": "userId"},
+        timeout=30.0
+    )
+    response.raise_for_status()
+    data = response.json()
+    if not data.get("resume") or not data["resume"].get("content"):
+        raise HTTPException(400, "No resume found in profile")
+    return data["resume"]["content"]
 
 @app.post("/generate-cover-letter")
 async def generate_cover_letter(
-    job_description: str = Form(...),
     user_id: str = Form(...),
+    job_description: str = Form(""),
+    job_id: str = Form(""),
     tone: str = Form("Professional"),
     skills: str = Form(""),
-    experience: str = Form("")
+    experience: str = Form(""),
+    bypass_cache: bool = Form(False),
+    stream: bool = Form(False),
+    x_profile: bool = Header(False)
 ):
+    if not job_description and not job_id:
+        raise HTTPException(400, "Provide job_description or job_id")
     try:
-        task = generation_pipeline_task.apply_async(
-            args=[job_description, user_id, tone, skills, experience, "cover_letter"]
-        )
+        task = after_cv_extraction(user_id, generation_pipeline_task.si(
+            job_description, user_id, tone, skills, experience, "cover_letter",
+            bypass_cache=bypass_cache, stream=stream, job_id=job_id
+        ).set(headers=profiling.task_headers(x_profile)))
         return JSONResponse(
             status_code=202,
             content={
                 "status": "processing",
                 "cover_letter_url": f"/documents/{task.id}",
-                "tracking_url": f"/api/status/{task.id}"
+                "tracking_url": f"/api/status/{task.id}",
+                "stream_url": f"/stream/{task.id}" if stream else None
             }
         )
     except httpx.HTTPStatusError as e:
@@ -74,11 +110,57 @@ async def generate_cover_letter(
     except Exception as e:
         raise HTTPException(500, f"Generation failed: {str(e)}")
 
+@app.post("/generate-cover-letters/batch", status_code=status.HTTP_202_ACCEPTED)
+async def generate_cover_letter_batch(request: BatchCoverLetterRequest):
+    jobs = [{"job_description": jd} for jd in request.job_descriptions] + [{"job_id": job_id} for job_id in request.job_ids]
+    if not jobs:
+        raise HTTPException(400, "Provide at least one job description or job id")
+    batch = dispatch_cover_letter_batch(
+        request.user_id, jobs, request.tone, request.skills, request.experience, request.bypass_cache
+    )
+    return {
+        "status": "processing",
+        "batch_id": batch["batch_id"],
+        "status_url": f"/batches/{batch['batch_id']}",
+        "items": [{**item, "document_url": f"/documents/{item['task_id']}"} for item in batch["items"]]
+    }
+
+@app.get("/batches/{batch_id}")
+async def get_batch_status(batch_id: str):
+    group = GroupResult.restore(batch_id, app=celery_app)
+    if group is None:
+        raise HTTPException(404, "Unknown batch")
+    prepare, letters = group.results[0], group.results[1:]
+    items = []
+    for index, result in enumerate(letters):
+        state = result.state
+        if result.successful() and isinstance(result.result, dict):
+            state = "FAILURE" if result.result.get("status") == "failed" else state
+        items.append({"index": index, "task_id": result.id, "status": state})
+
+    if prepare.failed():
+        overall = "failed"
+    elif all(item["status"] in ("SUCCESS", "FAILURE") for item in items):
+        overall = "completed"
+    else:
+        overall = "processing"
+    summary = AsyncResult(batch_id, app=celery_app)
+    return {
+        "batch_id": batch_id,
+        "status": overall,
+        "prepare": {"task_id": prepare.id, "status": prepare.state, "error": str(prepare.result) if prepare.failed() else None},
+        "completed": sum(1 for item in items if item["status"] in ("SUCCESS", "FAILURE")),
+        "total": len(items),
+        "items": items,
+        "result": summary.result if summary.successful() else None
+    }
+
 @app.post("/generate-resume", status_code=status.HTTP_202_ACCEPTED)
 async def trigger_resume_generation(
     user_id: str = Form(...),
     template: str = Form("modern"),
-    job_description: str = Form("")
+    job_description: str = Form(""),
+    x_profile: bool = Header(False)
 ):
     if not job_description:
         job_description = """Looking for a skilled developer with experience in:
@@ -88,7 +170,8 @@ async def trigger_resume_generation(
         Competitive salary and benefits package."""
     
     task = generate_resume.apply_async(
-        args=[user_id, template, job_description]
+        args=[user_id, template, job_description],
+        headers=profiling.task_headers(x_profile)
     )
     return {
         "task_id": task.id,
@@ -96,10 +179,10 @@ async def trigger_resume_generation(
     }
 
 @app.post("/generate-followup", status_code=status.HTTP_202_ACCEPTED)
-async def trigger_followup_email(request: JobApplicationRequest):
-    task = generate_followup_email.apply_async(
-        args=[request.user_id, request.job_id]
-    )
+async def trigger_followup_email(request: JobApplicationRequest, x_profile: bool = Header(False)):
+    task = after_cv_extraction(request.user_id, generate_followup_email.si(
+        request.user_id, request.job_id
+    ).set(headers=profiling.task_headers(x_profile)))
     return {
         "task_id": task.id,
         "status_check": f"/tasks/status/{task.id}"
@@ -130,15 +213,28 @@ async def get_document(task_id: str):
             }
         )
     
+    text_ref = _artifact_ref(task_result.result, "text")
+    # Artifact reads are blocking (network calls with MinIO)
+    content = (await run_in_threadpool(artifact_store.read, text_ref["key"])).decode("utf-8") if text_ref else ""
     return {
         "status": "success",
         "generated_at": task_result.result.get("generated_at"),
-        "content": task_result.result.get("content", ""),
+        "content": content,
         "pdf_url": task_result.result.get("pdf_url", ""),
         "text_url": task_result.result.get("text_url", ""),
-        "job_description_preview": task_result.result.get("job_description", "")[:100] + "..."
+        "download_url": f"/documents/{task_id}/download",
+        "job_description_preview": task_result.result.get("job_description_preview", "") + "..."
     }
 
+@app.get("/stream/{task_id}")
+async def stream_document(task_id: str):
+    """Server-sent events: stage updates, letter chunks as they are generated, then done/error"""
+    return StreamingResponse(
+        stream_events(task_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/tasks/status/{task_id}")
 async def get_task_status(task_id: str):
     task = AsyncResult(task_id, app=celery_app)
@@ -155,8 +251,30 @@ async def get_task_status(task_id: str):
         "result": task.result if task.ready() else None
     }
 
+def _artifact_ref(result, kind: str):
+    """Artifact ref from a task result (follow-up emails nest theirs under "email")"""
+    if not isinstance(result, dict):
+        return None
+    artifacts = result.get("artifacts") or result.get("email", {}).get("artifacts") or {}
+    return artifacts.get(kind)
+
+def _byte_range(header: str, size: int):
+    """Parse a single `bytes=start-end` Range header into inclusive offsets"""
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+    if not match or match.groups() == ("", ""):
+        raise HTTPException(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, headers={"Content-Range": f"bytes */{size}"})
+    first, last = match.groups()
+    if first:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    else:
+        start, end = max(size - int(last), 0), size - 1
+    if start > end or start >= size:
+        raise HTTPException(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
 @app.get("/documents/{task_id}/download")
-async def download_document(task_id: str):
+async def download_document(task_id: str, request: Request, format: Literal["pdf", "text", "html"] = Query("pdf")):
+    """Stream the stored document, honouring single-range requests for resumable downloads"""
     task = AsyncResult(task_id, app=celery_app)
     if not task.ready():
         raise HTTPException(
@@ -164,14 +282,32 @@ async def download_document(task_id: str):
             detail="Document not ready yet"
         )
     
-    pdf_bytes = base64.b64decode(task_result.get("pdf_content", "")) if task.result.get("pdf_content") else None
-    if pdf_bytes:
-        return FileResponse(
-            io.BytesIO(pdf_bytes),
-            media_type="application/pdf",
-            filename=f"document_{task_id}.pdf"
-        )
-    raise HTTPException(status_code=404, detail="No PDF available")
+    ref = _artifact_ref(task.result, format)
+    if not ref:
+        raise HTTPException(status_code=404, detail=f"No {format} available")
+    try:
+        size = await run_in_threadpool(artifact_store.size, ref["key"])
+    except Exception:
+        raise HTTPException(status_code=404, detail="Document no longer stored")
+
+    extension = {"pdf": "pdf", "text": "txt", "html": "html"}[format]
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'attachment; filename="document_{task_id}.{extension}"'
+    }
+    range_header = request.headers.get("range")
+    if not range_header:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(artifact_store.iter_range(ref["key"]), media_type=ref["content_type"], headers=headers)
+
+    start, end = _byte_range(range_header, size)
+    headers.update({"Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(end - start + 1)})
+    return StreamingResponse(
+        artifact_store.iter_range(ref["key"], start, end),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=ref["content_type"],
+        headers=headers
+    )
 
 @app.get("/health")
 async def health_check():
@@ -183,6 +319,32 @@ async def health_check():
         }
     }
 
+@app.delete("/profiles/{user_id}/structured-cv")
+async def invalidate_structured_cv(user_id: str):
+    if not structured_cv_store.shared:
+        # Workers keep their own in-memory copies, which this process cannot reach
+        raise HTTPException(503, "Structured CV invalidation requires CV_STORE_REDIS_URL")
+    structured_cv_store.invalidate(user_id)
+    return {"status": "invalidated", "user_id": user_id}
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {"cv_text": extraction_cache.stats()}
+
+@app.get("/llm/stats")
+async def llm_gateway_stats():
+    """LLM gateway request, throttling and wait-time counters (shared totals come from the workers),
+    and per-model router latency and circuit state"""
+    return {**llm_gateway.stats(), "router": llm_service.router.stats()}
+
+@app.get("/queues/stats")
+def queue_stats():
+    """Messages waiting in the CPU and I/O queues, plus each task's queue"""
+    return {
+        "queues": routing.queue_depths(celery_app),
+        "routes": {name: routing.queue_for(name) for name in sorted(celery_app.tasks) if not name.startswith("celery.")}
+    }
+
 @app.get("/openapi.json")
 async def openapi_spec():
     from fastapi.openapi.utils import get_openapi
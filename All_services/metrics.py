@@ -0,0 +1,196 @@
+"""Prometheus metrics for the API processes and the Celery workers.
+
+What is recorded:
+- task_stage_seconds{task,stage}: time spent in each pipeline stage (StageTimer)
+- task_duration_seconds{task,state} and task_queue_wait_seconds{task}: from Celery signals
+- llm_call_seconds{model,outcome}, llm_tokens_total{model,kind} and
+  llm_rate_limit_wait_seconds{model}: from the LLM gateway
+- cache_lookups_total{cache,result}: hits and misses of the LLM, CV-text,
+  structured-CV and job-analysis caches
+- http_request_seconds{method,route,status}: FastAPI middleware
+
+The APIs serve these on GET /metrics (`add_metrics_endpoint`). Workers
+expose them on WORKER_METRICS_PORT, which is started from the worker's
+main process. Prefork workers and multi-process uvicorn must set
+PROMETHEUS_MULTIPROC_DIR to an empty directory shared by the processes,
+so a scrape aggregates every child. prometheus_client is optional:
+without it every helper is a no-op and /metrics answers 503.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess, start_http_server
+    )
+except ImportError:
+    CollectorRegistry = None
+
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+LLM_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class _NoopMetric:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+
+if CollectorRegistry is not None:
+    TASK_STAGE = Histogram("task_stage_seconds", "Time spent in a task stage", ["task", "stage"], buckets=STAGE_BUCKETS)
+    TASK_DURATION = Histogram("task_duration_seconds", "Task run time by final state", ["task", "state"], buckets=STAGE_BUCKETS)
+    TASK_QUEUE_WAIT = Histogram("task_queue_wait_seconds", "Time between publish and start", ["task"], buckets=STAGE_BUCKETS)
+    LLM_CALL = Histogram("llm_call_seconds", "Provider call latency", ["model", "outcome"], buckets=LLM_BUCKETS)
+    LLM_TOKENS = Counter("llm_tokens", "Estimated tokens sent and received", ["model", "kind"])
+    LLM_WAIT = Histogram("llm_rate_limit_wait_seconds", "Time waiting for a rate-limit slot", ["model"], buckets=LLM_BUCKETS)
+    CACHE_LOOKUPS = Counter("cache_lookups", "Cache lookups by result", ["cache", "result"])
+    HTTP_REQUEST = Histogram("http_request_seconds", "API request latency", ["method", "route", "status"], buckets=HTTP_BUCKETS)
+else:
+    TASK_STAGE = TASK_DURATION = TASK_QUEUE_WAIT = LLM_CALL = LLM_TOKENS = LLM_WAIT = CACHE_LOOKUPS = HTTP_REQUEST = _NoopMetric()
+
+_observed = set()
+_observed_lock = threading.Lock()
+_task_started = {}
+
+
+def enabled() -> bool:
+    return CollectorRegistry is not None
+
+
+def _first_time(target) -> bool:
+    with _observed_lock:
+        if id(target) in _observed:
+            return False
+        _observed.add(id(target))
+        return True
+
+
+def registry():
+    """Registry to scrape: every process's samples in multiprocess mode, else the default one"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        collector = CollectorRegistry()
+        multiprocess.MultiProcessCollector(collector)
+        return collector
+    from prometheus_client import REGISTRY
+    return REGISTRY
+
+
+def render() -> tuple:
+    """(body, content type) for a scrape"""
+    return generate_latest(registry()), CONTENT_TYPE_LATEST
+
+
+class StageTimer:
+    """Times consecutive stages of one task run; `enter` closes the previous stage"""
+
+    def __init__(self, task: str):
+        self.task = task
+        self.stage: Optional[str] = None
+        self.started = 0.0
+
+    def enter(self, stage: str):
+        self.close()
+        self.stage, self.started = stage, time.perf_counter()
+
+    def close(self):
+        if self.stage is not None:
+            TASK_STAGE.labels(self.task, self.stage).observe(time.perf_counter() - self.started)
+            self.stage = None
+
+
+def _on_llm_event(model: str, outcome: str, seconds: float = 0.0, wait: Optional[float] = None,
+                  prompt_tokens: int = 0, response_tokens: int = 0):
+    if wait is not None:
+        LLM_WAIT.labels(model).observe(wait)
+        return
+    LLM_CALL.labels(model, outcome).observe(seconds)
+    if prompt_tokens or response_tokens:
+        LLM_TOKENS.labels(model, "prompt").inc(prompt_tokens)
+        LLM_TOKENS.labels(model, "response").inc(response_tokens)
+
+
+def observe_gateway(gateway):
+    if enabled() and _first_time(gateway):
+        gateway.add_observer(_on_llm_event)
+
+
+def observe_cache(name: str, cache):
+    """`cache` is anything with `add_observer(fn)` calling `fn("hit" | "miss")`"""
+    if enabled() and _first_time(cache):
+        cache.add_observer(lambda result: CACHE_LOOKUPS.labels(name, result).inc())
+
+
+def install_celery_metrics(app):
+    """Task duration and queue wait from Celery signals, plus the worker-side exporter"""
+    if not enabled() or not _first_time(app):
+        return
+    from celery.signals import (
+        before_task_publish, task_postrun, task_prerun, worker_init, worker_process_shutdown
+    )
+
+    @before_task_publish.connect(weak=False)
+    def stamp_publish_time(headers=None, **kwargs):
+        if headers is not None:
+            headers.setdefault("published_at", time.time())
+
+    @task_prerun.connect(weak=False)
+    def record_start(task_id=None, task=None, **kwargs):
+        _task_started[task_id] = time.perf_counter()
+        published_at = getattr(task.request, "published_at", None)
+        if published_at:
+            TASK_QUEUE_WAIT.labels(task.name).observe(max(time.time() - float(published_at), 0.0))
+
+    @task_postrun.connect(weak=False)
+    def record_duration(task_id=None, task=None, state=None, **kwargs):
+        started = _task_started.pop(task_id, None)
+        if started is not None:
+            TASK_DURATION.labels(task.name, state or "UNKNOWN").observe(time.perf_counter() - started)
+
+    @worker_init.connect(weak=False)
+    def start_exporter(**kwargs):
+        port = os.getenv("WORKER_METRICS_PORT")
+        if port:
+            start_http_server(int(port), registry=registry())
+            logger.info(f"Worker metrics exporter listening on :{port}")
+
+    @worker_process_shutdown.connect(weak=False)
+    def mark_child_dead(pid=None, **kwargs):
+        if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+            multiprocess.mark_process_dead(pid or os.getpid())
+
+
+def add_metrics_endpoint(app):
+    """Request latency middleware and GET /metrics on a FastAPI app"""
+    from fastapi import Request, Response
+
+    @app.middleware("http")
+    async def time_request(request: Request, call_next):
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            HTTP_REQUEST.labels(
+                request.method, getattr(route, "path", "unmatched"), str(status)
+            ).observe(time.perf_counter() - started)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics_endpoint():
+        if not enabled():
+            return Response("prometheus_client is not installed\n", status_code=503, media_type="text/plain")
+        body, content_type = render()
+        return Response(body, media_type=content_type)
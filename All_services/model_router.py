@@ -0,0 +1,249 @@
+"""Latency-aware model selection with per-model circuit breakers.
+
+Models are grouped into quality tiers. For a tier the router tries the
+healthy models fastest-first (rolling p50 over the last calls, untried
+models first so they get measured), falls back to the other tiers, and
+skips models whose breaker is open. A breaker opens after consecutive
+failures or a high error rate over the window, stays open for a cooldown,
+then lets a single trial call through (half-open).
+
+Latency is the provider call alone when the caller wraps it in `timed`, so
+time spent queueing for a rate-limit slot does not count. Each worker
+writes its view of a model to Redis after every call, so `stats()` can also
+show the workers' numbers in the API process.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct * (len(ordered) - 1))))]
+
+
+class ModelHealth:
+    """Rolling latency/outcome window and breaker state for one model"""
+
+    def __init__(self, window: int):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+
+    @property
+    def p50(self) -> Optional[float]:
+        return _percentile(list(self.latencies), 0.5) if self.latencies else None
+
+    @property
+    def p95(self) -> Optional[float]:
+        return _percentile(list(self.latencies), 0.95) if self.latencies else None
+
+    @property
+    def error_rate(self) -> float:
+        return (self.outcomes.count(False) / len(self.outcomes)) if self.outcomes else 0.0
+
+
+class ModelRouter:
+    def __init__(self, tiers: Dict[str, str], default_tier: str, window: int = 50,
+                 failure_threshold: int = 5, error_rate_threshold: float = 0.5,
+                 min_samples: int = 10, cooldown: float = 30.0,
+                 min_timeout: float = 10.0, max_timeout: float = 60.0,
+                 redis_url: Optional[str] = None, prefix: str = "llm_router"):
+        self.tiers = tiers
+        self.default_tier = default_tier
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self._order = list(tiers)
+        self._health = {model: ModelHealth(window) for model in tiers}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.prefix = prefix
+        self._redis = None
+        if redis_url:
+            try:
+                import redis
+                self._redis = redis.Redis.from_url(redis_url, socket_connect_timeout=0.5, socket_timeout=0.5)
+            except Exception as e:
+                logger.warning(f"Model router shared stats disabled: {str(e)}")
+
+    @classmethod
+    def from_env(cls, models_var: str, default_models: Dict[str, str], default_tier: str) -> "ModelRouter":
+        """`models_var` holds a JSON object of model name -> tier, in preference order"""
+        return cls(
+            json.loads(os.getenv(models_var, "null")) or default_models,
+            default_tier=os.getenv("LLM_ROUTER_TIER", default_tier),
+            window=int(os.getenv("LLM_ROUTER_WINDOW", "50")),
+            failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+            error_rate_threshold=float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5")),
+            cooldown=float(os.getenv("LLM_BREAKER_COOLDOWN", "30")),
+            min_timeout=float(os.getenv("LLM_ROUTER_MIN_TIMEOUT", "10")),
+            max_timeout=float(os.getenv("LLM_ROUTER_MAX_TIMEOUT", "60")),
+            redis_url=os.getenv("LLM_ROUTER_REDIS_URL", os.getenv("CELERY_RESULT_BACKEND")),
+            prefix=f"llm_router:{models_var.lower()}"
+        )
+
+    def _available(self, model: str, now: float) -> bool:
+        health = self._health[model]
+        if health.opened_at is None:
+            return True
+        if now - health.opened_at < self.cooldown or health.trial_in_flight:
+            return False
+        return True
+
+    def candidates(self, tier: Optional[str] = None) -> List[str]:
+        """Healthy models for `tier` fastest-first, then the other tiers as fallback"""
+        tier = tier or self.default_tier
+        now = time.monotonic()
+        with self._lock:
+            healthy = [m for m in self._order if self._available(m, now)]
+            return sorted(healthy, key=lambda m: (
+                self.tiers[m] != tier,
+                self._health[m].p50 or 0.0,
+                self._order.index(m)
+            ))
+
+    def timeout_for(self, model: str) -> float:
+        """Allow a few times the model's p95 so a hung call fails fast instead of at the client default"""
+        p95 = self._health[model].p95
+        if p95 is None:
+            return self.max_timeout
+        return max(self.min_timeout, min(self.max_timeout, p95 * 3))
+
+    def _begin(self, model: str) -> bool:
+        """Claim the call; a half-open model admits only one trial at a time"""
+        with self._lock:
+            health = self._health[model]
+            if health.opened_at is not None:
+                if not self._available(model, time.monotonic()):
+                    return False
+                health.trial_in_flight = True
+            return True
+
+    def _release(self, model: str):
+        """Give back a claim without an outcome (the model was never called)"""
+        with self._lock:
+            self._health[model].trial_in_flight = False
+
+    def record(self, model: str, latency: float, ok: bool):
+        with self._lock:
+            health = self._health[model]
+            health.outcomes.append(ok)
+            if ok:
+                health.latencies.append(latency)
+                health.consecutive_failures = 0
+                if health.opened_at is not None:
+                    logger.info(f"Circuit for {model} closed")
+                health.opened_at = None
+            else:
+                health.consecutive_failures += 1
+                tripped = (
+                    health.opened_at is not None
+                    or health.consecutive_failures >= self.failure_threshold
+                    or (len(health.outcomes) >= self.min_samples
+                        and health.error_rate >= self.error_rate_threshold)
+                )
+                if tripped:
+                    if health.opened_at is None:
+                        logger.warning(f"Circuit for {model} opened for {self.cooldown:.0f}s")
+                    health.opened_at = time.monotonic()
+            health.trial_in_flight = False
+        self._publish(model)
+
+    def timed(self, fn: Callable[[], str]) -> Callable[[], str]:
+        """Wrap the provider call inside a `call` callback so that only it is timed"""
+        def run() -> str:
+            started = time.monotonic()
+            try:
+                return fn()
+            finally:
+                self._local.provider_seconds = time.monotonic() - started
+        return run
+
+    def call(self, fn: Callable[[str, float], str], tier: Optional[str] = None,
+             fallback: bool = True,
+             stop_on: Optional[Callable[[Exception], bool]] = None,
+             ignore: Optional[Callable[[Exception], bool]] = None) -> str:
+        """Call `fn(model, timeout)` on the best model, moving to the next on failure.
+
+        `fallback=False` tries only the first choice (e.g. once output has been
+        streamed); `stop_on(error)` returning True ends the fallback early.
+        `ignore(error)` returning True (e.g. no rate-limit slot, so the provider
+        was never called) moves on without counting against the model.
+        """
+        models = self.candidates(tier)
+        if not models:
+            raise RuntimeError("No LLM model available: every circuit is open")
+        last_error: Optional[Exception] = None
+        for model in (models if fallback else models[:1]):
+            if not self._begin(model):
+                continue
+            self._local.provider_seconds = None
+            started = time.monotonic()
+            try:
+                result = fn(model, self.timeout_for(model))
+            except Exception as e:
+                last_error = e
+                if ignore is not None and ignore(e):
+                    self._release(model)
+                    logger.warning(f"Model {model} skipped: {str(e)}")
+                    continue
+                self.record(model, 0.0, ok=False)
+                logger.warning(f"Model {model} failed: {str(e)}")
+                if stop_on is not None and stop_on(e):
+                    break
+                continue
+            latency = self._local.provider_seconds
+            self.record(model, time.monotonic() - started if latency is None else latency, ok=True)
+            return result
+        raise last_error or RuntimeError("No LLM model available: every circuit is open")
+
+    def _model_stats(self, model: str, now: float) -> Dict:
+        health = self._health[model]
+        return {
+            "tier": self.tiers[model],
+            "p50": health.p50,
+            "p95": health.p95,
+            "error_rate": health.error_rate,
+            "samples": len(health.outcomes),
+            "circuit": "closed" if health.opened_at is None
+            else ("open" if now - health.opened_at < self.cooldown else "half_open")
+        }
+
+    def _publish(self, model: str):
+        if self._redis is None:
+            return
+        with self._lock:
+            snapshot = self._model_stats(model, time.monotonic())
+        try:
+            self._redis.hset(f"{self.prefix}:stats", model, json.dumps(dict(snapshot, updated_at=time.time())))
+        except Exception as e:
+            logger.debug(f"Model router stats write failed: {str(e)}")
+
+    def stats(self) -> Dict:
+        """Per-model latency, errors and circuit state for this process, plus the
+        latest snapshot any worker wrote to Redis"""
+        now = time.monotonic()
+        with self._lock:
+            local = {model: self._model_stats(model, now) for model in self._health}
+        shared = {}
+        if self._redis is not None:
+            try:
+                shared = {
+                    k.decode(): json.loads(v)
+                    for k, v in self._redis.hgetall(f"{self.prefix}:stats").items()
+                }
+            except Exception as e:
+                logger.warning(f"Model router stats read failed: {str(e)}")
+        return {"process": local, "shared": shared}
@@ -0,0 +1,102 @@
+"""Queue routing: CPU-bound stages and I/O-bound stages run on separate worker pools.
+
+PDF layout analysis and spaCy parsing go to CPU_QUEUE (default "cpu"), which
+is meant for a prefork pool sized to the cores. LLM calls, profile and
+job-listing fetches and artifact storage go to IO_QUEUE (default "io"), which
+is meant for a threads or gevent pool with high concurrency. Tasks without a
+route also go to IO_QUEUE.
+
+TASK_ROUTES extends or overrides DEFAULT_ROUTES with a JSON object. Keys are
+task names, either short ("generate_resume") or full ("tasks.generate_resume"),
+and fnmatch patterns are allowed. Values are "cpu", "io" or a literal queue name:
+
+    TASK_ROUTES='{"generate_resume": "io", "bulk_*": "cpu"}'
+
+A worker started without -Q consumes both queues, so a single-worker setup
+keeps working unchanged.
+"""
+import json
+import logging
+import os
+from fnmatch import fnmatchcase
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CPU_QUEUE = os.getenv("CPU_QUEUE", "cpu")
+IO_QUEUE = os.getenv("IO_QUEUE", "io")
+
+DEFAULT_ROUTES = {
+    "extract_cv_text": "cpu",
+    # spaCy parsing dominates; its single LLM call is optional
+    "generate_resume": "cpu",
+    "fetch_cv": "io",
+    "generation_pipeline_task": "io",
+    "generate_followup_email": "io",
+    "generate_job_application": "io",
+    "prepare_batch_cv": "io",
+    "generate_batch_letter": "io",
+    "collect_batch_results": "io",
+    "prewarm_job_analyses": "io",
+}
+
+
+def load_routes() -> Dict[str, str]:
+    routes = dict(DEFAULT_ROUTES)
+    raw = os.getenv("TASK_ROUTES")
+    if raw:
+        try:
+            routes.update(json.loads(raw))
+        except ValueError as e:
+            logger.error(f"Ignoring invalid TASK_ROUTES: {str(e)}")
+    return routes
+
+
+def _queue_name(target: str) -> str:
+    return {"cpu": CPU_QUEUE, "io": IO_QUEUE}.get(target, target)
+
+
+def queue_for(task_name: str, routes: Optional[Dict[str, str]] = None) -> str:
+    routes = load_routes() if routes is None else routes
+    short = task_name.rsplit(".", 1)[-1]
+    for name in (task_name, short):
+        if name in routes:
+            return _queue_name(routes[name])
+    for pattern, target in routes.items():
+        if fnmatchcase(task_name, pattern) or fnmatchcase(short, pattern):
+            return _queue_name(target)
+    return IO_QUEUE
+
+
+def install_routes(app):
+    """Declare both queues and route every task through the table"""
+    from kombu import Queue
+
+    routes = load_routes()
+    queues = {IO_QUEUE, CPU_QUEUE} | {_queue_name(target) for target in routes.values()}
+    app.conf.task_queues = [Queue(name) for name in sorted(queues)]
+    app.conf.task_default_queue = IO_QUEUE
+    app.conf.task_routes = (lambda name, args, kwargs, options, task=None, **kw: {"queue": queue_for(name, routes)},)
+
+
+def queue_depths(app) -> Dict[str, Optional[int]]:
+    """Messages waiting per declared queue (None when the broker cannot say)"""
+    depths = {}
+    with app.connection_for_read() as connection:
+        for queue in app.conf.task_queues or []:
+            # A failed passive declare closes the channel on AMQP brokers, so use one per queue
+            channel = connection.channel()
+            try:
+                depths[queue.name] = channel.queue_declare(queue=queue.name, passive=True).message_count
+            except Exception as e:
+                if str(getattr(e, "reply_code", "")) == "404":
+                    depths[queue.name] = 0  # not declared yet: nothing was ever routed there
+                else:
+                    logger.warning(f"Queue depth for {queue.name} unavailable: {str(e)}")
+                    depths[queue.name] = None
+            finally:
+                try:
+                    channel.close()
+                except Exception:
+                    pass
+    return depths
@@ -1,22 +1,38 @@
 import os
 import json
 from io import StringIO, BytesIO
-from celery import Celery
-from pdfminer.high_level import extract_text_to_fp
-from pdfminer.layout import LAParams
+from celery import Celery, chain, chord, signature
+from celery.result import AsyncResult, GroupResult
+from celery.signals import worker_process_init, worker_process_shutdown
 import base64
 from datetime import datetime
 from llm_service import LLMService
-from minio import Minio
-from minio.error import MinioException
+import fake_llm
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Paragraph
 from reportlab.lib.styles import getSampleStyleSheet
 from api_client import APIClient, AIService
 from resume_parser import ResumeParser
-from typing import Dict, Optional
+from cv_cache import ExtractionCache, extract_pdf_text, extraction_cache
+from cv_store import StructuredCVStore, structured_cv_store
+from letter_stream import open_publisher
+from artifact_store import artifact_store
+from llm_gateway import llm_gateway
+import llm_cache
+import metrics
+import profiling
+import routing
+from metrics import StageTimer
+from job_analysis import job_analysis_store
+from prompt_budget import Section, compact_json, fit_sections, strip_indent
+from relevance import select_relevant
+from http_client import close_http_client
+from async_runtime import run_async, start_runtime, stop_runtime
+from typing import Dict, List, Optional
 import asyncio
 import logging
+import uuid
+from dotenv import load_dotenv
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -33,27 +49,37 @@ celery_app = Celery(
     result_backend_transport_options={'visibility_timeout': 3600}
 )
 celery_app.conf.broker_connection_retry_on_startup = True
+routing.install_routes(celery_app)
 
-llm_service = LLMService(os.environ["OPENAI_API_KEY"])
-api_client = APIClient()
+metrics.install_celery_metrics(celery_app)
+metrics.observe_gateway(llm_gateway)
+metrics.observe_cache("llm", llm_cache)
+metrics.observe_cache("cv_text", extraction_cache)
+metrics.observe_cache("cv_json", structured_cv_store)
+metrics.observe_cache("job_analysis", job_analysis_store)
 
-# MinIO Configuration (optional, falls back if not configured)
-minio_client = None
-if os.getenv("MINIO_ENDPOINT") and os.getenv("MINIO_ACCESS_KEY") and os.getenv("MINIO_SECRET_KEY"):
-    minio_client = Minio(
-        os.getenv("MINIO_ENDPOINT"),
-        access_key=os.getenv("MINIO_ACCESS_KEY"),
-        secret_key=os.getenv("MINIO_SECRET_KEY"),
-        secure=False  # Set to True if using HTTPS
-    )
+profile_store = profiling.ArtifactProfileStore(artifact_store)
+profiling.install_task_profiler(celery_app, profile_store)
+
+@worker_process_init.connect
+def start_async_runtime(**kwargs):
+    start_runtime()
+
+@worker_process_shutdown.connect
+def stop_async_runtime(**kwargs):
+    stop_runtime(close_http_client)
+
+llm_service = LLMService(os.getenv("OPENAI_API_KEY") if fake_llm.enabled() else os.environ["OPENAI_API_KEY"])
+api_client = APIClient()
 
 def parse_cv_content(cv_content: str) -> str:
+    return parse_cv_bytes(base64.b64decode(cv_content))
+
+def parse_cv_bytes(cv_bytes: bytes) -> str:
+    """Extract text from already-decoded CV bytes (PDF or UTF-8 text)"""
     try:
-        cv_bytes = base64.b64decode(cv_content)
         if cv_bytes.startswith(b'%PDF-'):
-            output = StringIO()
-            extract_text_to_fp(BytesIO(cv_bytes), output, laparams=LAParams())
-            return output.getvalue()
+            return extract_pdf_text(cv_bytes)
         try:
             return cv_bytes.decode('utf-8')
         except UnicodeDecodeError:
@@ -61,26 +87,54 @@ def parse_cv_content(cv_content: str) -> str:
     except Exception as e:
         raise ValueError(f"CV processing failed: {str(e)}")
 
-def rewrite_cv_for_clarity(cv_text: str, jd_text: str, skills: str = "", experience: str = "") -> dict:
-    prompt = f"""
+def _is_json(text: str) -> bool:
+    try:
+        json.loads(text)
+        return True
+    except ValueError:
+        return False
+
+# Budget entry (PROMPT_TOKEN_BUDGETS) for prompts sent through the routed OpenAI tiers
+PROMPT_BUDGET_KEY = os.getenv("PROMPT_BUDGET_KEY", "openai")
+
+def build_rewrite_prompt(cv_text: str, jd_text: str, skills: str = "", experience: str = "") -> str:
+    parts = fit_sections(
+        PROMPT_BUDGET_KEY,
+        cv=Section(cv_text, jd_text),
+        jd=Section(jd_text, max_tokens=125),
+        extra=Section(f"Additional skills: {skills}, Additional experience: {experience}")
+    )
+    return strip_indent(f"""
     Analyze the following resume and extract key information into a structured JSON format.
-    Focus on details relevant to this job description: {jd_text[:500]}...
-    Additional skills: {skills}, Additional experience: {experience}
+    Focus on details relevant to this job description: {parts['jd']}
+    {parts['extra']}
 
     Resume Text:
     ---
-    {cv_text}
+    {parts['cv']}
     ---
 
     Output only a JSON object with keys: "name", "contact", "summary", "experience", and "skills".
-    """
+    """)
+
+def rewrite_cv_for_clarity(cv_text: str, jd_text: str, skills: str = "", experience: str = "", bypass_cache: bool = False) -> dict:
+    prompt = build_rewrite_prompt(cv_text, jd_text, skills, experience)
     try:
-        response = llm_service.generate_text(prompt, tone="professional")
+        response = llm_service.generate_text(
+            prompt, tone="professional", bypass_cache=bypass_cache, validate=_is_json
+        )
         return json.loads(response)
     except (json.JSONDecodeError, ValueError):
         return {"error": "Failed to parse CV into JSON", "raw_cv": cv_text}
 
-def generate_letter_text(cv_json: dict, jd_text: str, tone: str, skills: str = "", experience: str = "", doc_type: str = "cover_letter") -> str:
+def build_letter_prompt(cv_json: dict, jd_text: str, tone: str, skills: str = "", experience: str = "", doc_type: str = "cover_letter", job: Optional[Dict] = None) -> str:
+    """`job` is the cached job analysis when the listing came from the job API"""
+    parts = fit_sections(
+        PROMPT_BUDGET_KEY,
+        jd=Section(jd_text, compact_json(cv_json)),
+        cv=Section(select_relevant(cv_json, jd_text), jd_text)
+    )
+    requirements = f"Key requirements: {', '.join(job['skills'][:15])}." if job and job.get("skills") else ""
     if doc_type == "cover_letter":
         prompt = f"""
         You are a professional career coach writing a compelling cover letter.
@@ -88,17 +142,18 @@ def generate_letter_text(cv_json: dict, jd_text: str, tone: str, skills: str = "
         Tone: {tone}.
         Use the candidate's JSON resume and the full job description below.
         Highlight 2-3 key qualifications that directly match the job description, including additional skills: {skills} and experience: {experience}.
+        {requirements}
         Express enthusiasm for the role and end with a clear call to action.
         Use placeholders [Your Name], [Company Name] for user info to be replaced later.
 
         Job Description:
         ---
-        {jd_text}
+        {parts['jd']}
         ---
 
         Candidate's Resume Data (JSON):
         ---
-        {json.dumps(cv_json, indent=2)}
+        {parts['cv']}
         ---
 
         Cover Letter:
@@ -110,28 +165,47 @@ def generate_letter_text(cv_json: dict, jd_text: str, tone: str, skills: str = "
         Tone: {tone}.
         Use the candidate's JSON resume and job details below.
         Mention the application date as today's date and align skills with the job, including additional skills: {skills} and experience: {experience}.
+        {requirements}
         End with a polite call to action.
 
         Job Details:
         ---
-        {jd_text}
+        {parts['jd']}
         ---
 
         Candidate's Resume Data (JSON):
         ---
-        {json.dumps(cv_json, indent=2)}
+        {parts['cv']}
         ---
 
         Email Body:
         """
-    response = llm_service.generate_text(prompt, tone=tone)
+    return strip_indent(prompt)
+
+def generate_letter_text(cv_json: dict, jd_text: str, tone: str, skills: str = "", experience: str = "", doc_type: str = "cover_letter", bypass_cache: bool = False, on_chunk=None, job: Optional[Dict] = None) -> str:
+    prompt = build_letter_prompt(cv_json, jd_text, tone, skills, experience, doc_type, job)
+    response = llm_service.generate_text(prompt, tone=tone, bypass_cache=bypass_cache, on_chunk=on_chunk)
     if doc_type == "cover_letter":
         letter = response.replace("[Your Name]", cv_json.get("name", "Candidate Name"))
-        letter = letter.replace("[Company Name]", jd_text.split("Company:")[1].split("\n")[0].strip() if "Company:" in jd_text else "Company Name")
+        if job and job.get("company"):
+            company = job["company"]
+        else:
+            company = jd_text.split("Company:")[1].split("\n")[0].strip() if "Company:" in jd_text else "Company Name"
+        letter = letter.replace("[Company Name]", company)
     else:
         letter = response.replace("[Your Name]", cv_json.get("name", "Candidate Name"))
     return letter
 
+def load_structured_cv(user_id: str, cv_key: str, cv_text: str, jd_text: str, skills: str = "", experience: str = "", refresh: bool = False) -> dict:
+    """Structured CV for this user's current resume (`cv_key`: its content hash); the LLM rewrite only runs when it isn't stored yet"""
+    return structured_cv_store.get_or_create(
+        user_id,
+        cv_key,
+        lambda: rewrite_cv_for_clarity(cv_text, jd_text, skills, experience, refresh),
+        variant=StructuredCVStore.variant_for(skills, experience),
+        refresh=refresh
+    )
+
 def convert_to_pdf(text: str) -> bytes:
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=letter)
@@ -140,169 +214,357 @@ def convert_to_pdf(text: str) -> bytes:
     doc.build(flowables)
     return buffer.getvalue()
 
-def store_in_object_storage(content: bytes, filename: str, content_type: str) -> str:
-    if not minio_client:
-        return ""
-    bucket_name = os.getenv("MINIO_BUCKET_NAME", "job-docs")
+def store_document(content: str, name: str) -> Dict:
+    """Write the PDF and text renditions to the artifact store and return their refs.
+
+    Task results keep only these refs so the result backend never holds document bytes.
+    """
+    return {
+        "pdf": artifact_store.put(f"{name}.pdf", convert_to_pdf(content), "application/pdf"),
+        "text": artifact_store.put(f"{name}.txt", content.encode('utf-8'), "text/plain")
+    }
+
+@celery_app.task(bind=True, time_limit=60, acks_late=True)
+def fetch_cv(self, user_id: str) -> Dict:
+    """I/O stage: fetch the user's CV for extract_cv_text. Errors are handed on, never raised"""
+    stages = StageTimer(self.name)
     try:
-        minio_client.make_bucket(bucket_name) if not minio_client.bucket_exists(bucket_name) else None
-        minio_client.put_object(bucket_name, filename, BytesIO(content), length=len(content), content_type=content_type)
-        return f"http://{os.getenv('MINIO_ENDPOINT')}/{bucket_name}/{filename}"
-    except MinioException as e:
-        logger.error(f"MinIO storage failed: {str(e)}")
-        return ""
+        stages.enter('fetching_profile')
+        profile = run_async(api_client.get_user_profile(user_id))
+        return {"user_id": user_id, "content": profile.get("resume", {}).get("content", "")}
+    except Exception as e:
+        logger.warning(f"CV fetch stage for {user_id} failed, leaving it to the last stage: {str(e)}")
+        return {"user_id": user_id, "error": str(e)}
+    finally:
+        stages.close()
+
+@celery_app.task(bind=True, time_limit=120, acks_late=True)
+def extract_cv_text(self, fetched: Dict, then: Dict):
+    """CPU stage: lay out the fetched CV and queue `then` with the text passed in as `cv`.
+
+    `then` always runs: when fetching or extraction failed it gets cv=None, fetches
+    and extracts itself and reports the failure through its own retries.
+    """
+    stages = StageTimer(self.name)
+    cv = None
+    try:
+        if "error" in fetched:
+            raise ValueError(fetched["error"])
+        cv_bytes = base64.b64decode(fetched["content"])
+        if len(cv_bytes) == 0:
+            raise ValueError("Empty CV content received")
+        stages.enter('extracting_text')
+        cv = {"cv_key": ExtractionCache.key_for(cv_bytes), "cv_text": parse_cv_bytes(cv_bytes)}
+    except Exception as e:
+        logger.warning(f"CV extraction stage for {fetched.get('user_id')} failed, leaving it to the last stage: {str(e)}")
+    finally:
+        stages.close()
+    then = signature(then, app=celery_app)
+    # The signatures are immutable (.si), so the keyword goes onto the first task directly
+    first = then.tasks[0] if then.task == "celery.chain" else then
+    first.kwargs["cv"] = cv
+    then.apply_async()
+
+def after_cv_extraction(user_id: str, then) -> AsyncResult:
+    """Queue fetch_cv (I/O queue) -> extract_cv_text (CPU queue) -> `then` (I/O queue).
+
+    `then` receives the CV text as its `cv` keyword. Its task id is fixed here, so the
+    returned result can be handed out before `then` itself is queued.
+    """
+    result = then.freeze()
+    chain(fetch_cv.si(user_id), extract_cv_text.s(then)).apply_async()
+    return result
+
+def load_cv(user_id: str, cv: Optional[Dict], default_content: str = "") -> Dict:
+    """`cv` from extract_cv_text, or fetched and extracted here when that stage did not run or failed"""
+    if cv is not None:
+        return cv
+    profile = run_async(api_client.get_user_profile(user_id))
+    if not profile:
+        raise ValueError("Profile not found")
+    cv_bytes = base64.b64decode(profile.get("resume", {}).get("content", default_content))
+    if len(cv_bytes) == 0:
+        raise ValueError("Empty CV content received")
+    return {"cv_key": ExtractionCache.key_for(cv_bytes), "cv_text": parse_cv_bytes(cv_bytes)}
 
 @celery_app.task(bind=True, max_retries=3, time_limit=300, acks_late=True)
-def generation_pipeline_task(self, job_description: str, user_id: str, tone: str, skills: str = "", experience: str = "", doc_type: str = "cover_letter"):
+def generation_pipeline_task(self, job_description: str, user_id: str, tone: str, skills: str = "", experience: str = "", doc_type: str = "cover_letter", bypass_cache: bool = False, stream: bool = False, job_id: str = "", cv: Optional[Dict] = None):
+    publisher = open_publisher(self.request.id, stream)
+    stages = StageTimer(self.name)
     try:
         debug_dir = "cv_debug"
         os.makedirs(debug_dir, exist_ok=True)
         task_id = self.request.id
-        debug_path = os.path.join(debug_dir, f"cv_{task_id}.bin")
+        debug_path = os.path.join(debug_dir, f"cv_{task_id}.txt")
         
         self.update_state(state='PROGRESS', meta={'stage': 'validating_input'})
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        profile = loop.run_until_complete(api_client.get_user_profile(user_id))
-        cv_content = profile.get("resume", {}).get("content", "base64_encoded_cv_placeholder")
-        cv_bytes = base64.b64decode(cv_content)
-        with open(debug_path, "wb") as f:
-            f.write(cv_bytes)
-        if len(cv_bytes) == 0:
-            raise ValueError("Empty CV content received")
+        stages.enter('validating_input')
+        publisher.stage('validating_input')
+        job = None
+        if job_id:
+            job = run_async(job_analysis_store.get_or_analyze(job_id, api_client.get_job_listing))
+            job_description = job_description or job["description"]
+        if not job_description:
+            raise ValueError("Empty job description")
 
         self.update_state(state='PROGRESS', meta={'stage': 'extracting_text'})
-        cv_text = parse_cv_content(cv_content)
+        stages.enter('extracting_text')
+        publisher.stage('extracting_text')
+        cv = load_cv(user_id, cv, "base64_encoded_cv_placeholder")
+        with open(debug_path, "w", encoding="utf-8") as f:
+            f.write(cv["cv_text"])
         
         self.update_state(state='PROGRESS', meta={'stage': 'analyzing_cv'})
-        cv_json = rewrite_cv_for_clarity(cv_text, job_description, skills, experience)
+        stages.enter('analyzing_cv')
+        publisher.stage('analyzing_cv')
+        cv_json = load_structured_cv(user_id, cv["cv_key"], cv["cv_text"], job_description, skills, experience, bypass_cache)
         
         self.update_state(state='PROGRESS', meta={'stage': 'generating_document'})
-        content = generate_letter_text(cv_json, job_description, tone, skills, experience, doc_type)
-        
-        pdf_content = convert_to_pdf(content)
-        text_content = content.encode('utf-8')
+        stages.enter('generating_document')
+        publisher.stage('generating_document')
+        content = generate_letter_text(cv_json, job_description, tone, skills, experience, doc_type, bypass_cache, on_chunk=publisher.chunk if stream else None, job=job)
+        publisher.done(content)
         
-        pdf_url = store_in_object_storage(pdf_content, f"{doc_type}_{task_id}.pdf", "application/pdf")
-        text_url = store_in_object_storage(text_content, f"{doc_type}_{task_id}.txt", "text/plain")
+        stages.enter('storing_document')
+        artifacts = store_document(content, f"{doc_type}_{task_id}")
         
         return {
             "status": "success",
-            "content": content,
-            "pdf_url": pdf_url,
-            "text_url": text_url,
-            "pdf_content": base64.b64encode(pdf_content).decode() if pdf_content else "",
+            "artifacts": artifacts,
+            "pdf_url": artifacts["pdf"]["url"],
+            "text_url": artifacts["text"]["url"],
             "debug_path": debug_path,
             "generated_at": datetime.utcnow().isoformat(),
-            "job_description": job_description
+            "job_description_preview": job_description[:100]
         }
     except Exception as e:
         error_msg = f"Task {task_id} failed: {str(e)}"
         with open(os.path.join(debug_dir, f"error_{task_id}.log"), "w") as f:
             f.write(f"Error: {error_msg}\n")
         if self.request.retries == self.max_retries:
+            publisher.error(error_msg)
             return {"status": "failed", "error": error_msg, "debug_path": debug_path}
+        publisher.reset()
+        publisher.stage('retrying')
         raise self.retry(exc=e, countdown=min(300, 60 * (2 ** self.request.retries)))
     finally:
-        loop.close()
+        stages.close()
+
+@celery_app.task(bind=True, max_retries=3, time_limit=300, acks_late=True)
+def prepare_batch_cv(self, user_id: str, focus_job_description: str = "", skills: str = "", experience: str = "", bypass_cache: bool = False, cv: Optional[Dict] = None) -> Dict:
+    """Batch stage 1: structure the CV once for every job in the batch"""
+    stages = StageTimer(self.name)
+    try:
+        self.update_state(state='PROGRESS', meta={'stage': 'extracting_text'})
+        stages.enter('extracting_text')
+        cv = load_cv(user_id, cv)
+
+        self.update_state(state='PROGRESS', meta={'stage': 'analyzing_cv'})
+        stages.enter('analyzing_cv')
+        cv_json = load_structured_cv(user_id, cv["cv_key"], cv["cv_text"], focus_job_description, skills, experience, bypass_cache)
+        if "error" in cv_json:
+            raise ValueError(cv_json["error"])
+        return {"user_id": user_id, "cv_json": cv_json}
+    except Exception as e:
+        raise self.retry(exc=e, countdown=min(300, 60 * (2 ** self.request.retries)))
+    finally:
+        stages.close()
+
+@celery_app.task(bind=True, max_retries=3, time_limit=300, acks_late=True)
+def generate_batch_letter(self, prepared: Dict, item: Dict, tone: str, skills: str = "", experience: str = "", bypass_cache: bool = False) -> Dict:
+    """Batch stage 2: one letter per job, fanned out as the chord header"""
+    task_id = self.request.id
+    stages = StageTimer(self.name)
+    try:
+        job_description = item.get("job_description")
+        job = None
+        if not job_description:
+            job = run_async(job_analysis_store.get_or_analyze(item["job_id"], api_client.get_job_listing))
+            job_description = job["description"]
+        if not job_description:
+            raise ValueError("Empty job description")
+
+        self.update_state(state='PROGRESS', meta={'stage': 'generating_document'})
+        stages.enter('generating_document')
+        content = generate_letter_text(prepared["cv_json"], job_description, tone, skills, experience, "cover_letter", bypass_cache, job=job)
+        stages.enter('storing_document')
+        artifacts = store_document(content, f"cover_letter_{task_id}")
+        return {
+            "status": "success",
+            "index": item["index"],
+            "job_id": item.get("job_id"),
+            "task_id": task_id,
+            "artifacts": artifacts,
+            "pdf_url": artifacts["pdf"]["url"],
+            "text_url": artifacts["text"]["url"],
+            "generated_at": datetime.utcnow().isoformat()
+        }
+    except Exception as e:
+        if self.request.retries == self.max_retries:
+            # Report instead of raising so the chord callback still runs for the rest of the batch
+            return {"status": "failed", "index": item["index"], "job_id": item.get("job_id"), "task_id": task_id, "error": str(e)}
+        raise self.retry(exc=e, countdown=min(300, 60 * (2 ** self.request.retries)))
+    finally:
+        stages.close()
+
+@celery_app.task
+def collect_batch_results(results: List[Dict], batch_id: str) -> Dict:
+    """Batch stage 3: chord callback gathering every letter in request order"""
+    items = sorted(results, key=lambda r: r["index"])
+    succeeded = sum(1 for r in items if r["status"] == "success")
+    return {
+        "batch_id": batch_id,
+        "status": "completed",
+        "succeeded": succeeded,
+        "failed": len(items) - succeeded,
+        "items": items,
+        "completed_at": datetime.utcnow().isoformat()
+    }
+
+def dispatch_cover_letter_batch(user_id: str, jobs: List[Dict], tone: str, skills: str = "", experience: str = "", bypass_cache: bool = False) -> Dict:
+    """Queue fetch -> extract -> prepare -> chord(letters, collect) for one user and many jobs.
+
+    Task ids are assigned up front and saved as a GroupResult under the batch id
+    (CV preparation first, then one entry per job) so per-item status can be
+    looked up later; the chord callback itself runs under the batch id.
+    """
+    batch_id = str(uuid.uuid4())
+    prepare_id = str(uuid.uuid4())
+    items = [
+        {"index": i, "task_id": str(uuid.uuid4()), **{k: v for k, v in job.items() if k in ("job_id", "job_description")}}
+        for i, job in enumerate(jobs)
+    ]
+    focus = next((item["job_description"] for item in items if item.get("job_description")), "")
+    header = [
+        generate_batch_letter.s(
+            {k: v for k, v in item.items() if k != "task_id"}, tone, skills, experience, bypass_cache
+        ).set(task_id=item["task_id"])
+        for item in items
+    ]
+    workflow = chain(
+        prepare_batch_cv.si(user_id, focus, skills, experience, bypass_cache).set(task_id=prepare_id),
+        chord(header, collect_batch_results.s(batch_id).set(task_id=batch_id))
+    )
+    GroupResult(
+        batch_id,
+        [AsyncResult(prepare_id, app=celery_app)] + [AsyncResult(item["task_id"], app=celery_app) for item in items],
+        app=celery_app
+    ).save()
+    after_cv_extraction(user_id, workflow)
+    return {
+        "batch_id": batch_id,
+        "prepare_task_id": prepare_id,
+        "items": [{"index": item["index"], "task_id": item["task_id"], "job_id": item.get("job_id")} for item in items]
+    }
+
+@celery_app.task
+def prewarm_job_analyses(limit: int = 50) -> Dict:
+    """Beat task: analyze newly posted listings before the first applications arrive"""
+    listings = run_async(api_client.get_recent_job_listings(limit))
+    warmed = 0
+    for listing in listings:
+        job_id = str(listing.get("id") or listing.get("_id") or "")
+        if job_id and job_analysis_store.get(job_id) is None:
+            job_analysis_store.put(job_id, listing)
+            warmed += 1
+    return {"listings": len(listings), "warmed": warmed}
+
+if os.getenv("JOB_PREWARM_INTERVAL"):
+    celery_app.conf.beat_schedule = {
+        "prewarm-job-analyses": {
+            "task": prewarm_job_analyses.name,
+            "schedule": float(os.getenv("JOB_PREWARM_INTERVAL")),
+            "args": (int(os.getenv("JOB_PREWARM_LIMIT", "50")),)
+        }
+    }
 
 @celery_app.task(bind=True, max_retries=3)
 def generate_resume(self, user_id: str, template: str = "modern", job_description: str = ""):
     try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            profile = loop.run_until_complete(api_client.get_user_profile(user_id))
-            if not profile:
-                raise ValueError("Profile not found")
-
-            resume_text = None
-            if profile.get('resume', {}).get('content'):
-                raw_content = base64.b64decode(profile['resume']['content'])
-                if raw_content.startswith(b'%PDF-'):
-                    resume_text = extract_text(BytesIO(raw_content))
-                else:
-                    try:
-                        resume_text = raw_content.decode('utf-8')
-                    except UnicodeDecodeError:
-                        resume_text = "[Unsupported binary content]"
-
-            if resume_text and resume_text != "[Unsupported binary content]":
-                parser = ResumeParser()
-                contact = parser.parse_contact(resume_text)
-                profile.update({
-                    "name": profile.get("name") or parser.parse_name(resume_text),
-                    "email": contact["email"] or profile.get("email", ""),
-                    "phone": contact["phone"] or profile.get("phone"),
-                    "location": profile.get("location") or parser.parse_location(resume_text),
-                    "education": profile.get("education") or parser.parse_education(resume_text),
-                    "experience": profile.get("experience") or parser.parse_experience(resume_text)
-                })
-
-            enhanced_content = resume_text
-            if os.getenv("OPENAI_API_KEY") and job_description and resume_text and resume_text != "[Unsupported binary content]":
+        profile = run_async(api_client.get_user_profile(user_id))
+        if not profile:
+            raise ValueError("Profile not found")
+
+        resume_text = None
+        if profile.get('resume', {}).get('content'):
+            raw_content = base64.b64decode(profile['resume']['content'])
+            if raw_content.startswith(b'%PDF-'):
+                resume_text = extract_pdf_text(raw_content)
+            else:
                 try:
-                    enhanced_content = AIService().enhance_resume_text(resume_text, job_description)
-                except Exception as ai_error:
-                    logger.warning(f"AI enhancement failed: {ai_error}")
-                    enhanced_content = resume_text
-
-            result = {
-                "metadata": {
-                    "user_id": user_id,
-                    "template": template,
-                    "generated_at": datetime.utcnow().isoformat(),
-                    "source": "PDF" if raw_content.startswith(b'%PDF-') else "Text"
-                },
-                "profile": {
-                    "name": profile.get("name"),
-                    "contact": {
-                        "email": profile.get("email"),
-                        "phone": profile.get("phone"),
-                        "location": profile.get("location")
-                    },
-                    "education": profile.get("education", []),
-                    "experience": profile.get("experience", []),
-                    "skills": {
-                        "technical": profile.get("technical_skills", []),
-                        "professional": profile.get("professional_skills", []),
-                        "languages": profile.get("languages", [])
-                    }
+                    resume_text = raw_content.decode('utf-8')
+                except UnicodeDecodeError:
+                    resume_text = "[Unsupported binary content]"
+
+        if resume_text and resume_text != "[Unsupported binary content]":
+            parsed = ResumeParser.parse(resume_text)
+            contact = parsed.contact
+            profile.update({
+                "name": profile.get("name") or parsed.name,
+                "email": contact["email"] or profile.get("email", ""),
+                "phone": contact["phone"] or profile.get("phone"),
+                "location": profile.get("location") or parsed.location,
+                "education": profile.get("education") or parsed.education,
+                "experience": profile.get("experience") or parsed.experience
+            })
+
+        enhanced_content = resume_text
+        if fake_llm.has_api_key("OPENAI_API_KEY") and job_description and resume_text and resume_text != "[Unsupported binary content]":
+            try:
+                enhanced_content = AIService().enhance_resume_text(resume_text, job_description)
+            except Exception as ai_error:
+                logger.warning(f"AI enhancement failed: {ai_error}")
+                enhanced_content = resume_text
+
+        result = {
+            "metadata": {
+                "user_id": user_id,
+                "template": template,
+                "generated_at": datetime.utcnow().isoformat(),
+                "source": "PDF" if raw_content.startswith(b'%PDF-') else "Text"
+            },
+            "profile": {
+                "name": profile.get("name"),
+                "contact": {
+                    "email": profile.get("email"),
+                    "phone": profile.get("phone"),
+                    "location": profile.get("location")
                 },
-                "content": {
-                    "original": resume_text,
-                    "enhanced": enhanced_content,
-                    "job_description": job_description
+                "education": profile.get("education", []),
+                "experience": profile.get("experience", []),
+                "skills": {
+                    "technical": profile.get("technical_skills", []),
+                    "professional": profile.get("professional_skills", []),
+                    "languages": profile.get("languages", [])
                 }
+            },
+            "content": {
+                "original": resume_text,
+                "enhanced": enhanced_content,
+                "job_description": job_description
             }
-            return result
-        finally:
-            loop.close()
+        }
+        return result
     except Exception as e:
         logger.error(f"Resume generation failed: {str(e)}", exc_info=True)
         self.retry(exc=e, countdown=min(60 * (2 ** self.request.retries), 300))
 @celery_app.task(bind=True, max_retries=3, time_limit=45, soft_time_limit=40)
-def generate_followup_email(self, user_id: str, job_id: str) -> Dict:
+def generate_followup_email(self, user_id: str, job_id: str, cv: Optional[Dict] = None) -> Dict:
     try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
         try:
-            profile = loop.run_until_complete(api_client.get_user_profile(user_id))
-            job_description = loop.run_until_complete(fetch_job_description(job_id))
-            if not profile or not job_description:
+            job = run_async(job_analysis_store.get_or_analyze(job_id, api_client.get_job_listing))
+            job_description = job["description"]
+            if not job_description:
                 raise ValueError("Profile or job data not found")
 
-            cv_content = profile.get("resume", {}).get("content", "base64_encoded_cv_placeholder")
-            cv_text = parse_cv_content(cv_content)
-            cv_json = rewrite_cv_for_clarity(cv_text, job_description)
+            cv = load_cv(user_id, cv, "base64_encoded_cv_placeholder")
+            cv_json = load_structured_cv(user_id, cv["cv_key"], cv["cv_text"], job_description)
 
-            content = generate_letter_text(cv_json, job_description, "Professional", doc_type="follow_up_email")
-            pdf_content = convert_to_pdf(content)
-            text_content = content.encode('utf-8')
-            
-            pdf_url = store_in_object_storage(pdf_content, f"followup_{self.request.id}.pdf", "application/pdf")
-            text_url = store_in_object_storage(text_content, f"followup_{self.request.id}.txt", "text/plain")
+            content = generate_letter_text(cv_json, job_description, "Professional", doc_type="follow_up_email", job=job)
+            name = f"followup_{self.request.id}"
+            artifacts = store_document(content, name)
+            html = "<html><body><p>" + content.replace('\n', '<br>') + "</p></body></html>"
+            artifacts["html"] = artifact_store.put(f"{name}.html", html.encode('utf-8'), "text/html")
 
             return {
                 'metadata': {
@@ -312,12 +574,11 @@ def generate_followup_email(self, user_id: str, job_id: str) -> Dict:
                     'data_source': "api"
                 },
                 'email': {
-                    'to': job_description.split("Contact:")[1].split("\n")[0].strip() if "Contact:" in job_description else "hiring@company.com",
-                    'subject': f"Follow-up: Application for {cv_json.get('name', 'the position')}",
-                    'text': content,
-                    'html': f"<html><body><p>{content.replace('\n', '<br>')}</p></body></html>",
-                    'pdf_url': pdf_url,
-                    'text_url': text_url
+                    'to': job["contact_email"] or "hiring@company.com",
+                    'subject': f"Follow-up: Application for {job['title'] or cv_json.get('name', 'the position')}",
+                    'artifacts': artifacts,
+                    'pdf_url': artifacts['pdf']['url'],
+                    'text_url': artifacts['text']['url']
                 }
             }
         except asyncio.TimeoutError:
@@ -325,7 +586,5 @@ def generate_followup_email(self, user_id: str, job_id: str) -> Dict:
         except Exception as e:
             logger.error(f"Processing error: {str(e)}")
             raise self.retry(exc=e, countdown=min(120 * (2 ** self.request.retries), 600))
-        finally:
-            loop.close()
     except Exception as e:
         raise
\ No newline at end of file
@@ -3,6 +3,11 @@ import os
 from dotenv import load_dotenv
 from typing import Optional, Dict, Any
 from fastapi import HTTPException, status
+from services.http_client import get_http_client
+from services.llm_cache import cached_completion
+from services.llm_gateway import SlotTimeout, is_rate_limited, llm_gateway
+from services.model_router import ModelRouter
+from services import fake_llm
 import google.generativeai as genai
 import base64
 
@@ -14,37 +19,47 @@ handler = logging.StreamHandler()
 handler.setLevel(logging.DEBUG)
 load_dotenv()
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+# LLM_BACKEND=fake swaps Gemini for the offline stand-in used by benchmarks and CI
+GenerativeModel = fake_llm.FakeGenerativeModel if fake_llm.enabled() else genai.GenerativeModel
 print(f"Gemini API Key: {'Exists' if os.getenv('GEMINI_API_KEY') else 'Missing'}")
+
+# Quality tier per model, in preference order (override with GEMINI_ROUTER_MODELS)
+GEMINI_MODELS = {
+    'models/gemini-1.5-flash-latest': 'standard',  # Lower cost option first
+    'models/gemini-pro': 'standard',
+    'models/gemini-1.0-pro': 'standard'
+}
+gemini_router = ModelRouter.from_env("GEMINI_ROUTER_MODELS", GEMINI_MODELS, default_tier="standard")
 class AIService:
     @staticmethod
     @staticmethod
-    def enhance_resume_text(raw_text: str, job_description: str = "") -> str:
-        if not os.getenv("GEMINI_API_KEY"):
+    def enhance_resume_text(raw_text: str, job_description: str = "", bypass_cache: bool = False) -> str:
+        if not fake_llm.has_api_key("GEMINI_API_KEY"):
             logger.warning("Gemini API key not configured - skipping enhancement")
             return raw_text
             
         try:
-            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-            
-            model_priority = [
-                'models/gemini-1.5-flash-latest',  # Lower cost option first
-                'models/gemini-pro',
-                'models/gemini-1.0-pro'
-            ]
-            
-            for model_name in model_priority:
-                try:
-                    model = genai.GenerativeModel(model_name)
-                    prompt = f"Improve this resume for job application:\n{raw_text}\n\nJob Description: {job_description}\nKeep the original structure but enhance the wording."
-                    response = model.generate_content(prompt)
-                    return response.text
-                except Exception as e:
-                    logger.warning(f"Model {model_name} failed: {str(e)}")
-                    if "quota" in str(e).lower():
-                        break  # Don't try other models if quota is exceeded
-                    continue
-                    
-            return raw_text  # Fallback to original text
+            prompt = f"Improve this resume for job application:\n{raw_text}\n\nJob Description: {job_description}\nKeep the original structure but enhance the wording."
+
+            def generate(model_name: str, timeout: float) -> str:
+                model = GenerativeModel(model_name)
+                return llm_gateway.call(
+                    model_name, prompt,
+                    gemini_router.timed(
+                        lambda: model.generate_content(prompt, request_options={"timeout": timeout}).text
+                    )
+                )
+
+            tier = gemini_router.default_tier
+            return cached_completion(
+                f"tier:{tier}", prompt,
+                # Don't try other models if quota is exceeded
+                lambda: gemini_router.call(
+                    generate, tier=tier, stop_on=is_rate_limited,
+                    ignore=lambda error: isinstance(error, SlotTimeout)
+                ),
+                bypass_cache=bypass_cache
+            )
             
         except Exception as e:
             logger.error(f"Gemini service error: {str(e)}")
@@ -103,22 +118,22 @@ class APIClient:
     async def get_user_profile(self, user_id: str) -> dict:
         """Fetch profile with automatic resume downloading"""
         try:
-            async with httpx.AsyncClient() as client:
-                # 1. Get profile data
-                profile_url = f"{self.profile_api}/get-profile/{user_id}"
-                response = await client.get(profile_url, timeout=self.timeout)
-                response.raise_for_status()
-                data = response.json()
+            client = get_http_client()
+            # 1. Get profile data
+            profile_url = f"{self.profile_api}/get-profile/{user_id}"
+            response = await client.get(profile_url, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
 
-                # 2. Download resume if URL exists
-                resume_url = data.get("data", {}).get("resume")
-                if isinstance(resume_url, str):
-                    resume_response = await client.get(resume_url, timeout=self.timeout)
-                    resume_response.raise_for_status()
-                    # Store the downloaded content
-                    data["data"]["resume_content"] = base64.b64encode(resume_response.content).decode()
+            # 2. Download resume if URL exists
+            resume_url = data.get("data", {}).get("resume")
+            if isinstance(resume_url, str):
+                resume_response = await client.get(resume_url, timeout=self.timeout)
+                resume_response.raise_for_status()
+                # Store the downloaded content
+                data["data"]["resume_content"] = base64.b64encode(resume_response.content).decode()
 
-                return self._normalize_profile(data)
+            return self._normalize_profile(data)
                 
         except Exception as e:
             logger.error(f"Profile fetch failed: {str(e)}")
@@ -260,18 +275,18 @@ class APIClient:
 
     async def get_job_listing(self, job_id: str) -> Dict[str, Any]:
         """Fetch job listing details"""
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(
-                    f"{self.job_api}/{job_id}",
-                    timeout=self.timeout
-                )
-                response.raise_for_status()
-                return response.json()
-            except httpx.HTTPStatusError as e:
-                raise HTTPException(
-                    status_code=status.HTTP_502_BAD_GATEWAY,
-                    detail=f"Job API error: {str(e)}"
-                )
+        client = get_http_client()
+        try:
+            response = await client.get(
+                f"{self.job_api}/{job_id}",
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPStatusError as e:
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail=f"Job API error: {str(e)}"
+            )
 
 api_client = APIClient()
\ No newline at end of file
@@ -1,7 +1,11 @@
-from fastapi import FastAPI, HTTPException, status, Form
+from fastapi import FastAPI, HTTPException, status, Form, Header
 from fastapi.responses import JSONResponse, FileResponse
 from celery.result import AsyncResult
-from tasks_r_e import celery_app, generate_resume, generate_job_application,generate_followup_email
+from tasks_r_e import celery_app, generate_resume, generate_job_application,generate_followup_email, profile_store
+from api_client import gemini_router
+from services.cv_cache import extraction_cache
+from services.llm_gateway import llm_gateway
+from services import metrics, profiling
 import base64
 import io
 from pydantic import BaseModel
@@ -12,6 +16,8 @@ app = FastAPI(
     description="Integrated with Profile and Job Listing APIs",
     version="1.0.0"
 )
+metrics.add_metrics_endpoint(app)
+profiling.add_profile_endpoint(app, profile_store)
 
 class ResumeRequest(BaseModel):
     user_id: str
@@ -25,7 +31,8 @@ class JobApplicationRequest(BaseModel):
 async def trigger_resume_generation(
     user_id: str = Form(...),
     template: str = Form("modern"),
-    job_description: str = Form("")
+    job_description: str = Form(""),
+    x_profile: bool = Header(False)
 ):
     """Endpoint to start resume generation with job description fallback"""
     if not job_description:
@@ -35,10 +42,9 @@ async def trigger_resume_generation(
         - Celery task queues
         Competitive salary and benefits package."""
     
-    task = generate_resume.delay(
-        user_id=user_id,
-        template=template,
-        job_description=job_description
+    task = generate_resume.apply_async(
+        kwargs={"user_id": user_id, "template": template, "job_description": job_description},
+        headers=profiling.task_headers(x_profile)
     )
     return {
         "task_id": task.id,
@@ -146,10 +152,22 @@ async def health_check():
             "redis": True  # Add actual check if needed
         }
     }
+@app.get("/cache/stats")
+async def cache_stats():
+    """CV text extraction cache hit/miss counters"""
+    return {"cv_text": extraction_cache.stats()}
+
+@app.get("/llm/stats")
+async def llm_gateway_stats():
+    """LLM gateway request, throttling and wait-time counters (shared totals come from the workers),
+    and per-model router latency and circuit state"""
+    return {**llm_gateway.stats(), "router": gemini_router.stats()}
 @app.post("/generate-followup")
-async def trigger_email_generation(user_id: str, job_id: str):
+async def trigger_email_generation(user_id: str, job_id: str, x_profile: bool = Header(False)):
     try:
-        task = generate_followup_email.delay(user_id=user_id, job_id=job_id)
+        task = generate_followup_email.apply_async(
+            kwargs={"user_id": user_id, "job_id": job_id}, headers=profiling.task_headers(x_profile)
+        )
         return {
             "task_id": task.id,
             "status_check": f"/tasks/{task.id}"
@@ -1,103 +1,235 @@
-import spacy
+import os
 import re
-from typing import Dict, List, Optional
+from functools import cached_property, lru_cache
+from typing import Dict, List, Optional, Tuple
+
+# Components the parser never reads; everything else is needed for
+# doc.ents (ner), doc.sents (parser), token.pos_ (tagger, attribute_ruler)
+# and token.dep_ (parser).
+UNUSED_PIPES = ["lemmatizer"]
+
+
+@lru_cache(maxsize=None)
+def get_nlp():
+    """Load the spaCy model on first use instead of at import time"""
+    import spacy
+    return spacy.load(os.getenv("SPACY_MODEL", "en_core_web_sm"), exclude=UNUSED_PIPES)
+
+# Canonical section name -> header spellings, matched case-insensitively at the
+# start of a line. A header line may carry a "& Training"-style suffix. A
+# header followed by a colon and the section's first entry only counts before
+# the first section: inside a section, "Technologies: Python, Django" or
+# "Languages: Python, Go" lines are details of that section.
+SECTION_HEADERS = {
+    "summary": ["professional summary", "summary", "profile", "objective", "about me"],
+    "experience": [
+        "work experience", "professional experience", "relevant experience", "employment history",
+        "work history", "career history", "experience", "employment"
+    ],
+    "education": ["education", "academic background", "academics", "qualifications"],
+    "skills": ["technical skills", "core competencies", "key skills", "skills", "competencies", "technologies"],
+    "projects": ["personal projects", "projects", "portfolio"],
+    "certifications": ["certifications", "certificates", "licenses"],
+    "awards": ["awards", "honors", "achievements"],
+    "publications": ["publications"],
+    "languages": ["languages"],
+    "volunteering": ["volunteer experience", "volunteering", "volunteer"],
+    "interests": ["interests", "hobbies"],
+    "references": ["references"],
+    "contact": ["contact information", "contact details", "contact"],
+}
+_SECTION_BY_HEADER = {alias: name for name, aliases in SECTION_HEADERS.items() for alias in aliases}
+HEADER_RE = re.compile(
+    r"^[ \t]*(?:[#*\u2022-]+[ \t]*)?(?P<header>"
+    + "|".join(re.escape(alias) for alias in sorted(_SECTION_BY_HEADER, key=len, reverse=True))
+    + r")\b(?:[ \t]*(?:&|and|/)[ \t]*[a-z ]{1,25})?(?:[ \t]*:[ \t]*(?P<inline>[^\n]*))?[ \t]*$",
+    re.IGNORECASE | re.MULTILINE
+)
+EMAIL_RE = re.compile(r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}")
+PHONE_RE = re.compile(r"(\+?\d{1,2}\s?)?(\(?\d{3}\)?[\s.-]?\d{3}[\s.-]?\d{4})")
+
+
+class SectionIndex:
+    """Every section header of a resume with its offsets, found in one scan.
+
+    A section runs from its header line to the next header (or the end of the
+    text); whatever precedes the first header is the preamble.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        headers = []
+        for m in HEADER_RE.finditer(text):
+            if m.group("inline") and headers:
+                continue
+            headers.append((_SECTION_BY_HEADER[m.group("header").lower()], m.start()))
+        ends = [start for _, start in headers[1:]] + [len(text)]
+        self.sections: List[Tuple[str, int, int]] = [
+            (name, start, end) for (name, start), end in zip(headers, ends)
+        ]
+        self.preamble_end = headers[0][1] if headers else len(text)
+
+    def spans(self, name: str) -> List[Tuple[int, int]]:
+        return [(start, end) for section, start, end in self.sections if section == name]
+
+    def section_text(self, name: str) -> str:
+        return "\n".join(self.text[start:end] for start, end in self.spans(name))
+
+    def names(self) -> List[str]:
+        return [name for name, _, _ in self.sections]
+
+
+def scan_contact(text: str) -> Dict:
+    email = EMAIL_RE.search(text)
+    phone = PHONE_RE.search(text)
+    return {
+        "email": email.group(0) if email else "",
+        "phone": phone.group(0) if phone else ""
+    }
+
+
+class ParsedResume:
+    """Single spaCy pass over a resume; every field is answered from the same Doc"""
+
+    def __init__(self, text: str, doc=None):
+        self.text = text
+        self.doc = doc if doc is not None else get_nlp()(text)
+
+    @cached_property
+    def sections(self) -> SectionIndex:
+        return SectionIndex(self.text)
+
+    def section_sents(self, name: str):
+        """Yield the sentences of every `name` section, clipped to its bounds"""
+        for start, end in self.sections.spans(name):
+            for sent in self.doc.sents:
+                if sent.end_char <= start:
+                    continue
+                if sent.start_char >= end:
+                    break
+                span = self.doc.char_span(
+                    max(sent.start_char, start), min(sent.end_char, end),
+                    alignment_mode="expand"
+                )
+                if span is not None and span.text.strip():
+                    yield span
+
+    @property
+    def name(self) -> Optional[str]:
+        return ResumeParser.parse_name(self.text)
+
+    @property
+    def contact(self) -> Dict:
+        return scan_contact(self.text)
+
+    @property
+    def location(self) -> Optional[str]:
+        return next((ent.text for ent in self.doc.ents if ent.label_ == "GPE"), None)
+
+    @property
+    def education(self) -> List[Dict]:
+        education = []
+        current_edu = {}
+        for sent in self.section_sents("education"):
+            if any(word in sent.text.lower() for word in ["university", "college"]):
+                if current_edu:  # Save previous education if exists
+                    education.append(current_edu)
+                current_edu = {
+                    "institution": next(
+                        (ent.text for ent in sent.ents if ent.label_ == "ORG"),
+                        sent.text.split(",")[0]
+                    ),
+                    "degree": " ".join([
+                        token.text for token in sent
+                        if token.pos_ in ("NOUN", "PROPN") and token.text.lower() not in ["university", "college"]
+                    ]),
+                    "graduation_date": next(
+                        (ent.text for ent in sent.ents if ent.label_ == "DATE"),
+                        ""
+                    ),
+                    "gpa": next(
+                        (m.group(0) for m in re.finditer(r"\b\d\.\d{1,2}\b", sent.text)),
+                        None
+                    )
+                }
+        if current_edu:  # Add the last education entry
+            education.append(current_edu)
+        return education
+
+    @property
+    def experience(self) -> List[Dict]:
+        experience = []
+        current_exp = {}
+        for sent in self.section_sents("experience"):
+            if any(word in sent.text.lower() for word in ["company", "inc", "llc", "intern"]):
+                if current_exp:  # Save previous experience if exists
+                    experience.append(current_exp)
+                current_exp = {
+                    "company": next(
+                        (ent.text for ent in sent.ents if ent.label_ == "ORG"),
+                        sent.text.split(",")[0]
+                    ),
+                    "position": " ".join([
+                        token.text for token in sent
+                        if token.dep_ in ("compound", "amod") or token.pos_ == "NOUN"
+                    ][:4]),
+                    "duration": next(
+                        (ent.text for ent in sent.ents if ent.label_ == "DATE"),
+                        ""
+                    ),
+                    "location": next(
+                        (ent.text for ent in sent.ents if ent.label_ == "GPE"),
+                        None
+                    )
+                }
+        if current_exp:  # Add the last experience entry
+            experience.append(current_exp)
+        return experience
+
+    def to_dict(self) -> Dict:
+        contact = self.contact
+        return {
+            "name": self.name,
+            "email": contact["email"],
+            "phone": contact["phone"],
+            "location": self.location,
+            "education": self.education,
+            "experience": self.experience
+        }
+
+
+@lru_cache(maxsize=8)
+def parse_resume(text: str) -> ParsedResume:
+    """Return the ParsedResume for `text`, reusing the Doc across consecutive field queries"""
+    return ParsedResume(text)
+
 
-# Load spaCy NLP model
-nlp = spacy.load("en_core_web_sm")
 class ResumeParser:
     """Enhanced resume parser with location detection"""
-    
+
+    @staticmethod
+    def parse(text: str) -> ParsedResume:
+        return parse_resume(text)
+
     @staticmethod
     def parse_name(text: str) -> Optional[str]:
-        first_line = text.split('\n')[0].strip()
+        first_line = text.partition("\n")[0].strip()
         if "@" not in first_line and not any(c.isdigit() for c in first_line):
             return first_line
         return None
 
     @staticmethod
     def parse_contact(text: str) -> Dict:
-        email = re.search(r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}", text)
-        phone = re.search(
-            r"(\+?\d{1,2}\s?)?(\(?\d{3}\)?[\s.-]?\d{3}[\s.-]?\d{4})",
-            text
-        )
-        return {
-            "email": email.group(0) if email else "",
-            "phone": phone.group(0) if phone else ""
-        }
+        return scan_contact(text)
 
     @staticmethod
     def parse_location(text: str) -> Optional[str]:
-        doc = nlp(text)
-        locations = [ent.text for ent in doc.ents if ent.label_ == "GPE"]
-        return locations[0] if locations else None
+        return parse_resume(text).location
 
     @staticmethod
     def parse_education(text: str) -> List[Dict]:
-        education = []
-        edu_pattern = r"(?i)(education.*?)(?=work experience|$)"
-        if match := re.search(edu_pattern, text, re.DOTALL):
-            edu_text = match.group(1)
-            doc = nlp(edu_text)
-            
-            current_edu = {}
-            for sent in doc.sents:
-                if any(word in sent.text.lower() for word in ["university", "college"]):
-                    if current_edu:  # Save previous education if exists
-                        education.append(current_edu)
-                    current_edu = {
-                        "institution": next(
-                            (ent.text for ent in sent.ents if ent.label_ == "ORG"), 
-                            sent.text.split(",")[0]
-                        ),
-                        "degree": " ".join([
-                            token.text for token in sent 
-                            if token.pos_ in ("NOUN", "PROPN") and token.text.lower() not in ["university", "college"]
-                        ]),
-                        "graduation_date": next(
-                            (ent.text for ent in sent.ents if ent.label_ == "DATE"), 
-                            ""
-                        ),
-                        "gpa": next(
-                            (m.group(0) for m in 
-                            re.finditer(r"\b\d\.\d{1,2}\b", sent.text))
-                        , None)
-                    }
-            if current_edu:  # Add the last education entry
-                education.append(current_edu)
-        return education
+        return parse_resume(text).education
 
     @staticmethod
     def parse_experience(text: str) -> List[Dict]:
-        experience = []
-        exp_pattern = r"(?i)(work experience|experience.*?)(?=education|skills|$)"
-        if match := re.search(exp_pattern, text, re.DOTALL):
-            exp_text = match.group(1)
-            doc = nlp(exp_text)
-            
-            current_exp = {}
-            for sent in doc.sents:
-                if any(word in sent.text.lower() for word in ["company", "inc", "llc", "intern"]):
-                    if current_exp:  # Save previous experience if exists
-                        experience.append(current_exp)
-                    current_exp = {
-                        "company": next(
-                            (ent.text for ent in sent.ents if ent.label_ == "ORG"), 
-                            sent.text.split(",")[0]
-                        ),
-                        "position": " ".join([
-                            token.text for token in sent 
-                            if token.dep_ in ("compound", "amod") or token.pos_ == "NOUN"
-                        ][:4]),
-                        "duration": next(
-                            (ent.text for ent in sent.ents if ent.label_ == "DATE"), 
-                            ""
-                        ),
-                        "location": next(
-                            (ent.text for ent in sent.ents if ent.label_ == "GPE"), 
-                            None
-                        )
-                    }
-            if current_exp:  # Add the last experience entry
-                experience.append(current_exp)
-        return experience
\ No newline at end of file
+        return parse_resume(text).experience
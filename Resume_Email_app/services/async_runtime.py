@@ -0,0 +1,59 @@
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_thread: Optional[threading.Thread] = None
+_lock = threading.Lock()
+
+
+def start_runtime() -> asyncio.AbstractEventLoop:
+    """Start (once per process) an event loop running in a background thread.
+
+    Called from Celery's worker_process_init so every prefork child owns one
+    loop for its whole life; async resources created on it (the HTTP pool,
+    Redis clients) stay usable across tasks.
+    """
+    global _loop, _thread
+    with _lock:
+        if _loop is not None and _loop.is_running():
+            return _loop
+        _loop = asyncio.new_event_loop()
+        _thread = threading.Thread(target=_loop.run_forever, name="async-runtime", daemon=True)
+        _thread.start()
+        return _loop
+
+
+def run_async(coro: Awaitable, timeout: Optional[float] = None) -> Any:
+    """Run a coroutine on the worker loop and block the calling task until it finishes"""
+    loop = start_runtime()
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    try:
+        return future.result(timeout)
+    except BaseException:
+        # Time limits and retries interrupt the waiting thread; don't leave the
+        # coroutine running on the shared loop.
+        future.cancel()
+        raise
+
+
+def stop_runtime(*cleanups: Callable[[], Awaitable]):
+    """Await the given cleanup coroutines on the loop, then stop it"""
+    global _loop, _thread
+    with _lock:
+        loop, thread = _loop, _thread
+        _loop = _thread = None
+    if loop is None:
+        return
+    for cleanup in cleanups:
+        try:
+            asyncio.run_coroutine_threadsafe(cleanup(), loop).result(5)
+        except Exception as e:
+            logger.warning(f"Async runtime cleanup failed: {str(e)}")
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    if not loop.is_running():
+        loop.close()
@@ -0,0 +1,341 @@
+"""Shared, rate-limited entry point for LLM provider calls.
+
+Every worker process routes provider calls through `llm_gateway`, which:
+- caps in-flight calls per process (LLM_MAX_CONCURRENCY),
+- takes a slot from a per-model token bucket shared through Redis, limiting
+  both requests/min and estimated tokens/min across all workers,
+- queues waiters FIFO per model so a busy worker cannot starve the others,
+- backs off and retries locally on provider 429/quota errors instead of
+  failing the Celery task into a minutes-long retry countdown,
+- records wait time, throttling and prompt/response size counters (see `stats()`).
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 0.05
+QUEUE_POLL_INTERVAL = 0.25
+
+# KEYS: queue zset, heartbeat hash, bucket hash
+# ARGV: member, tokens requested, requests/min, tokens/min, stale waiter ms
+# Returns 0 when the slot is granted, -1 when waiters ahead must go first, else ms to wait.
+# A waiter behind others is only let through when the bucket has room for all of them.
+_ACQUIRE_SCRIPT = """
+redis.replicate_commands()
+local queue, hb, bucket = KEYS[1], KEYS[2], KEYS[3]
+local member = ARGV[1]
+local cost, rpm, tpm, stale = tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4]), tonumber(ARGV[5])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call('HSET', hb, member, now)
+if not redis.call('ZSCORE', queue, member) then
+  redis.call('ZADD', queue, now, member)
+end
+redis.call('PEXPIRE', queue, stale * 10)
+redis.call('PEXPIRE', hb, stale * 10)
+while true do
+  local head = redis.call('ZRANGE', queue, 0, 0)[1]
+  if not head or head == member then break end
+  if now - tonumber(redis.call('HGET', hb, head) or '0') <= stale then break end
+  redis.call('ZREM', queue, head)
+  redis.call('HDEL', hb, head)
+end
+local ahead = redis.call('ZRANK', queue, member)
+local state = redis.call('HMGET', bucket, 'req', 'tok', 'ts')
+local elapsed = math.max(0, now - (tonumber(state[3]) or now)) / 60000
+local req = math.min(rpm, (tonumber(state[1]) or rpm) + elapsed * rpm)
+local tok = math.min(tpm, (tonumber(state[2]) or tpm) + elapsed * tpm)
+cost = math.min(cost, tpm)
+local wait = 0
+if req < ahead + 1 then wait = math.max(wait, (ahead + 1 - req) / rpm * 60000) end
+if tok < cost * (ahead + 1) then wait = math.max(wait, (cost * (ahead + 1) - tok) / tpm * 60000) end
+if wait > 0 and ahead > 0 then return -1 end
+if wait == 0 then
+  req, tok = req - 1, tok - cost
+  redis.call('ZREM', queue, member)
+  redis.call('HDEL', hb, member)
+end
+redis.call('HSET', bucket, 'req', req, 'tok', tok, 'ts', now)
+redis.call('PEXPIRE', bucket, 120000)
+return math.ceil(wait)
+"""
+
+
+class SlotTimeout(TimeoutError):
+    """No rate-limit slot within max_wait; the provider was never called"""
+
+
+def estimate_tokens(prompt: str, max_output_tokens: int) -> int:
+    """Rough prompt size (~4 chars/token) plus the completion allowance"""
+    return len(prompt) // 4 + max_output_tokens
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """Provider throttling: OpenAI RateLimitError/429 or Gemini ResourceExhausted/quota"""
+    if getattr(error, "status_code", None) == 429 or getattr(error, "code", None) == 429:
+        return True
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in ("ratelimit", "rate limit", "resourceexhausted", "quota", "429"))
+
+
+class LocalRateLimiter:
+    """In-process token bucket with FIFO tickets; used when Redis is unavailable"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, list] = {}
+        self._queues: Dict[str, deque] = {}
+
+    def try_acquire(self, model: str, member: str, tokens: int, rpm: float, tpm: float) -> float:
+        """Seconds to wait before retrying; 0 means the slot was granted"""
+        with self._lock:
+            queue = self._queues.setdefault(model, deque())
+            if member not in queue:
+                queue.append(member)
+            ahead = queue.index(member)
+            now = time.monotonic()
+            req, tok, ts = self._buckets.get(model, (rpm, tpm, now))
+            elapsed = (now - ts) / 60
+            req = min(rpm, req + elapsed * rpm)
+            tok = min(tpm, tok + elapsed * tpm)
+            tokens = min(tokens, tpm)
+            wait = max((ahead + 1 - req) / rpm * 60 if req < ahead + 1 else 0,
+                       (tokens * (ahead + 1) - tok) / tpm * 60 if tok < tokens * (ahead + 1) else 0)
+            if wait > 0 and ahead > 0:
+                return QUEUE_POLL_INTERVAL
+            if wait == 0:
+                req, tok = req - 1, tok - tokens
+                queue.remove(member)
+            self._buckets[model] = [req, tok, now]
+            return wait
+
+    def cancel(self, model: str, member: str):
+        with self._lock:
+            queue = self._queues.get(model)
+            if queue and member in queue:
+                queue.remove(member)
+
+    def penalize(self, model: str):
+        """Empty the bucket after a provider 429 so other waiters hold off too"""
+        with self._lock:
+            self._buckets[model] = [0, 0, time.monotonic()]
+
+
+class RedisRateLimiter:
+    """Token bucket and FIFO queue shared by every worker through Redis"""
+
+    def __init__(self, redis_url: str, prefix: str = "llm_gateway", stale_after: float = 10.0):
+        import redis
+        self.redis = redis.Redis.from_url(redis_url, socket_connect_timeout=0.5, socket_timeout=1.0)
+        self.prefix = prefix
+        self.stale_ms = int(stale_after * 1000)
+        self._script = self.redis.register_script(_ACQUIRE_SCRIPT)
+
+    def _keys(self, model: str):
+        return [f"{self.prefix}:{model}:queue", f"{self.prefix}:{model}:heartbeat", f"{self.prefix}:{model}:bucket"]
+
+    def try_acquire(self, model: str, member: str, tokens: int, rpm: float, tpm: float) -> float:
+        wait_ms = self._script(keys=self._keys(model), args=[member, tokens, rpm, tpm, self.stale_ms])
+        return QUEUE_POLL_INTERVAL if wait_ms < 0 else wait_ms / 1000
+
+    def cancel(self, model: str, member: str):
+        queue, heartbeat, _ = self._keys(model)
+        pipe = self.redis.pipeline()
+        pipe.zrem(queue, member)
+        pipe.hdel(heartbeat, member)
+        pipe.execute()
+
+    def penalize(self, model: str):
+        _, _, bucket = self._keys(model)
+        self.redis.hset(bucket, mapping={"req": 0, "tok": 0, "ts": int(time.time() * 1000)})
+
+
+class LLMGateway:
+    def __init__(self, limiter, max_concurrency: int = 4, rpm: float = 60, tpm: float = 90000,
+                 limits: Optional[Dict[str, Dict[str, float]]] = None, max_output_tokens: int = 1024,
+                 retries: int = 3, max_wait: float = 120.0, stats_redis=None):
+        self.limiter = limiter
+        self.fallback = LocalRateLimiter()
+        self.max_concurrency = max_concurrency
+        self.rpm = rpm
+        self.tpm = tpm
+        self.limits = limits or {}
+        self.max_output_tokens = max_output_tokens
+        self.retries = retries
+        self.max_wait = max_wait
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._stats_redis = stats_redis
+        self._lock = threading.Lock()
+        self._counters = {
+            "requests": 0, "throttled": 0, "upstream_rate_limited": 0, "errors": 0,
+            "wait_seconds_total": 0.0, "wait_seconds_max": 0.0,
+            "prompt_tokens": 0, "response_tokens": 0
+        }
+        self._observers: List[Callable[..., None]] = []
+
+    @classmethod
+    def from_env(cls) -> "LLMGateway":
+        redis_url = os.getenv("LLM_GATEWAY_REDIS_URL", os.getenv("CELERY_RESULT_BACKEND"))
+        limiter, stats_redis = None, None
+        if redis_url:
+            try:
+                limiter = RedisRateLimiter(redis_url)
+                stats_redis = limiter.redis
+            except Exception as e:
+                logger.warning(f"LLM gateway falling back to per-process limits: {str(e)}")
+        return cls(
+            limiter or LocalRateLimiter(),
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "4")),
+            rpm=float(os.getenv("LLM_RPM", "60")),
+            tpm=float(os.getenv("LLM_TPM", "90000")),
+            limits=json.loads(os.getenv("LLM_RATE_LIMITS", "{}")),
+            max_output_tokens=int(os.getenv("LLM_EST_OUTPUT_TOKENS", "1024")),
+            retries=int(os.getenv("LLM_GATEWAY_RETRIES", "3")),
+            max_wait=float(os.getenv("LLM_GATEWAY_MAX_WAIT", "120")),
+            stats_redis=stats_redis
+        )
+
+    def _limits_for(self, model: str):
+        limits = self.limits.get(model, {})
+        return float(limits.get("rpm", self.rpm)), float(limits.get("tpm", self.tpm))
+
+    def _try_acquire(self, model: str, member: str, tokens: int) -> float:
+        rpm, tpm = self._limits_for(model)
+        try:
+            return self.limiter.try_acquire(model, member, tokens, rpm, tpm)
+        except Exception as e:
+            logger.warning(f"LLM rate limiter unavailable, using local bucket: {str(e)}")
+            return self.fallback.try_acquire(model, member, tokens, rpm, tpm)
+
+    def _cancel(self, model: str, member: str):
+        for limiter in (self.limiter, self.fallback):
+            try:
+                limiter.cancel(model, member)
+            except Exception:
+                pass
+
+    def _penalize(self, model: str):
+        try:
+            self.limiter.penalize(model)
+        except Exception:
+            self.fallback.penalize(model)
+
+    def add_observer(self, observer: Callable[..., None]):
+        """`observer(model, outcome, seconds, wait, prompt_tokens, response_tokens)` is called
+        (as keywords) after every slot wait and provider call, e.g. to export metrics"""
+        self._observers.append(observer)
+
+    def _notify(self, **event):
+        for observer in self._observers:
+            try:
+                observer(**event)
+            except Exception as e:
+                logger.debug(f"LLM gateway observer failed: {str(e)}")
+
+    def _record(self, **deltas):
+        with self._lock:
+            for name, value in deltas.items():
+                if name == "wait_seconds_max":
+                    self._counters[name] = max(self._counters[name], value)
+                else:
+                    self._counters[name] += value
+        if self._stats_redis is not None:
+            try:
+                pipe = self._stats_redis.pipeline()
+                for name, value in deltas.items():
+                    if name != "wait_seconds_max":
+                        pipe.hincrbyfloat("llm_gateway:stats", name, value)
+                pipe.execute()
+            except Exception as e:
+                logger.debug(f"LLM gateway stats write failed: {str(e)}")
+
+    def _acquire(self, model: str, tokens: int, sleep: Callable[[float], None]) -> float:
+        member = uuid.uuid4().hex
+        started = time.monotonic()
+        try:
+            while True:
+                wait = self._try_acquire(model, member, tokens)
+                if wait == 0:
+                    return time.monotonic() - started
+                if time.monotonic() - started > self.max_wait:
+                    raise SlotTimeout(f"Waited over {self.max_wait:.0f}s for an LLM slot on {model}")
+                sleep(min(max(wait, POLL_INTERVAL), 1.0))
+        except BaseException:
+            self._cancel(model, member)
+            raise
+
+    def _after_wait(self, model: str, waited: float):
+        self._record(requests=1, throttled=1 if waited > POLL_INTERVAL else 0,
+                     wait_seconds_total=waited, wait_seconds_max=waited)
+        self._notify(model=model, outcome="wait", wait=waited)
+        if waited > POLL_INTERVAL:
+            logger.info(f"LLM call to {model} waited {waited:.2f}s for a rate-limit slot")
+
+    def _after_call(self, model: str, prompt: str, response: str, started: float):
+        prompt_tokens, response_tokens = len(prompt) // 4, len(response or "") // 4
+        seconds = time.monotonic() - started
+        self._record(prompt_tokens=prompt_tokens, response_tokens=response_tokens)
+        self._notify(model=model, outcome="ok", seconds=seconds,
+                     prompt_tokens=prompt_tokens, response_tokens=response_tokens)
+        logger.info(
+            f"LLM call to {model}: prompt {len(prompt)} chars (~{prompt_tokens} tokens), "
+            f"response {len(response or '')} chars (~{response_tokens} tokens), "
+            f"{seconds:.2f}s"
+        )
+
+    def _on_error(self, model: str, error: Exception, attempt: int, started: float) -> float:
+        """Backoff before the next attempt, or re-raise when the error is not retryable"""
+        rate_limited = is_rate_limited(error)
+        self._notify(model=model, outcome="rate_limited" if rate_limited else "error",
+                     seconds=time.monotonic() - started)
+        if not rate_limited or attempt >= self.retries:
+            self._record(errors=1)
+            raise error
+        self._record(upstream_rate_limited=1)
+        self._penalize(model)
+        backoff = min(30.0, 2.0 ** attempt)
+        logger.warning(f"{model} rate limited by provider, retrying in {backoff:.0f}s: {str(error)}")
+        return backoff
+
+    def call(self, model: str, prompt: str, fn: Callable[[], str],
+             max_output_tokens: Optional[int] = None) -> str:
+        """Run a blocking provider call once a rate-limit slot for `model` is free"""
+        tokens = estimate_tokens(prompt, max_output_tokens or self.max_output_tokens)
+        attempt = 0
+        while True:
+            with self._slots:
+                self._after_wait(model, self._acquire(model, tokens, time.sleep))
+                started = time.monotonic()
+                try:
+                    result = fn()
+                    self._after_call(model, prompt, result, started)
+                    return result
+                except Exception as e:
+                    backoff = self._on_error(model, e, attempt, started)
+            time.sleep(backoff)
+            attempt += 1
+
+    def stats(self) -> Dict:
+        """Counters for this process plus the totals shared through Redis"""
+        with self._lock:
+            local = dict(self._counters)
+        shared = {}
+        if self._stats_redis is not None:
+            try:
+                shared = {
+                    k.decode(): float(v)
+                    for k, v in self._stats_redis.hgetall("llm_gateway:stats").items()
+                }
+            except Exception as e:
+                logger.warning(f"LLM gateway stats read failed: {str(e)}")
+        return {"process": local, "shared": shared}
+
+
+llm_gateway = LLMGateway.from_env()
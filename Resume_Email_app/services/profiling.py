@@ -0,0 +1,231 @@
+"""Opt-in sampling profiler for Celery tasks.
+
+The worker hooks are only connected when TASK_PROFILING=on or
+PROFILE_SAMPLE_RATE (0..1) is above zero. A task run is then profiled when
+its message carries the `profile` header (the APIs set it for requests sent
+with `X-Profile: 1`), or at random with PROFILE_SAMPLE_RATE. Only tasks
+listed in PROFILE_TASKS are eligible (default: generation_pipeline_task,
+generate_resume and generate_followup_email).
+
+While a task is profiled, a sampler thread reads the stacks of the task
+thread and of the threads named in PROFILE_THREADS (default:
+async-runtime, the event loop that run_async hands coroutines to) every
+PROFILE_INTERVAL_MS (default 5ms). Each stack is rooted at its thread's
+name. In a threads pool the loop is shared, so its samples can include
+other tasks' coroutines. Stacks are aggregated in the collapsed "folded"
+format that flamegraph.pl and speedscope load directly. No tracer is
+installed, so untouched tasks pay only a header check in task_prerun.
+
+Profiles are stored by task id and served by the admin endpoint
+GET /admin/profiles/{task_id}?format=summary|folded|json, which requires
+the X-Admin-Token header to match ADMIN_TOKEN.
+"""
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TASKS = "generation_pipeline_task,generate_resume,generate_followup_email"
+DEFAULT_THREADS = "async-runtime"
+
+
+def _label(code) -> str:
+    path = code.co_filename.replace("\\", "/").split("/")
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Samples some threads' stacks on a background thread and counts identical stacks"""
+
+    def __init__(self, threads: Dict[int, str], interval: float = 0.005):
+        """`threads` maps thread ident -> name; the name becomes the root frame"""
+        self.threads = threads
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._labels: Dict[int, str] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="task-profiler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id, name in self.threads.items():
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = self._labels.get(id(code))
+                    if label is None:
+                        label = self._labels[id(code)] = _label(code)
+                    stack.append(label)
+                    frame = frame.f_back
+                if stack:
+                    stack.append(name)
+                    self.stacks[";".join(reversed(stack))] += 1
+                    self.samples += 1
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> str:
+        """Stop sampling and return the stacks in folded format"""
+        self._stop.set()
+        self._thread.join()
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+def summarize(folded: str, limit: int = 25) -> Dict:
+    """Top frames by self samples (time spent in the frame itself) and total samples"""
+    own, total, samples = Counter(), Counter(), 0
+    for line in folded.splitlines():
+        stack, _, count = line.rpartition(" ")
+        frames, count = stack.split(";"), int(count)
+        samples += count
+        own[frames[-1]] += count
+        for frame in set(frames):
+            total[frame] += count
+
+    def top(counter: Counter) -> List[Dict]:
+        return [
+            {"frame": frame, "samples": n, "percent": round(100.0 * n / samples, 1)}
+            for frame, n in counter.most_common(limit)
+        ]
+    return {"samples": samples, "self": top(own), "total": top(total)}
+
+
+class ProfileStore(ABC):
+    @abstractmethod
+    def put(self, task_id: str, profile: Dict):
+        ...
+
+    @abstractmethod
+    def get(self, task_id: str) -> Optional[Dict]:
+        ...
+
+
+class LocalProfileStore(ProfileStore):
+    """One JSON file per task in the debug area"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, task_id: str) -> str:
+        return os.path.join(self.root, f"profile_{os.path.basename(task_id)}.json")
+
+    def put(self, task_id: str, profile: Dict):
+        os.makedirs(self.root, exist_ok=True)
+        with open(self._path(task_id), "w") as f:
+            json.dump(profile, f)
+
+    def get(self, task_id: str) -> Optional[Dict]:
+        try:
+            with open(self._path(task_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+
+class ArtifactProfileStore(ProfileStore):
+    """Profiles kept next to the generated documents in an artifact store"""
+
+    def __init__(self, artifacts):
+        self.artifacts = artifacts
+
+    def put(self, task_id: str, profile: Dict):
+        self.artifacts.put(f"profile_{task_id}.json", json.dumps(profile).encode("utf-8"), "application/json")
+
+    def get(self, task_id: str) -> Optional[Dict]:
+        try:
+            return json.loads(self.artifacts.read(f"profile_{task_id}.json"))
+        except Exception:
+            return None
+
+
+def task_headers(requested: bool) -> Dict:
+    """Message headers for apply_async that ask the worker to profile this run"""
+    return {"profile": True} if requested else {}
+
+
+def install_task_profiler(app, store: ProfileStore):
+    """Profile eligible task runs (see module docstring) and save them to `store`"""
+    sample_rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    if os.getenv("TASK_PROFILING", "off").lower() != "on" and sample_rate <= 0:
+        return
+    from celery.signals import task_postrun, task_prerun
+
+    eligible = {name.strip() for name in os.getenv("PROFILE_TASKS", DEFAULT_TASKS).split(",") if name.strip()}
+    thread_names = {name.strip() for name in os.getenv("PROFILE_THREADS", DEFAULT_THREADS).split(",") if name.strip()}
+    interval = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+    running: Dict[str, tuple] = {}
+
+    @task_prerun.connect(weak=False)
+    def start_profile(task_id=None, task=None, **kwargs):
+        if task.name.rsplit(".", 1)[-1] not in eligible:
+            return
+        if getattr(task.request, "profile", False):
+            reason = "requested"
+        elif sample_rate and random.random() < sample_rate:
+            reason = "sampled"
+        else:
+            return
+        threads = {thread.ident: thread.name for thread in threading.enumerate() if thread.name in thread_names}
+        threads[threading.get_ident()] = "task"
+        sampler = StackSampler(threads, interval).start()
+        running[task_id] = (sampler, reason, time.time(), time.perf_counter())
+
+    @task_postrun.connect(weak=False)
+    def save_profile(task_id=None, task=None, state=None, **kwargs):
+        entry = running.pop(task_id, None)
+        if entry is None:
+            return
+        sampler, reason, started_at, started = entry
+        folded = sampler.stop()
+        profile = {
+            "task_id": task_id,
+            "task": task.name,
+            "state": state,
+            "reason": reason,
+            "started_at": datetime.utcfromtimestamp(started_at).isoformat(),
+            "duration_s": round(time.perf_counter() - started, 3),
+            "interval_ms": interval * 1000,
+            "samples": sampler.samples,
+            "folded": folded
+        }
+        try:
+            store.put(task_id, profile)
+            logger.info(f"Stored {reason} profile for {task.name} {task_id} ({sampler.samples} samples)")
+        except Exception as e:
+            logger.warning(f"Failed to store profile for {task_id}: {str(e)}")
+
+
+def add_profile_endpoint(app, store: ProfileStore):
+    """GET /admin/profiles/{task_id} on a FastAPI app"""
+    from fastapi import Header, HTTPException, Query
+    from fastapi.responses import PlainTextResponse
+
+    @app.get("/admin/profiles/{task_id}", include_in_schema=False)
+    def get_profile(task_id: str, format: str = Query("summary"), x_admin_token: str = Header("")):
+        token = os.getenv("ADMIN_TOKEN")
+        if not token or x_admin_token != token:
+            raise HTTPException(403, "Admin token required")
+        if format not in ("summary", "folded", "json"):
+            raise HTTPException(400, "format must be summary, folded or json")
+        profile = store.get(task_id)
+        if profile is None:
+            raise HTTPException(404, "No profile stored for this task")
+        if format == "folded":
+            return PlainTextResponse(profile["folded"])
+        if format == "summary":
+            return {k: v for k, v in profile.items() if k != "folded"} | {"summary": summarize(profile["folded"])}
+        return profile
@@ -1,4 +1,5 @@
 from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
 from api_client import APIClient, AIService
 from services.template_render import render_resume, render_email
 import subprocess
@@ -10,7 +11,13 @@ from pathlib import Path
 from io import BytesIO
 import re
 import asyncio
-from pdfminer.high_level import extract_text  # Only if keeping PDF text extraction
+from services.cv_cache import extract_first_page_text, extract_pdf_text, extraction_cache
+from services.llm_gateway import llm_gateway
+from services import llm_cache, metrics, profiling, routing
+from services.job_analysis import job_analysis_store
+from services import fake_llm
+from services.http_client import close_http_client
+from services.async_runtime import run_async, start_runtime, stop_runtime
 
 from jinja2 import Environment, FileSystemLoader, select_autoescape
 from resume_parser import ResumeParser  # Add this import
@@ -38,111 +45,122 @@ celery_app = Celery(
     # timezone='UTC',
     # enable_utc=True
 )
+routing.install_routes(celery_app)
+metrics.install_celery_metrics(celery_app)
+metrics.observe_gateway(llm_gateway)
+metrics.observe_cache("llm", llm_cache)
+metrics.observe_cache("cv_text", extraction_cache)
+metrics.observe_cache("job_analysis", job_analysis_store)
+
+profile_store = profiling.LocalProfileStore(os.getenv("PROFILE_DIR", "cv_debug/profiles"))
+profiling.install_task_profiler(celery_app, profile_store)
+
+@worker_process_init.connect
+def start_async_runtime(**kwargs):
+    start_runtime()
+
+@worker_process_shutdown.connect
+def stop_async_runtime(**kwargs):
+    stop_runtime(close_http_client)
+
 @celery_app.task(bind=True, max_retries=3)
 def generate_resume(self, user_id: str, template: str = "modern", job_description: str = ""):
     """Generate resume with AI enhancement and PDF parsing"""
     try:
         api_client = APIClient()
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        try:
-            # 1. Fetch profile data
-            profile = loop.run_until_complete(api_client.get_user_profile(user_id))
-            if not profile:
-                raise ValueError("Profile not found")
+        # 1. Fetch profile data
+        profile = run_async(api_client.get_user_profile(user_id))
+        if not profile:
+            raise ValueError("Profile not found")
 
-            # 2. Process resume content
-            resume_text = None
-            if profile.get('resume', {}).get('content'):
-                raw_content = base64.b64decode(profile['resume']['content'])
-                
-                if raw_content.startswith(b'%PDF-'):
-                    resume_text = extract_text(BytesIO(raw_content))
-                else:
-                    try:
-                        resume_text = raw_content.decode('utf-8')
-                    except UnicodeDecodeError:
-                        resume_text = "[Unsupported binary content]"
+        # 2. Process resume content
+        resume_text = None
+        if profile.get('resume', {}).get('content'):
+            raw_content = base64.b64decode(profile['resume']['content'])
+            
+            if raw_content.startswith(b'%PDF-'):
+                resume_text = extract_pdf_text(raw_content)
+            else:
+                try:
+                    resume_text = raw_content.decode('utf-8')
+                except UnicodeDecodeError:
+                    resume_text = "[Unsupported binary content]"
 
-            # 3. Enhance profile with parsed resume data
-            if resume_text and resume_text != "[Unsupported binary content]":
-                parser = ResumeParser()
-                contact = parser.parse_contact(resume_text)
-                # Update profile with parsed data
-                profile.update({
-                    "name": profile.get("name") or parser.parse_name(resume_text),
-                    "email": contact["email"] or profile.get("email", ""),
-                    "phone": contact["phone"] or profile.get("phone"),
-                    "location": profile.get("location") or parser.parse_location(resume_text),
-                    "education": profile.get("education") or parser.parse_education(resume_text),
-                    "experience": profile.get("experience") or parser.parse_experience(resume_text)
-                })
-                # # Fill missing fields
-                # if not profile.get("name"):
-                #     profile["name"] = parser.parse_name(resume_text)
-                
-                # contact_info = parser.parse_contact(resume_text)
-                # profile.setdefault("email", contact_info["email"])
-                # profile.setdefault("phone", contact_info["phone"])
-                
-                # if not profile.get("education"):
-                #     profile["education"] = parser.parse_education(resume_text)
-                
-                # if not profile.get("experience"):
-                #     profile["experience"] = parser.parse_experience(resume_text)
+        # 3. Enhance profile with parsed resume data
+        if resume_text and resume_text != "[Unsupported binary content]":
+            parsed = ResumeParser.parse(resume_text)
+            contact = parsed.contact
+            # Update profile with parsed data
+            profile.update({
+                "name": profile.get("name") or parsed.name,
+                "email": contact["email"] or profile.get("email", ""),
+                "phone": contact["phone"] or profile.get("phone"),
+                "location": profile.get("location") or parsed.location,
+                "education": profile.get("education") or parsed.education,
+                "experience": profile.get("experience") or parsed.experience
+            })
+            # # Fill missing fields
+            # if not profile.get("name"):
+            #     profile["name"] = parser.parse_name(resume_text)
+            
+            # contact_info = parser.parse_contact(resume_text)
+            # profile.setdefault("email", contact_info["email"])
+            # profile.setdefault("phone", contact_info["phone"])
+            
+            # if not profile.get("education"):
+            #     profile["education"] = parser.parse_education(resume_text)
+            
+            # if not profile.get("experience"):
+            #     profile["experience"] = parser.parse_experience(resume_text)
 
-            # 4. AI Enhancement (if enabled)
-            enhanced_content = resume_text
-            if (os.getenv("GEMINI_API_KEY") 
-                and job_description 
-                and resume_text 
-                and resume_text != "[Unsupported binary content]"
-            ):
-                try:
-                    enhanced_content = AIService().enhance_resume_text(
-                        resume_text, 
-                        job_description
-                    )
-                except Exception as ai_error:
-                    logger.warning(f"AI enhancement failed: {ai_error}")
-                    enhanced_content = resume_text
+        # 4. AI Enhancement (if enabled)
+        enhanced_content = resume_text
+        if (fake_llm.has_api_key("GEMINI_API_KEY") 
+            and job_description 
+            and resume_text 
+            and resume_text != "[Unsupported binary content]"
+        ):
+            try:
+                enhanced_content = AIService().enhance_resume_text(
+                    resume_text, 
+                    job_description
+                )
+            except Exception as ai_error:
+                logger.warning(f"AI enhancement failed: {ai_error}")
+                enhanced_content = resume_text
 
-            # 5. Prepare final output
-            result = {
-                "metadata": {
-                    "user_id": user_id,
-                    "template": template,
-                    "generated_at": datetime.utcnow().isoformat(),
-                    "source": "PDF" if raw_content.startswith(b'%PDF-') else "Text"
-                },
-                "profile": {
-                    "name": profile.get("name"),
-                    "contact": {
-                        "email": profile.get("email"),
-                        "phone": profile.get("phone"),
-                        "location": profile.get("location")
-                    },
-                    "education": profile.get("education", []),
-                    "experience": profile.get("experience", []),
-                    "skills": {
-                        "technical": profile.get("technical_skills", []),
-                        "professional": profile.get("professional_skills", []),
-                        "languages": profile.get("languages", [])
-                    }
+        # 5. Prepare final output
+        result = {
+            "metadata": {
+                "user_id": user_id,
+                "template": template,
+                "generated_at": datetime.utcnow().isoformat(),
+                "source": "PDF" if raw_content.startswith(b'%PDF-') else "Text"
+            },
+            "profile": {
+                "name": profile.get("name"),
+                "contact": {
+                    "email": profile.get("email"),
+                    "phone": profile.get("phone"),
+                    "location": profile.get("location")
                 },
-                "content": {
-                    "original": resume_text,
-                    "enhanced": enhanced_content,
-                    "job_description": job_description
+                "education": profile.get("education", []),
+                "experience": profile.get("experience", []),
+                "skills": {
+                    "technical": profile.get("technical_skills", []),
+                    "professional": profile.get("professional_skills", []),
+                    "languages": profile.get("languages", [])
                 }
+            },
+            "content": {
+                "original": resume_text,
+                "enhanced": enhanced_content,
+                "job_description": job_description
             }
-            
-            return result
-            
-        finally:
-            loop.close()
-            
+        }
+        
+        return result
+        
     except Exception as e:
         logger.error(f"Resume generation failed: {str(e)}", exc_info=True)
         self.retry(exc=e, countdown=min(60 * (2 ** self.request.retries), 300))
@@ -249,13 +267,20 @@ def generate_resume(self, user_id: str, template: str = "modern", job_descriptio
 #         logger.error(f"Resume generation failed: {str(e)}", exc_info=True)
 #         self.retry(exc=e, countdown=60)
 
+async def fetch_application_inputs(user_id: str, job_id: str):
+    """Fetch profile and job analysis concurrently on the worker loop"""
+    api_client = APIClient()
+    return await asyncio.gather(
+        api_client.get_user_profile(user_id),
+        job_analysis_store.get_or_analyze(job_id, api_client.get_job_listing)
+    )
+
 @celery_app.task(bind=True, max_retries=3)
-async def generate_job_application(self, user_id: str, job_id: str):
+def generate_job_application(self, user_id: str, job_id: str):
     """Generate job application email"""
     try:
         # 1. Fetch data from both APIs
-        profile = await api_client.get_user_profile(user_id)
-        job = await api_client.get_job_listing(job_id)
+        profile, job = run_async(fetch_application_inputs(user_id, job_id))
         
         # 2. Prepare email context
         context = {
@@ -311,11 +336,13 @@ async def fetch_profile_with_retry(user_id: str) -> Dict:
             try:
                 resume_content = base64.b64decode(profile['resume']['content'])
                 if resume_content.startswith(b'%PDF-'):
-                    text = extract_text(BytesIO(resume_content))
+                    # Contact details are nearly always on page one; lay out the rest only if not
+                    extracted_email = (extract_email_from_text(extract_first_page_text(resume_content))
+                                       or extract_email_from_text(extract_pdf_text(resume_content)))
                 else:
-                    text = resume_content.decode('utf-8', errors='ignore')
+                    extracted_email = extract_email_from_text(resume_content.decode('utf-8', errors='ignore'))
                 
-                if extracted_email := extract_email_from_text(text):
+                if extracted_email:
                     profile['email'] = extracted_email
                     logger.info(f"Extracted email from resume: {extracted_email}")
             except Exception as e:
@@ -335,14 +362,24 @@ async def fetch_profile_with_retry(user_id: str) -> Dict:
 async def get_job_data(job_id: str) -> Dict:
     """Get job data with circuit breaker pattern"""
     try:
-        job = await APIClient().get_job_listing(job_id)
-        if not all(k in job for k in ['company', 'title', 'contact_email']):
+        job = await job_analysis_store.get_or_analyze(job_id, APIClient().get_job_listing)
+        if not all(job.get(k) for k in ['company', 'title', 'contact_email']):
             raise EmailGenerationError("Job data incomplete")
+        if job["skills"] and not job.get("key_technology"):
+            job["key_technology"] = job["skills"][0]
         return {**job, "source": "api"}
     except Exception as e:
         logger.warning(f"Using mock job data: {str(e)}")
         return {**MOCK_JOBS.get(job_id, MOCK_JOBS["fallback"]), "source": "mock"}
 
+async def fetch_followup_inputs(user_id: str, job_id: str):
+    """Fetch profile and job concurrently on the worker loop"""
+    return await asyncio.gather(
+        fetch_profile_with_retry(user_id),
+        get_job_data(job_id),
+        return_exceptions=True
+    )
+
 # Update the validate_and_build_context function
 def validate_and_build_context(profile: Dict, job: Dict) -> Dict:
     """Safer context builder with detailed validation"""
@@ -368,18 +405,9 @@ def validate_and_build_context(profile: Dict, job: Dict) -> Dict:
 def generate_followup_email(self, user_id: str, job_id: str) -> Dict:
     """Production-grade email generator"""
     try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
         try:
             # 1. Parallel data fetching
-            profile, job = loop.run_until_complete(
-                asyncio.gather(
-                    fetch_profile_with_retry(user_id),
-                    get_job_data(job_id),
-                    return_exceptions=True
-                )
-            )
+            profile, job = run_async(fetch_followup_inputs(user_id, job_id))
             
             # 2. Handle fetch errors
             if isinstance(profile, Exception):
@@ -437,9 +465,6 @@ Phone: {context['applicant']['phone']}
         except Exception as e:
             logger.error(f"Processing error: {str(e)}")
             raise self.retry(exc=e, countdown=min(120 * (2 ** self.request.retries), 600))
-        finally:
-            loop.close()
-            
     except Exception as e:
         if os.getenv('SENTRY_DSN'):
             sentry_sdk.capture_exception(e)
@@ -0,0 +1,62 @@
+"""Diff two benchmark result files.
+
+    python benchmarks/compare.py BASE.json HEAD.json [--threshold 10] [--fail-on-regression]
+
+Cases are compared on p50_ms. A case is flagged as a regression when it is
+more than `--threshold` percent slower and also slower by at least
+`--min-ms`, which keeps sub-microsecond noise from being flagged.
+"""
+import argparse
+import json
+import sys
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(base: dict, head: dict, threshold: float, min_ms: float):
+    rows, regressions = [], []
+    for name in sorted(set(base["results"]) | set(head["results"])):
+        before, after = base["results"].get(name), head["results"].get(name)
+        if before is None or after is None:
+            rows.append((name, "", "-", "-", "", "added" if before is None else "removed"))
+            continue
+        if "p50_ms" not in before or "p50_ms" not in after:
+            rows.append((name, "", "-", "-", "", after.get("error") or before.get("error", "")))
+            continue
+        old, new = before["p50_ms"], after["p50_ms"]
+        change = (new - old) / old * 100 if old else 0.0
+        status = ""
+        if change > threshold and new - old >= min_ms:
+            status = "REGRESSION"
+            regressions.append(name)
+        elif change < -threshold and old - new >= min_ms:
+            status = "improved"
+        rows.append((name, status, f"{old:.3f}", f"{new:.3f}", f"{change:+.1f}%", ""))
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent slowdown flagged as a regression")
+    parser.add_argument("--min-ms", type=float, default=0.05, help="absolute slowdown below which changes are ignored")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    base, head = load(args.base), load(args.head)
+    rows, regressions = compare(base, head, args.threshold, args.min_ms)
+    print(f"base {base['meta'].get('commit')}  ->  head {head['meta'].get('commit')}  (p50 ms)")
+    width = max((len(r[0]) for r in rows), default=10)
+    for name, status, old, new, change, note in rows:
+        print(f"{name:<{width}}  {old:>12}  {new:>12}  {change:>8}  {status or note}")
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold}%")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""Fixture resumes and job descriptions for the benchmarks.
+
+Text fixtures live next to this module; the PDF variants are rendered from
+them with reportlab (invariant mode, so the bytes are identical run to run):
+
+- small_pdf: the one-page resume
+- large_pdf: the long, messy resume (~3 pages)
+- multipage_pdf: the long resume followed by portfolio pages (12+ pages)
+- two_column_pdf: the long resume flowed through two columns per page
+
+`pdf_truth` gives the text each PDF was rendered from, for accuracy checks.
+
+`messy_resume` derives a larger, badly formatted text variant for the parser.
+"""
+import json
+import os
+from functools import lru_cache
+from io import BytesIO
+from typing import Dict, List
+from xml.sax.saxutils import escape
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+PORTFOLIO_PAGES = 10
+
+
+def read(name: str) -> str:
+    with open(os.path.join(FIXTURE_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def text_resumes() -> Dict[str, str]:
+    return {"small_text": read("resume_small.txt"), "large_text": read("resume_large.txt")}
+
+
+def job_descriptions() -> Dict[str, str]:
+    return {"backend": read("jd_backend.txt"), "data": read("jd_data.txt")}
+
+
+def structured_cv() -> Dict:
+    return json.loads(read("cv_structured.json"))
+
+
+def messy_resume(copies: int = 4) -> str:
+    """The long resume the way careless exports look: shouted or bulleted
+    headers, no blank lines, the work history repeated `copies` times
+    and the contact line moved into a trailing Contact section"""
+    lines = read("resume_large.txt").splitlines()
+    name, contact, body = lines[0], lines[1], [line for line in lines[2:] if line.strip()]
+    start, end = body.index("Work Experience"), body.index("Projects")
+    body = body[:start + 1] + body[start + 1:end] * copies + body[end:]
+    styled = {"Work Experience": "WORK EXPERIENCE:", "Education": "\u2022 Education", "Skills": "SKILLS"}
+    body = [styled.get(line, line).replace("- ", "\u25aa ", 1) for line in body]
+    return "\n".join([name, *body, "Contact", contact])
+
+
+def _portfolio_lines(text: str) -> List[str]:
+    return [line for line in text.splitlines()[8:40] if line.startswith("- ")]
+
+
+def render_pdf(text: str, portfolio_pages: int = 0, columns: int = 1) -> bytes:
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import BaseDocTemplate, Frame, PageBreak, PageTemplate, Paragraph, SimpleDocTemplate
+
+    styles = getSampleStyleSheet()
+    flowables = [Paragraph(escape(line) or "&nbsp;", styles["Normal"]) for line in text.splitlines()]
+    for page in range(portfolio_pages):
+        flowables.append(PageBreak())
+        flowables.append(Paragraph(f"Portfolio project {page + 1}", styles["Heading2"]))
+        flowables.extend(Paragraph(escape(line), styles["Normal"]) for line in _portfolio_lines(text))
+    buffer = BytesIO()
+    if columns == 1:
+        SimpleDocTemplate(buffer, pagesize=letter, invariant=1).build(flowables)
+        return buffer.getvalue()
+    doc = BaseDocTemplate(buffer, pagesize=letter, invariant=1)
+    width = doc.width / columns
+    frames = [
+        Frame(doc.leftMargin + i * width, doc.bottomMargin, width - 6, doc.height, id=f"column{i}")
+        for i in range(columns)
+    ]
+    doc.addPageTemplates([PageTemplate(id="columns", frames=frames)])
+    doc.build(flowables)
+    return buffer.getvalue()
+
+
+@lru_cache(maxsize=None)
+def pdf_resumes() -> Dict[str, bytes]:
+    resumes = text_resumes()
+    return {
+        "small_pdf": render_pdf(resumes["small_text"]),
+        "large_pdf": render_pdf(resumes["large_text"]),
+        "multipage_pdf": render_pdf(resumes["large_text"], PORTFOLIO_PAGES),
+        "two_column_pdf": render_pdf(resumes["large_text"], columns=2)
+    }
+
+
+def pdf_truth() -> Dict[str, str]:
+    """The text each PDF fixture was rendered from"""
+    resumes = text_resumes()
+    portfolio = "\n".join(
+        f"Portfolio project {page + 1}\n" + "\n".join(_portfolio_lines(resumes["large_text"]))
+        for page in range(PORTFOLIO_PAGES)
+    )
+    return {
+        "small_pdf": resumes["small_text"],
+        "large_pdf": resumes["large_text"],
+        "multipage_pdf": f"{resumes['large_text']}\n{portfolio}",
+        "two_column_pdf": resumes["large_text"]
+    }
+
+
+def resumes() -> Dict[str, bytes]:
+    """Every CV fixture as the raw bytes a profile would carry"""
+    documents = {name: text.encode("utf-8") for name, text in text_resumes().items()}
+    documents.update(pdf_resumes())
+    return documents
+
+
+def personalized_pdf(text: str, index: int) -> bytes:
+    """A distinct copy of a resume so per-user caches miss in throughput runs"""
+    name, _, rest = text.partition("\n")
+    return render_pdf(f"{name} {index}\n{rest}")
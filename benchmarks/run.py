@@ -0,0 +1,358 @@
+"""Offline benchmarks for the All_services generation pipelines.
+
+    python benchmarks/run.py                          # every suite -> benchmarks/results/<commit>.json
+    python benchmarks/run.py --suite extraction --suite parser --repeat 50
+    python benchmarks/run.py --suite tasks --tasks 60 --concurrency 8 --llm-latency-ms 800
+    python benchmarks/compare.py benchmarks/results/<base>.json benchmarks/results/<head>.json
+
+Suites:
+    extraction  pdfminer text extraction per PDF fixture (uncached), the first page alone,
+                a cache hit, and the multipage PDF across the page pool
+    modes       every PDF_EXTRACTION_MODE per PDF fixture: time, speedup over full, and
+                accuracy against the fixture's source text (word-sequence similarity,
+                same sections found, same contact details)
+    parser      section index, ResumeParser contact/name scanners and the full spaCy parse;
+                the section regexes the index replaced run alongside as a baseline
+    prompt      rewrite and letter prompt building (budgeting, relevance ranking)
+    pdf         convert_to_pdf for a letter and a long document
+    templates   Resume_Email_app resume template rendering
+    tasks       generation_pipeline_task, generate_followup_email and generate_resume
+                throughput through a Celery worker
+
+Everything runs in-process and offline:
+- the LLM is the fake backend (LLM_BACKEND=fake);
+- Celery uses the memory:// broker and the cache+memory:// result backend;
+- caches fall back to memory and artifacts go to a temporary directory;
+- profile and job-listing fetches are answered from the fixtures.
+
+Every whole-task run gets a personalized CV, so the extraction, structured-CV
+and LLM caches all miss, as they would for a new user. Suites whose
+dependencies are missing (e.g. no spaCy model) are recorded with an `error`
+instead of timings.
+"""
+import argparse
+import asyncio
+import base64
+import difflib
+import importlib.util
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+
+import fixtures
+from harness import REPO_ROOT, measure, metadata, summarize, write_results
+
+SUITES = ("extraction", "modes", "parser", "prompt", "pdf", "templates", "tasks")
+TASKS = ("generation_pipeline_task", "generate_followup_email", "generate_resume")
+# The per-section searches ResumeParser used before SectionIndex
+LEGACY_SECTION_PATTERNS = (
+    re.compile(r"(?i)(education.*?)(?=work experience|$)", re.DOTALL),
+    re.compile(r"(?i)(work experience|experience.*?)(?=education|skills|$)", re.DOTALL),
+)
+
+
+def configure_offline(args, workdir: str):
+    """Environment for the All_services modules; must run before they are imported"""
+    os.environ.update({
+        "LLM_BACKEND": "fake",
+        "FAKE_LLM_P50_MS": str(args.llm_latency_ms),
+        "FAKE_LLM_P95_MS": str(args.llm_p95_ms if args.llm_p95_ms is not None else args.llm_latency_ms * 2.5),
+        "CELERY_BROKER_URL": "memory://",
+        "CELERY_RESULT_BACKEND": "cache+memory://",
+        "CV_CACHE_REDIS_URL": "",
+        "CV_STORE_REDIS_URL": "",
+        "LLM_CACHE_BACKEND": "memory",
+        "LLM_GATEWAY_REDIS_URL": "",
+        "JOB_ANALYSIS_REDIS_URL": "",
+        "STREAM_REDIS_URL": "",
+        "MINIO_ENDPOINT": "",
+        "ARTIFACT_DIR": os.path.join(workdir, "artifacts"),
+    })
+    # The gateway's provider quotas are not what is measured here
+    os.environ.setdefault("LLM_RPM", "1000000")
+    os.environ.setdefault("LLM_TPM", "1000000000")
+    os.environ.setdefault("LLM_MAX_CONCURRENCY", str(max(args.concurrency, 4)))
+    sys.path.insert(0, os.path.join(REPO_ROOT, "All_services"))
+
+
+def _report(message: str):
+    # stderr rather than logging: the Celery test worker reconfigures the root logger
+    print(message, file=sys.stderr, flush=True)
+
+
+def _run_case(results: dict, name: str, fn, repeat: int, warmup: int = 1):
+    try:
+        results[name] = measure(fn, repeat, warmup)
+        _report(f"{name}: p50 {results[name]['p50_ms']:.3f}ms")
+    except Exception as e:
+        results[name] = {"error": f"{type(e).__name__}: {e}"}
+        _report(f"{name}: skipped ({results[name]['error']})")
+
+
+def bench_extraction(results: dict, repeat: int):
+    import cv_cache
+
+    for name, pdf in fixtures.pdf_resumes().items():
+        _run_case(results, f"extraction/{name}", lambda: cv_cache._pdfminer_extract(pdf), repeat)
+        _run_case(results, f"extraction/first_page[{name}]", lambda: next(cv_cache.iter_pdf_pages(pdf)), repeat)
+    pdf = fixtures.pdf_resumes()["large_pdf"]
+    _run_case(results, "extraction/cache_hit[large_pdf]", lambda: cv_cache.extract_pdf_text(pdf), repeat)
+
+    # Page ranges across the process pool; the warmup run pays for starting it
+    workers = min(os.cpu_count() or 1, 4)
+    pdf = fixtures.pdf_resumes()["multipage_pdf"]
+    if workers < 2:
+        results["extraction/parallel[multipage_pdf]"] = {"error": "needs more than one CPU"}
+        _report("extraction/parallel[multipage_pdf]: skipped (needs more than one CPU)")
+        return
+    cv_cache.PDF_POOL_WORKERS, cv_cache.PDF_POOL_MIN_PAGES = workers, 2
+    try:
+        _run_case(results, "extraction/parallel[multipage_pdf]", lambda: cv_cache._pdfminer_extract(pdf), repeat)
+    finally:
+        cv_cache.PDF_POOL_WORKERS = 0
+
+
+def bench_modes(results: dict, repeat: int):
+    import cv_cache
+    from resume_parser import SectionIndex, scan_contact
+
+    truth = fixtures.pdf_truth()
+    for name, pdf in fixtures.pdf_resumes().items():
+        expected = SectionIndex(truth[name])
+        for mode in cv_cache.EXTRACTION_MODES:
+            case = f"modes/{mode}[{name}]"
+            _run_case(results, case, lambda: cv_cache._pdfminer_extract(pdf, mode), max(repeat // 2, 3))
+            if "error" in results[case]:
+                continue
+            text = cv_cache._pdfminer_extract(pdf, mode)
+            index = SectionIndex(text)
+            results[case].update({
+                "word_accuracy": round(difflib.SequenceMatcher(
+                    None, truth[name].split(), text.split(), autojunk=False).ratio(), 4),
+                "sections_match": index.names() == expected.names(),
+                "contact_match": scan_contact(text) == scan_contact(truth[name])
+            })
+        full = results.get(f"modes/full[{name}]", {}).get("p50_ms")
+        for mode in cv_cache.EXTRACTION_MODES:
+            record = results[f"modes/{mode}[{name}]"]
+            if full and record.get("p50_ms"):
+                record["speedup_vs_full"] = round(full / record["p50_ms"], 2)
+            _report(f"modes/{mode}[{name}]: {record.get('speedup_vs_full')}x, accuracy {record.get('word_accuracy')}, "
+                    f"sections {record.get('sections_match')}, contact {record.get('contact_match')}")
+
+
+def bench_parser(results: dict, repeat: int):
+    import cv_cache
+    from resume_parser import ParsedResume, ResumeParser, SectionIndex
+
+    texts = dict(fixtures.text_resumes())
+    texts["large_pdf_text"] = cv_cache._pdfminer_extract(fixtures.pdf_resumes()["large_pdf"])
+    texts["messy_text"] = fixtures.messy_resume()
+    for name, text in texts.items():
+        _run_case(results, f"parser/sections[{name}]", lambda: SectionIndex(text), repeat * 10)
+        _run_case(results, f"parser/sections_legacy[{name}]",
+                  lambda: [pattern.search(text) for pattern in LEGACY_SECTION_PATTERNS], repeat * 10)
+        _run_case(results, f"parser/contact[{name}]", lambda: ResumeParser.parse_contact(text), repeat * 10)
+        _run_case(results, f"parser/name[{name}]", lambda: ResumeParser.parse_name(text), repeat * 10)
+        # ParsedResume directly, bypassing parse_resume's Doc cache
+        _run_case(results, f"parser/full[{name}]", lambda: ParsedResume(text).to_dict(), max(repeat // 5, 3))
+
+
+def bench_prompt(results: dict, repeat: int):
+    import tasks
+
+    jd = fixtures.job_descriptions()["backend"]
+    cv_json = fixtures.structured_cv()
+    for name, text in fixtures.text_resumes().items():
+        _run_case(results, f"prompt/rewrite[{name}]", lambda: tasks.build_rewrite_prompt(text, jd, "Go", "5 years"), repeat * 5)
+    for doc_type in ("cover_letter", "follow_up_email"):
+        _run_case(
+            results, f"prompt/letter[{doc_type}]",
+            lambda: tasks.build_letter_prompt(cv_json, jd, "Professional", doc_type=doc_type), repeat * 5
+        )
+
+
+def bench_pdf(results: dict, repeat: int):
+    import fake_llm
+    import tasks
+
+    letter = fake_llm.render(tasks.build_letter_prompt(fixtures.structured_cv(), fixtures.job_descriptions()["backend"], "Professional"))
+    long_document = fixtures.text_resumes()["large_text"].replace("&", "&amp;")
+    _run_case(results, "pdf/convert_to_pdf[letter]", lambda: tasks.convert_to_pdf(letter), repeat)
+    _run_case(results, "pdf/convert_to_pdf[long_document]", lambda: tasks.convert_to_pdf(long_document), repeat)
+
+
+def bench_templates(results: dict, repeat: int):
+    path = os.path.join(REPO_ROOT, "Resume_Email_app", "services", "template_render.py")
+    spec = importlib.util.spec_from_file_location("template_render", path)
+    template_render = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(template_render)
+
+    cv_json = fixtures.structured_cv()
+    latest = cv_json["experience"][0]
+    first_name, _, last_name = cv_json["name"].partition(" ")
+    context = {
+        "first_name": first_name, "last_name": last_name,
+        "start_date": "2022", "end_date": "Present",
+        "job_title": latest["title"], "company": latest["company"], "location": latest["location"],
+        "description": " ".join(latest["highlights"]),
+        "profile": cv_json
+    }
+    for template in ("modern", "classic"):
+        _run_case(results, f"templates/resume[{template}]", lambda: template_render.render_resume(template, context), repeat * 10)
+
+
+class _TaskClock:
+    """Submit/start/finish times per task id, recorded from Celery signals"""
+
+    def __init__(self):
+        self.submitted, self.started, self.finished = {}, {}, {}
+        self.lock = threading.Lock()
+
+    def on_prerun(self, task_id=None, **kwargs):
+        with self.lock:
+            self.started[task_id] = time.perf_counter()
+
+    def on_postrun(self, task_id=None, **kwargs):
+        with self.lock:
+            self.finished[task_id] = time.perf_counter()
+
+
+def _serve_fixtures(api_client, profiles: dict, listings: dict):
+    """Answer the pipelines' HTTP fetches from the fixtures"""
+    async def get_user_profile(user_id: str) -> dict:
+        await asyncio.sleep(0)
+        return profiles[user_id]
+
+    async def get_job_listing(job_id: str) -> dict:
+        await asyncio.sleep(0)
+        return listings[job_id]
+
+    api_client.get_user_profile = get_user_profile
+    api_client.get_job_listing = get_job_listing
+
+
+def _spacy_available() -> str:
+    try:
+        from resume_parser import get_nlp
+        get_nlp()
+        return ""
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+
+
+def bench_tasks(results: dict, count: int, concurrency: int, timeout: float):
+    from celery.contrib.testing.worker import start_worker
+    from celery.signals import task_postrun, task_prerun
+
+    import tasks
+
+    resumes = fixtures.text_resumes()
+    sources = ["small_text", "large_text"]
+    jds = fixtures.job_descriptions()
+    profiles, listings = {}, {}
+    # Distinct users and CVs per task type: two thirds PDFs, one third plain text
+    for name in TASKS:
+        for i in range(count):
+            text = f"{resumes[sources[i % 2]]}\nRef {name}-{i}"
+            cv = fixtures.personalized_pdf(text, i) if i % 3 else text.encode("utf-8")
+            profiles[f"{name}-{i}"] = {
+                "name": "", "email": "", "experience": [], "education": [], "skills": [],
+                "resume": {"content": base64.b64encode(cv).decode()}
+            }
+    for name, jd in jds.items():
+        listings[f"bench-job-{name}"] = {"title": name, "description": jd}
+    _serve_fixtures(tasks.api_client, profiles, listings)
+
+    clock = _TaskClock()
+    task_prerun.connect(clock.on_prerun, weak=False)
+    task_postrun.connect(clock.on_postrun, weak=False)
+    jd_names = list(jds)
+    submissions = {
+        "generation_pipeline_task": lambda i: tasks.generation_pipeline_task.apply_async(
+            kwargs={"job_description": jds[jd_names[i % 2]], "user_id": f"generation_pipeline_task-{i}", "tone": "Professional"}),
+        "generate_followup_email": lambda i: tasks.generate_followup_email.apply_async(
+            kwargs={"user_id": f"generate_followup_email-{i}", "job_id": f"bench-job-{jd_names[i % 2]}"}),
+        "generate_resume": lambda i: tasks.generate_resume.apply_async(
+            kwargs={"user_id": f"generate_resume-{i}", "job_description": jds[jd_names[i % 2]]}),
+    }
+    missing_spacy = _spacy_available()
+    # The memory transport polls once a second by default, which would dominate queue wait
+    tasks.celery_app.conf.broker_transport_options = {"polling_interval": 0.01}
+    with start_worker(tasks.celery_app, pool="threads", concurrency=concurrency,
+                      perform_ping_check=False, shutdown_timeout=30):
+        for name in TASKS:
+            if name == "generate_resume" and missing_spacy:
+                results[f"tasks/{name}"] = {"error": f"spaCy unavailable: {missing_spacy}"}
+                continue
+            started = time.perf_counter()
+            pending = []
+            for i in range(count):
+                result = submissions[name](i)
+                clock.submitted[result.id] = time.perf_counter()
+                pending.append(result)
+            failed = 0
+            for result in pending:
+                try:
+                    value = result.get(timeout=max(timeout - (time.perf_counter() - started), 0.1))
+                    if isinstance(value, dict) and value.get("status") == "failed":
+                        failed += 1
+                except Exception:
+                    failed += 1
+            wall = time.perf_counter() - started
+            done = [r.id for r in pending if r.id in clock.finished]
+            latencies = [(clock.finished[t] - clock.submitted[t]) * 1000 for t in done]
+            waits = [(clock.started[t] - clock.submitted[t]) * 1000 for t in done if t in clock.started]
+            record = summarize(latencies) if latencies else {"error": "no task finished"}
+            record.update({
+                "tasks": count, "failed": failed, "concurrency": concurrency,
+                "wall_s": round(wall, 3), "throughput_per_s": round((count - failed) / wall, 3),
+                "queue_wait_p50_ms": round(sorted(waits)[len(waits) // 2], 3) if waits else None
+            })
+            results[f"tasks/{name}"] = record
+            _report(f"tasks/{name}: {record['throughput_per_s']}/s, p50 {record.get('p50_ms')}ms, {failed} failed")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suite", action="append", choices=SUITES, help="suite to run (repeatable; default all)")
+    parser.add_argument("--repeat", type=int, default=20, help="timed iterations per micro-benchmark")
+    parser.add_argument("--tasks", type=int, default=24, help="tasks submitted per task type")
+    parser.add_argument("--concurrency", type=int, default=4, help="worker threads for the task suite")
+    parser.add_argument("--task-timeout", type=float, default=300, help="seconds to wait for a task batch")
+    parser.add_argument("--llm-latency-ms", type=float, default=0, help="fake LLM median latency")
+    parser.add_argument("--llm-p95-ms", type=float, default=None, help="fake LLM p95 latency (default 2.5x median)")
+    parser.add_argument("--output", help="result file (default benchmarks/results/<commit>.json)")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(message)s")
+    suites = args.suite or list(SUITES)
+    with tempfile.TemporaryDirectory(prefix="cv-bench-") as workdir:
+        configure_offline(args, workdir)
+        cwd = os.getcwd()
+        os.chdir(workdir)  # tasks write their debug copies relative to the working directory
+        results = {}
+        try:
+            for suite in suites:
+                if suite == "tasks":
+                    bench_tasks(results, args.tasks, args.concurrency, args.task_timeout)
+                else:
+                    globals()[f"bench_{suite}"](results, args.repeat)
+        finally:
+            os.chdir(cwd)
+
+    meta = metadata({k: v for k, v in vars(args).items() if k not in ("output", "verbose")})
+    output = args.output or os.path.join(
+        REPO_ROOT, "benchmarks", "results", f"{meta['commit'] or 'local'}{'-dirty' if meta['dirty'] else ''}.json"
+    )
+    write_results(output, meta, results)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
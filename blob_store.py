@@ -0,0 +1,149 @@
+import hashlib
+import logging
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class BlobStore(ABC):
+    """Content-addressed store for uploaded CVs; tasks receive refs, never the bytes.
+
+    Keys are the SHA-256 of the content (the same key the extraction cache and
+    structured-CV store use), so re-uploading a CV stores it once.
+    """
+
+    backend = "none"
+    staging_dir = None
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def put_file(self, key: str, path: str, content_type: str):
+        ...
+
+    @abstractmethod
+    def get(self, key: str) -> bytes:
+        ...
+
+    def _store(self, key: str, path: str, content_type: str):
+        if not self.exists(key):
+            self.put_file(key, path, content_type)
+
+    async def spool(self, upload, content_type: str = "application/octet-stream",
+                    max_bytes: int = MAX_UPLOAD_BYTES) -> Dict:
+        """Copy an UploadFile to the store in chunks, hashing as it goes, and return its ref.
+
+        Disk writes and backend calls run in the threadpool so the event loop keeps
+        serving; uploads past `max_bytes` raise UploadTooLarge.
+        """
+        from fastapi.concurrency import run_in_threadpool
+
+        if (getattr(upload, "size", None) or 0) > max_bytes:
+            raise UploadTooLarge(f"Upload is {upload.size} bytes, the limit is {max_bytes}")
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(prefix="cv_upload_", suffix=".part", dir=self.staging_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    chunk = await upload.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise UploadTooLarge(f"Upload exceeds the limit of {max_bytes} bytes")
+                    digest.update(chunk)
+                    await run_in_threadpool(f.write, chunk)
+            key = digest.hexdigest()
+            await run_in_threadpool(self._store, key, tmp_path, content_type)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return {"backend": self.backend, "key": key, "size": size, "content_type": content_type}
+
+
+class LocalBlobStore(BlobStore):
+    """Files under a directory shared by the API and workers (e.g. a mounted volume)"""
+
+    backend = "local"
+
+    def __init__(self, root: str):
+        self.root = root
+        # Stage uploads next to their final location so put_file is a rename
+        self.staging_dir = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, os.path.basename(key))
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def put_file(self, key: str, path: str, content_type: str):
+        os.replace(path, self._path(key))
+
+    def get(self, key: str) -> bytes:
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+
+class MinioBlobStore(BlobStore):
+    backend = "minio"
+
+    def __init__(self, client, bucket: str):
+        self.client = client
+        self.bucket = bucket
+        if not client.bucket_exists(bucket):
+            client.make_bucket(bucket)
+
+    def exists(self, key: str) -> bool:
+        from minio.error import S3Error
+        try:
+            self.client.stat_object(self.bucket, key)
+            return True
+        except S3Error:
+            return False
+
+    def put_file(self, key: str, path: str, content_type: str):
+        self.client.fput_object(self.bucket, key, path, content_type=content_type)
+
+    def get(self, key: str) -> bytes:
+        response = self.client.get_object(self.bucket, key)
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+
+def build_blob_store() -> BlobStore:
+    """MinIO when MINIO_* is configured, otherwise files under BLOB_DIR"""
+    endpoint = os.getenv("MINIO_ENDPOINT")
+    if endpoint and os.getenv("MINIO_ACCESS_KEY") and os.getenv("MINIO_SECRET_KEY"):
+        try:
+            from minio import Minio
+            client = Minio(
+                endpoint,
+                access_key=os.getenv("MINIO_ACCESS_KEY"),
+                secret_key=os.getenv("MINIO_SECRET_KEY"),
+                secure=False  # Set to True if using HTTPS
+            )
+            return MinioBlobStore(client, os.getenv("BLOB_BUCKET_NAME", "cv-uploads"))
+        except Exception as e:
+            logger.error(f"MinIO blob store unavailable, using local files: {str(e)}")
+    return LocalBlobStore(os.getenv("BLOB_DIR", "cv_uploads"))
+
+
+blob_store = build_blob_store()
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_RESUME_FIELD = "__resume__"
+
+
+class StructuredCVStore:
+    """Structured CV JSON persisted per user and resume hash.
+
+    Each user has one Redis hash holding the hash of the resume it was built
+    from plus one entry per variant (extra skills/experience supplied with the
+    request). A lookup or write with a different resume hash drops everything
+    stored for the user, so a changed resume invalidates the old JSON.
+
+    Without Redis the store is an in-process LRU of at most `max_users` users
+    with the same TTL. Each process then has its own copy, so invalidation
+    cannot reach the workers.
+    """
+
+    def __init__(self, redis_url: Optional[str] = None, ttl: int = 30 * 24 * 3600,
+                 prefix: str = "cv_json", max_users: int = 1024):
+        self.ttl = ttl
+        self.prefix = prefix
+        self.max_users = max_users
+        self._local: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._observers: List[Callable[[str], None]] = []
+        self._redis = None
+        if redis_url:
+            try:
+                import redis
+                self._redis = redis.Redis.from_url(
+                    redis_url, socket_connect_timeout=0.5, socket_timeout=1.0
+                )
+            except Exception as e:
+                logger.warning(f"Structured CV store falling back to memory: {str(e)}")
+        if self._redis is None:
+            logger.warning("Structured CV store is per process; invalidation needs CV_STORE_REDIS_URL")
+
+    @classmethod
+    def from_env(cls) -> "StructuredCVStore":
+        return cls(
+            redis_url=os.getenv("CV_STORE_REDIS_URL", os.getenv("CELERY_RESULT_BACKEND")),
+            ttl=int(os.getenv("CV_STORE_TTL", str(30 * 24 * 3600))),
+            max_users=int(os.getenv("CV_STORE_MAX_USERS", "1024"))
+        )
+
+    @property
+    def shared(self) -> bool:
+        """Whether every process sees the same entries (i.e. Redis is configured)"""
+        return self._redis is not None
+
+    @staticmethod
+    def variant_for(*extras: str) -> str:
+        if not any(extras):
+            return "base"
+        return hashlib.sha256("\x1f".join(extras).encode("utf-8")).hexdigest()[:16]
+
+    def _key(self, user_id: str) -> str:
+        return f"{self.prefix}:{user_id or 'anonymous'}"
+
+    def _read(self, user_id: str) -> Dict[str, str]:
+        if self._redis is not None:
+            try:
+                return {
+                    k.decode(): v.decode()
+                    for k, v in self._redis.hgetall(self._key(user_id)).items()
+                }
+            except Exception as e:
+                logger.warning(f"Structured CV store read failed: {str(e)}")
+                return {}
+        key = self._key(user_id)
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return {}
+            expires_at, entries = entry
+            if expires_at < time.time():
+                del self._local[key]
+                return {}
+            self._local.move_to_end(key)
+            return dict(entries)
+
+    def get(self, user_id: str, resume_hash: str, variant: str = "base") -> Optional[dict]:
+        entries = self._read(user_id)
+        if entries.get(_RESUME_FIELD) != resume_hash or variant not in entries:
+            return None
+        return json.loads(entries[variant])
+
+    def put(self, user_id: str, resume_hash: str, cv_json: dict, variant: str = "base"):
+        key = self._key(user_id)
+        payload = json.dumps(cv_json)
+        if self._redis is not None:
+            try:
+                current = self._redis.hget(key, _RESUME_FIELD)
+                pipe = self._redis.pipeline()
+                if current is not None and current.decode() != resume_hash:
+                    pipe.delete(key)
+                pipe.hset(key, mapping={_RESUME_FIELD: resume_hash, variant: payload})
+                pipe.expire(key, self.ttl)
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"Structured CV store write failed: {str(e)}")
+            return
+        with self._lock:
+            _, entries = self._local.pop(key, (0, {}))
+            if entries.get(_RESUME_FIELD) != resume_hash:
+                entries = {_RESUME_FIELD: resume_hash}
+            entries[variant] = payload
+            self._local[key] = (time.time() + self.ttl, entries)
+            while len(self._local) > self.max_users:
+                self._local.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        """Drop every structured CV stored for the user (e.g. after a profile update)"""
+        if self._redis is not None:
+            try:
+                self._redis.delete(self._key(user_id))
+            except Exception as e:
+                logger.warning(f"Structured CV store invalidation failed: {str(e)}")
+            return
+        with self._lock:
+            self._local.pop(self._key(user_id), None)
+
+    def add_observer(self, observer: Callable[[str], None]):
+        """`observer("hit" | "miss")` is called for every lookup, e.g. to export metrics"""
+        self._observers.append(observer)
+
+    def _notify(self, result: str):
+        for observer in self._observers:
+            try:
+                observer(result)
+            except Exception as e:
+                logger.debug(f"Structured CV store observer failed: {str(e)}")
+
+    def get_or_create(self, user_id: str, resume_hash: str, build: Callable[[], dict],
+                      variant: str = "base", refresh: bool = False) -> dict:
+        """Return the stored JSON or build, store and return it; error results are not stored"""
+        if not refresh:
+            cv_json = self.get(user_id, resume_hash, variant)
+            self._notify("miss" if cv_json is None else "hit")
+            if cv_json is not None:
+                return cv_json
+        cv_json = build()
+        if "error" not in cv_json:
+            self.put(user_id, resume_hash, cv_json, variant)
+        return cv_json
+
+
+structured_cv_store = StructuredCVStore.from_env()
@@ -0,0 +1,145 @@
+"""Relay of streamed letter text from Celery workers to SSE clients over Redis.
+
+Workers publish JSON events ({"seq", "type", "data"}) on `letter_stream:{task_id}`
+and append them to a replay list, so a client that connects after generation
+started (or finished) still receives every chunk in order.
+
+When a task attempt fails and is retried, a `reset` event tells clients to
+drop the letter text received so far; the next attempt streams it again.
+Replays start at the latest reset.
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import AsyncIterator
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "letter_stream"
+REPLAY_TTL = 3600
+IDLE_TIMEOUT = float(os.getenv("STREAM_IDLE_TIMEOUT", "300"))
+
+
+def _redis_url() -> str:
+    return os.getenv("STREAM_REDIS_URL", os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/0"))
+
+
+def channel_for(task_id: str) -> str:
+    return f"{CHANNEL_PREFIX}:{task_id}"
+
+
+class NullStreamPublisher:
+    """Stand-in used when the request did not ask for streaming"""
+
+    def stage(self, name: str):
+        pass
+
+    def chunk(self, text: str):
+        pass
+
+    def reset(self):
+        pass
+
+    def done(self, text: str):
+        pass
+
+    def error(self, message: str):
+        pass
+
+
+class LetterStreamPublisher(NullStreamPublisher):
+    """Worker-side publisher; failures are logged so streaming never breaks generation"""
+
+    def __init__(self, task_id: str):
+        import redis
+        self.task_id = task_id
+        self.channel = channel_for(task_id)
+        self.replay_key = f"{self.channel}:log"
+        self.redis = redis.Redis.from_url(_redis_url(), socket_connect_timeout=0.5, socket_timeout=1.0)
+        # Continue numbering across task retries so clients can keep de-duplicating by seq.
+        self.seq = self.redis.llen(self.replay_key)
+
+    def _publish(self, event_type: str, data=None):
+        self.seq += 1
+        message = json.dumps({"seq": self.seq, "type": event_type, "data": data})
+        try:
+            pipe = self.redis.pipeline()
+            pipe.rpush(self.replay_key, message)
+            pipe.expire(self.replay_key, REPLAY_TTL)
+            pipe.publish(self.channel, message)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Stream publish failed for {self.task_id}: {str(e)}")
+
+    def stage(self, name: str):
+        self._publish("stage", name)
+
+    def chunk(self, text: str):
+        if text:
+            self._publish("chunk", text)
+
+    def reset(self):
+        self._publish("reset")
+
+    def done(self, text: str):
+        # Carries the final letter (placeholders filled in), which also covers
+        # cache hits where the provider never streamed any chunks.
+        self._publish("done", text)
+
+    def error(self, message: str):
+        self._publish("error", message)
+
+
+def open_publisher(task_id: str, enabled: bool) -> NullStreamPublisher:
+    if not enabled:
+        return NullStreamPublisher()
+    try:
+        return LetterStreamPublisher(task_id)
+    except Exception as e:
+        logger.warning(f"Streaming disabled for {task_id}: {str(e)}")
+        return NullStreamPublisher()
+
+
+def _sse(event: dict) -> str:
+    return f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+async def stream_events(task_id: str) -> AsyncIterator[str]:
+    """Yield SSE frames for a task until it reports done/error or goes idle"""
+    import redis.asyncio as aioredis
+    client = aioredis.Redis.from_url(_redis_url())
+    pubsub = client.pubsub()
+    channel = channel_for(task_id)
+    last_seq = 0
+    try:
+        # Subscribe before reading the replay list so nothing falls in between.
+        await pubsub.subscribe(channel)
+        events = [json.loads(raw) for raw in await client.lrange(f"{channel}:log", 0, -1)]
+        resets = [i for i, event in enumerate(events) if event["type"] == "reset"]
+        for event in events[resets[-1] if resets else 0:]:
+            last_seq = event["seq"]
+            yield _sse(event)
+            if event["type"] in ("done", "error"):
+                return
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + IDLE_TIMEOUT
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if message is None:
+                if loop.time() > deadline:
+                    yield ": idle timeout\n\n"
+                    return
+                continue
+            deadline = loop.time() + IDLE_TIMEOUT
+            event = json.loads(message["data"])
+            if event["seq"] <= last_seq:
+                continue
+            last_seq = event["seq"]
+            yield _sse(event)
+            if event["type"] in ("done", "error"):
+                return
+    finally:
+        await pubsub.unsubscribe(channel)
+        await pubsub.close()
+        await client.close()
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so re-indented or re-wrapped prompts share a cache entry"""
+    return " ".join(prompt.split())
+
+
+def cache_key(model: str, prompt: str, **params) -> str:
+    payload = json.dumps(
+        {"model": model, "prompt": normalize_prompt(prompt), "params": params},
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache(ABC):
+    """Backend interface; subclasses store completions by key"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: str):
+        ...
+
+
+class NullLLMCache(LLMCache):
+    """LLM_CACHE_BACKEND=none, or no backend available: every lookup misses"""
+
+    def get(self, key: str) -> Optional[str]:
+        return None
+
+    def set(self, key: str, value: str):
+        pass
+
+
+class MemoryLLMCache(LLMCache):
+    """In-process LRU bounded by total bytes, with per-entry TTL"""
+
+    def __init__(self, ttl: int = 3600, max_bytes: int = 16 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                self._bytes -= len(self._entries.pop(key)[1])
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= len(self._entries.pop(key)[1])
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._bytes += len(value)
+            while self._entries and self._bytes > self.max_bytes:
+                _, (_, old) = self._entries.popitem(last=False)
+                self._bytes -= len(old)
+
+
+class RedisLLMCache(LLMCache):
+    """Redis backend with TTL and a max-bytes budget evicted least-recently-used first.
+
+    Values live under `{prefix}:{key}`; a sorted set of keys scored by last
+    access and a hash of entry sizes let writers evict the oldest entries once
+    the tracked total exceeds `max_bytes`.
+    """
+
+    def __init__(self, redis_url: str, ttl: int = 3600, max_bytes: int = 256 * 1024 * 1024,
+                 prefix: str = "llm_cache"):
+        import redis
+        self.redis = redis.Redis.from_url(redis_url, socket_connect_timeout=0.5, socket_timeout=1.0)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.prefix = prefix
+        self._index = f"{prefix}:index"
+        self._sizes = f"{prefix}:sizes"
+        self._total = f"{prefix}:bytes"
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.redis.get(f"{self.prefix}:{key}")
+        if value is None:
+            return None
+        self.redis.zadd(self._index, {key: time.time()})
+        return value.decode("utf-8")
+
+    def set(self, key: str, value: str):
+        data = value.encode("utf-8")
+        pipe = self.redis.pipeline()
+        pipe.set(f"{self.prefix}:{key}", data, ex=self.ttl)
+        pipe.zadd(self._index, {key: time.time()})
+        pipe.hget(self._sizes, key)
+        pipe.hset(self._sizes, key, len(data))
+        pipe.incrby(self._total, len(data))
+        _, _, previous, _, total = pipe.execute()
+        if previous is not None:
+            total = self.redis.decrby(self._total, int(previous))
+        if total > self.max_bytes:
+            self._evict(total)
+
+    def _evict(self, total: int):
+        while total > self.max_bytes:
+            oldest = self.redis.zpopmin(self._index, 16)
+            if not oldest:
+                break
+            keys = [k.decode() for k, _ in oldest]
+            sizes = self.redis.hmget(self._sizes, keys)
+            freed = sum(int(s) for s in sizes if s is not None)
+            pipe = self.redis.pipeline()
+            pipe.delete(*[f"{self.prefix}:{k}" for k in keys])
+            pipe.hdel(self._sizes, *keys)
+            pipe.decrby(self._total, freed)
+            total = pipe.execute()[-1]
+
+
+def build_cache() -> LLMCache:
+    """Pick the backend from LLM_CACHE_BACKEND (redis, memory or none)"""
+    ttl = int(os.getenv("LLM_CACHE_TTL", "3600"))
+    redis_url = os.getenv("LLM_CACHE_REDIS_URL", os.getenv("CELERY_RESULT_BACKEND"))
+    backend = os.getenv("LLM_CACHE_BACKEND", "redis" if redis_url else "memory")
+    try:
+        if backend == "redis" and redis_url:
+            return RedisLLMCache(
+                redis_url, ttl=ttl,
+                max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+            )
+        if backend == "memory":
+            return MemoryLLMCache(
+                ttl=ttl,
+                max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+            )
+    except Exception as e:
+        logger.warning(f"LLM cache backend '{backend}' unavailable: {str(e)}")
+    return NullLLMCache()
+
+
+llm_cache = build_cache()
+_observers: List[Callable[[str], None]] = []
+
+
+def add_observer(observer: Callable[[str], None]):
+    """`observer("hit" | "miss")` is called for every cache lookup, e.g. to export metrics"""
+    _observers.append(observer)
+
+
+def _notify(result: str):
+    for observer in _observers:
+        try:
+            observer(result)
+        except Exception as e:
+            logger.debug(f"LLM cache observer failed: {str(e)}")
+
+
+def cached_completion(model: str, prompt: str, generate: Callable[[], str],
+                      bypass_cache: bool = False,
+                      validate: Optional[Callable[[str], bool]] = None, **params) -> str:
+    """Return a cached completion for (model, prompt, params) or call `generate` and store it.
+
+    Cache errors are logged and never fail the call; `bypass_cache=True` always
+    calls the provider but still refreshes the stored entry. Responses rejected
+    by `validate` are returned but not stored.
+    """
+    key = cache_key(model, prompt, **params)
+    if not bypass_cache:
+        try:
+            cached = llm_cache.get(key)
+            _notify("miss" if cached is None else "hit")
+            if cached is not None:
+                return cached
+        except Exception as e:
+            logger.warning(f"LLM cache read failed: {str(e)}")
+    text = generate()
+    if text and (validate is None or validate(text)):
+        try:
+            llm_cache.set(key, text)
+        except Exception as e:
+            logger.warning(f"LLM cache write failed: {str(e)}")
+    return text
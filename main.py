@@ -1,25 +1,32 @@
 import os
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException
 from fastapi.responses import JSONResponse
 from celery.result import AsyncResult
 from tasks import celery_app  # make sure celery_app is your Celery instance
 
 
-from tasks import generation_pipeline_task
+from tasks import after_cv_extraction, generation_pipeline_task, profile_store
+from blob_store import UploadTooLarge, blob_store
+import fake_llm
+import metrics
+import profiling
 from dotenv import load_dotenv
 load_dotenv()
 
 # Load your API key from an environment variable for security
-if "GEMINI_API_KEY" not in os.environ:
+if not fake_llm.has_api_key("GEMINI_API_KEY"):
     raise Exception("GEMINI_API_KEY environment variable not set.")
 
 app = FastAPI(title="CV Customizer API")
+metrics.add_metrics_endpoint(app)
+profiling.add_profile_endpoint(app, profile_store)
 
 @app.post("/api/generate/cover-letter")
 async def generate_cover_letter(
     job_description: str = Form(...),
     tone: str = Form("Professional"),
-    cv_file: UploadFile = File(...)
+    cv_file: UploadFile = File(...),
+    x_profile: bool = Header(False)
 ):
     """
     Accepts a job description and CV to generate a cover letter.
@@ -28,11 +35,17 @@ async def generate_cover_letter(
     if cv_file.content_type != 'application/pdf':
         raise HTTPException(status_code=400, detail="Invalid file type. Only PDF is accepted.")
 
-    # Read file content to pass to the background task
-    cv_bytes = await cv_file.read()
+    # Spool the upload to the blob store in chunks; only its ref goes through the broker
+    try:
+        cv_ref = await blob_store.spool(cv_file, cv_file.content_type)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
 
     # Enqueue the Celery task and get the job ID
-    task = generation_pipeline_task.apply_async(args=[job_description, cv_bytes, tone])
+    # Extraction runs on the CPU queue, generation on the I/O queue
+    task = after_cv_extraction(cv_ref, generation_pipeline_task.si(
+        job_description, cv_ref, tone
+    ).set(headers=profiling.task_headers(x_profile)))
 
     return JSONResponse(status_code=202, content={"job_id": task.id})
 
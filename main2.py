@@ -1,48 +1,63 @@
 import os
 import httpx
-from fastapi import FastAPI, HTTPException, Form, Query
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Form, Header, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from celery.result import AsyncResult
-from tasks import celery_app, generation_pipeline_task
+from tasks import after_cv_extraction, celery_app, generation_pipeline_task, profile_store
+from cv_cache import extraction_cache
+from llm_gateway import llm_gateway
+from http_client import get_http_client, close_http_client
+from letter_stream import stream_events
+import metrics
+import profiling
 from dotenv import load_dotenv
 
 load_dotenv()
 
 app = FastAPI(title="Cover Letter Generator API")
+metrics.add_metrics_endpoint(app)
+profiling.add_profile_endpoint(app, profile_store)
 
 # Configuration
 PROFILE_API = "https://sandbox.appleazy.com/api/v1/user"
 JOB_API = "https://server.appleazy.com/api/v1/job-listing"
 HOST_URL = "https://your-deployed-domain.com"  # Update with your actual domain
 
+@app.on_event("shutdown")
+async def shutdown_http_pool():
+    await close_http_client()
+
 async def fetch_job_description(job_id: str):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(f"{JOB_API}/{job_id}")
-        if response.status_code != 200:
-            raise HTTPException(502, "Failed to fetch job details")
-        return response.json().get("description", "")
+    client = get_http_client()
+    response = await client.get(f"{JOB_API}/{job_id}")
+    if response.status_code != 200:
+        raise HTTPException(502, "Failed to fetch job details")
+    return response.json().get("description", "")
 
 async def fetch_profile_cv(user_id: str):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{PROFILE_API}/get-profile/{user_id}",
-            params={"field": "userId"},
-            timeout=30.0
-        )
-        # if response.status_code != 200:
-        #     raise HTTPException(502, "Failed to fetch profile")
-        response.raise_for_status()
-        data = response.json()
-        if not data.get("resume")or not data["resume"].get("content"):
-            raise HTTPException(400, "No resume found in profile")
-        return data["resume"]["content"]  # Base64 encoded CV
+    client = get_http_client()
+    response = await client.get(
+        f"{PROFILE_API}/get-profile/{user_id}",
+        params={"field": "userId"},
+        timeout=30.0
+    )
+    # if response.status_code != 200:
+    #     raise HTTPException(502, "Failed to fetch profile")
+    response.raise_for_status()
+    data = response.json()
+    if not data.get("resume")or not data["resume"].get("content"):
+        raise HTTPException(400, "No resume found in profile")
+    return data["resume"]["content"]  # Base64 encoded CV
 
 @app.post("/generate-cover-letter")
 async def generate_cover_letter(
     # job_id: str = Form(...),
     job_description: str = Form(...),
     user_id: str = Form(...),
-    tone: str = Form("Professional")
+    tone: str = Form("Professional"),
+    bypass_cache: bool = Form(False),
+    stream: bool = Form(False),
+    x_profile: bool = Header(False)
 ):
     try:
         # Fetch required data
@@ -55,16 +70,18 @@ async def generate_cover_letter(
         #     args=[job_description, cv_content, tone]
         # )
          # Immediately return job ID while processing in background
-        task = generation_pipeline_task.apply_async(
-            args=[job_description, user_id, tone]  # Pass user_id directly
-        )
+        task = after_cv_extraction(user_id, generation_pipeline_task.si(
+            job_description, user_id, tone,  # Pass user_id directly
+            bypass_cache=bypass_cache, stream=stream
+        ).set(headers=profiling.task_headers(x_profile)))
         
         return JSONResponse(
             status_code=202,
             content={
                 "status": "processing",
                 "cover_letter_url": f"/cover-letters/{task.id}",
-                "tracking_url": f"/api/status/{task.id}"
+                "tracking_url": f"/api/status/{task.id}",
+                "stream_url": f"/stream/{task.id}" if stream else None
             }
         )
         
@@ -126,6 +143,25 @@ async def get_cover_letter(task_id: str):
 #         "cover_letter": task_result.result["cover_letter"]
 #     }
 
+@app.get("/stream/{task_id}")
+async def stream_document(task_id: str):
+    """Server-sent events: stage updates, letter chunks as they are generated, then done/error"""
+    return StreamingResponse(
+        stream_events(task_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """CV text extraction cache hit/miss counters"""
+    return {"cv_text": extraction_cache.stats()}
+
+@app.get("/llm/stats")
+async def llm_gateway_stats():
+    """LLM gateway request, throttling and wait-time counters (shared totals come from the workers)"""
+    return llm_gateway.stats()
+
 @app.get("/api/status/{task_id}")
 async def get_status(task_id: str):
     """Proper status checking endpoint"""
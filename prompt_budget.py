@@ -0,0 +1,240 @@
+"""Prompt compaction and token budgeting for CV / job-description prompts.
+
+`fit_sections` compacts each variable part of a prompt (whitespace,
+boilerplate lines, compact JSON) and, when the total exceeds the model's
+budget, shares the budget between the parts and trims each one by
+relevance to its query (usually the job description), keeping the
+surviving lines in their original order.
+"""
+import json
+import logging
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+PROMPT_RESERVE = 300  # instructions and separators around the sections
+
+_BOILERPLATE = [re.compile(p, re.IGNORECASE) for p in (
+    r"^page \d+( of \d+)?$",
+    r"^\d+\s*/\s*\d+$",
+    r"^references (are )?available (up)?on request\.?$",
+    r"^(curriculum vitae|resume|résumé|cv)$",
+    r"^[\W_]+$",
+    r"^[^.]*equal (employment )?opportunity employer[^.]*\.?$",
+    r"^(apply now|share this job|save job|report this job)\.?$",
+)]
+_WORD = re.compile(r"[a-z0-9+#.]{2,}")
+_STOPWORDS = frozenset(
+    "and the for with you your our are will have from this that into about who what "
+    "can all any not but has was were been job role team work working company "
+    "including such other more well able within across per etc".split()
+)
+
+
+class Section(NamedTuple):
+    content: Union[str, dict, list]
+    query: str = ""  # text the section is ranked against; empty keeps the opening lines
+    max_tokens: Optional[int] = None
+
+
+def count_tokens(text: str) -> int:
+    """Cheap estimate (~4 characters per token) used for budgeting and size logs"""
+    return (len(text) + 3) // 4
+
+
+def budget_for(model: str) -> int:
+    """Input-token budget for `model` from PROMPT_TOKEN_BUDGETS (JSON) or PROMPT_TOKEN_BUDGET"""
+    budgets = json.loads(os.getenv("PROMPT_TOKEN_BUDGETS", "{}"))
+    return int(budgets.get(model, DEFAULT_BUDGET))
+
+
+def strip_indent(prompt: str) -> str:
+    """Drop the code indentation and blank lines that triple-quoted prompts carry"""
+    return "\n".join(line.strip() for line in prompt.splitlines() if line.strip())
+
+
+def compact_text(text: str) -> str:
+    """Collapse whitespace and drop boilerplate and repeated header/footer lines"""
+    lines = [" ".join(line.split()) for line in text.splitlines()]
+    counts = Counter(line for line in lines if line)
+    seen, kept = set(), []
+    for line in lines:
+        if not line or any(p.search(line) for p in _BOILERPLATE):
+            continue
+        if counts[line] >= 3 and line in seen:
+            continue  # page headers/footers repeated through the document
+        seen.add(line)
+        kept.append(line)
+    return "\n".join(kept)
+
+
+def _prune(value):
+    if isinstance(value, dict):
+        return {k: _prune(v) for k, v in value.items() if v not in (None, "", [], {})}
+    if isinstance(value, list):
+        return [_prune(v) for v in value if v not in (None, "", [], {})]
+    return value
+
+
+def compact_json(value) -> str:
+    """Serialize without indentation or empty fields"""
+    return json.dumps(_prune(value), separators=(",", ":"), ensure_ascii=False)
+
+
+def _terms(text: str) -> List[str]:
+    return [w.strip(".") for w in _WORD.findall(text.lower()) if w.strip(".") not in _STOPWORDS]
+
+
+def _scorer(query: str):
+    wanted = set(_terms(query))
+
+    def score(text: str) -> float:
+        terms = _terms(text)
+        if not terms:
+            return 0.0
+        return sum(1 for t in terms if t in wanted) / math.sqrt(len(terms))
+    return score
+
+
+_SENTENCE_END = re.compile(r"(?<=[.!?;])\s+")
+LONG_LINE_TOKENS = 60  # lines above this are ranked sentence by sentence
+
+
+def _truncate(text: str, budget: int) -> str:
+    """Cut `text` at a word boundary so it fits `budget` tokens"""
+    limit = max(budget, 0) * 4
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(" ", 1)[0] or text[:limit]
+
+
+def _units(lines: List[str]) -> List[tuple]:
+    """(line index, text) per rankable unit; long lines (one-paragraph job ads) become sentences"""
+    units = []
+    for i, line in enumerate(lines):
+        parts = _SENTENCE_END.split(line) if count_tokens(line) > LONG_LINE_TOKENS else [line]
+        units.extend((i, part) for part in parts if part)
+    return units
+
+
+def trim_text(text: str, budget: int, query: str = "", keep_head: int = 3) -> str:
+    """Keep the most relevant lines (or sentences of long lines) that fit `budget` tokens, in their original order"""
+    if count_tokens(text) <= budget:
+        return text
+    units = _units(text.splitlines())
+    if not query:
+        order = list(range(len(units)))
+    else:
+        score = _scorer(query)
+        rest = sorted(range(keep_head, len(units)), key=lambda u: -score(units[u][1]))
+        order = list(range(min(keep_head, len(units)))) + rest
+    chosen, used = {}, 0
+    for u in order:
+        cost = count_tokens(units[u][1]) + 1
+        if used + cost > budget:
+            if not query:
+                # Opening lines only: cut the one that overflows rather than dropping it
+                if budget - used > 1:
+                    chosen[u] = _truncate(units[u][1], budget - used - 1)
+                break
+            continue
+        chosen[u] = units[u][1]
+        used += cost
+    if not chosen and order:
+        chosen[order[0]] = _truncate(units[order[0]][1], budget - 1)
+
+    lines, current = [], None
+    for u in sorted(chosen):
+        line_no = units[u][0]
+        if line_no == current:
+            lines[-1] += " " + chosen[u]
+        else:
+            lines.append(chosen[u])
+            current = line_no
+    return "\n".join(line for line in lines if line)
+
+
+def _shorten_longest_string(value, query: str) -> bool:
+    """Halve the longest string in `value` in place (by relevance for text); False if there is none"""
+    longest = None
+    stack = [value]
+    while stack:
+        node = stack.pop()
+        items = node.items() if isinstance(node, dict) else enumerate(node) if isinstance(node, list) else ()
+        for key, item in items:
+            if isinstance(item, str):
+                if longest is None or len(item) > len(longest[0][longest[1]]):
+                    longest = (node, key)
+            elif isinstance(item, (dict, list)):
+                stack.append(item)
+    if longest is None or count_tokens(longest[0][longest[1]]) < 8:
+        return False
+    node, key = longest
+    node[key] = trim_text(node[key], count_tokens(node[key]) // 2, query)
+    return True
+
+
+def trim_json(value, budget: int, query: str = "") -> str:
+    """Drop the least relevant list entries (e.g. old jobs), then shorten long strings, until the JSON fits"""
+    value = _prune(value)
+    text = compact_json(value)
+    if count_tokens(text) <= budget:
+        return text
+    if isinstance(value, str):
+        return json.dumps(trim_text(value, max(budget - 2, 0), query), ensure_ascii=False)
+    score = _scorer(query)
+    lists = [value] if isinstance(value, list) else [items for items in value.values() if isinstance(items, list)] if isinstance(value, dict) else []
+    entries = sorted(
+        ((items, item) for items in lists for item in items),
+        key=lambda entry: score(json.dumps(entry[1]))
+    )
+    for items, item in entries:
+        if len(items) == 1:
+            continue  # keep the best entry of each list; long strings are shortened below
+        items.remove(item)
+        text = compact_json(value)
+        if count_tokens(text) <= budget:
+            return text
+    while count_tokens(text) > budget and _shorten_longest_string(value, query):
+        text = compact_json(value)
+    return text
+
+
+def fit_sections(model: str, reserve: int = PROMPT_RESERVE, **sections: Section) -> Dict[str, str]:
+    """Compact every section and trim them so that, with `reserve`, they fit `model`'s budget.
+
+    The budget is water-filled: small sections keep everything and the
+    remainder is shared evenly between the larger ones.
+    """
+    compacted = {
+        name: compact_text(s.content) if isinstance(s.content, str) else compact_json(s.content)
+        for name, s in sections.items()
+    }
+    wanted = {
+        name: min(count_tokens(text), sections[name].max_tokens or count_tokens(text))
+        for name, text in compacted.items()
+    }
+    remaining = max(budget_for(model) - reserve, 0)
+    shares = {}
+    for i, name in enumerate(sorted(wanted, key=wanted.get)):
+        shares[name] = min(wanted[name], remaining // (len(wanted) - i))
+        remaining -= shares[name]
+
+    fitted = {}
+    for name, section in sections.items():
+        if count_tokens(compacted[name]) <= shares[name]:
+            fitted[name] = compacted[name]
+        elif isinstance(section.content, str):
+            fitted[name] = trim_text(compacted[name], shares[name], section.query)
+        else:
+            fitted[name] = trim_json(section.content, shares[name], section.query)
+    before = sum(count_tokens(s.content if isinstance(s.content, str) else json.dumps(s.content, indent=2))
+                 for s in sections.values())
+    after = sum(count_tokens(text) for text in fitted.values())
+    logger.info(f"Prompt sections for {model}: ~{before} -> ~{after} tokens (budget {budget_for(model)})")
+    return fitted
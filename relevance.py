@@ -0,0 +1,116 @@
+"""Local BM25 ranking of CV items against a job description.
+
+`select_relevant` keeps only the experience entries, bullets and skills of a
+structured CV that score best against the job description, so the letter
+prompt carries the few qualifications worth highlighting instead of the
+whole resume. Scoring is a single NumPy pass over a term-frequency matrix.
+"""
+import logging
+import os
+import re
+import time
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9+#]*(?:\.[a-z0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it of on or our the their this to we will with "
+    "you your who what experience years year work working team role job".split()
+)
+_BULLET_SPLIT = re.compile(r"\n+|(?<=[.;])\s+(?=[A-Z])")
+
+TOP_EXPERIENCE = int(os.getenv("RELEVANCE_TOP_EXPERIENCE", "3"))
+TOP_BULLETS = int(os.getenv("RELEVANCE_TOP_BULLETS", "4"))
+TOP_SKILLS = int(os.getenv("RELEVANCE_TOP_SKILLS", "10"))
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def bm25_scores(documents: Sequence[str], query: str, k1: float = 1.5, b: float = 0.75) -> np.ndarray:
+    """BM25 score of every document for `query`, computed over one tf matrix"""
+    docs = [tokenize(d) for d in documents]
+    query_terms = tokenize(query)
+    if not docs or not query_terms:
+        return np.zeros(len(docs))
+    vocab = {term: i for i, term in enumerate(dict.fromkeys(query_terms))}
+    rows, cols = [], []
+    for row, tokens in enumerate(docs):
+        for token in tokens:
+            col = vocab.get(token)
+            if col is not None:
+                rows.append(row)
+                cols.append(col)
+    tf = np.zeros((len(docs), len(vocab)))
+    np.add.at(tf, (np.array(rows, dtype=int), np.array(cols, dtype=int)), 1.0)
+
+    lengths = np.array([len(tokens) for tokens in docs], dtype=float)
+    avg_length = lengths.mean() or 1.0
+    df = np.count_nonzero(tf, axis=0)
+    idf = np.log1p((len(docs) - df + 0.5) / (df + 0.5))
+    query_weight = np.bincount([vocab[t] for t in query_terms], minlength=len(vocab))
+
+    norm = k1 * (1 - b + b * lengths / avg_length)
+    return (tf * (k1 + 1) / (tf + norm[:, None])) @ (idf * query_weight)
+
+
+def _top(items: list, scores: np.ndarray, k: int) -> list:
+    """The k best-scoring items, kept in their original order"""
+    if len(items) <= k:
+        return list(items)
+    keep = np.sort(np.argsort(-scores, kind="stable")[:k])
+    return [items[i] for i in keep]
+
+
+def _text(value) -> str:
+    if isinstance(value, dict):
+        return " ".join(_text(v) for v in value.values())
+    if isinstance(value, list):
+        return " ".join(_text(v) for v in value)
+    return str(value)
+
+
+def _trim_bullets(entry, query: str, k: int):
+    """Keep the k most relevant bullets of an experience entry"""
+    if not isinstance(entry, dict):
+        return entry
+    trimmed = dict(entry)
+    for key, value in entry.items():
+        if isinstance(value, list) and all(isinstance(v, str) for v in value):
+            bullets = value
+        elif isinstance(value, str) and len(value) > 300:
+            bullets = [s.strip() for s in _BULLET_SPLIT.split(value) if s.strip()]
+        else:
+            continue
+        kept = _top(bullets, bm25_scores(bullets, query), k)
+        trimmed[key] = kept if isinstance(value, list) else " ".join(kept)
+    return trimmed
+
+
+def _rank_skills(skills, query: str, k: int):
+    if isinstance(skills, dict):
+        return {name: _rank_skills(group, query, k) for name, group in skills.items()}
+    if isinstance(skills, list):
+        return _top(skills, bm25_scores([_text(s) for s in skills], query), k)
+    return skills
+
+
+def select_relevant(cv_json: Dict, jd_text: str, k_experience: int = TOP_EXPERIENCE,
+                    k_bullets: int = TOP_BULLETS, k_skills: int = TOP_SKILLS) -> Dict:
+    """Copy of `cv_json` reduced to the top-k experience entries, bullets and skills for the JD"""
+    if not isinstance(cv_json, dict) or not jd_text:
+        return cv_json
+    started = time.perf_counter()
+    selected = dict(cv_json)
+    experience = cv_json.get("experience")
+    if isinstance(experience, list) and experience:
+        kept = _top(experience, bm25_scores([_text(e) for e in experience], jd_text), k_experience)
+        selected["experience"] = [_trim_bullets(entry, jd_text, k_bullets) for entry in kept]
+    if "skills" in cv_json:
+        selected["skills"] = _rank_skills(cv_json["skills"], jd_text, k_skills)
+    logger.debug(f"Ranked CV items against the job description in {(time.perf_counter() - started) * 1000:.1f}ms")
+    return selected
@@ -1,10 +1,24 @@
 import os
 import json
+import logging
 from io import StringIO
-from celery import Celery
-from pdfminer.high_level import extract_text_to_fp
+from celery import Celery, signature
+from celery.result import AsyncResult
 from io import BytesIO, StringIO
-from pdfminer.layout import LAParams
+from cv_cache import ExtractionCache, extract_pdf_text, extraction_cache
+from cv_store import structured_cv_store
+from blob_store import blob_store
+from letter_stream import open_publisher
+from llm_cache import cached_completion
+from llm_gateway import llm_gateway
+import fake_llm
+import llm_cache
+import metrics
+import profiling
+import routing
+from metrics import StageTimer
+from prompt_budget import Section, compact_json, fit_sections, strip_indent
+from relevance import select_relevant
 import google.generativeai as genai
 import base64 
 from datetime import datetime  # For timestamps
@@ -14,6 +28,8 @@ from datetime import datetime  # For timestamps
 from dotenv import load_dotenv
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # --- Celery Configuration ---
 # Assumes Redis is running locally on the default port.
 # celery_app = Celery('tasks', 
@@ -37,6 +53,16 @@ celery_app = Celery(
 )
 celery_app.conf.result_extended = True
 celery_app.conf.broker_connection_retry_on_startup = True
+routing.install_routes(celery_app)
+
+metrics.install_celery_metrics(celery_app)
+metrics.observe_gateway(llm_gateway)
+metrics.observe_cache("llm", llm_cache)
+metrics.observe_cache("cv_text", extraction_cache)
+metrics.observe_cache("cv_json", structured_cv_store)
+
+profile_store = profiling.LocalProfileStore(os.getenv("PROFILE_DIR", "cv_debug/profiles"))
+profiling.install_task_profiler(celery_app, profile_store)
 # celery_app.conf.update(
     
 #     result_extended=True,
@@ -50,7 +76,12 @@ celery_app.conf.broker_connection_retry_on_startup = True
 # )
 # --- LLM Configuration ---
 # The API key is read from the environment variable set before running the app.
-genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+# LLM_BACKEND=fake swaps Gemini for the offline stand-in used by benchmarks and CI
+if fake_llm.enabled():
+    GenerativeModel = fake_llm.FakeGenerativeModel
+else:
+    genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+    GenerativeModel = genai.GenerativeModel
 
 # --- Agent Implementations ---
 
@@ -72,9 +103,7 @@ def parse_cv_content(cv_content: str) -> str:
         
         # Check if it's a PDF
         if cv_bytes.startswith(b'%PDF-'):
-            output = StringIO()
-            extract_text_to_fp(BytesIO(cv_bytes), output, laparams=LAParams())
-            return output.getvalue()
+            return extract_pdf_text(cv_bytes)
             
         # Fallback: Try text decoding
         try:
@@ -85,40 +114,59 @@ def parse_cv_content(cv_content: str) -> str:
     except Exception as e:
         raise ValueError(f"CV processing failed: {str(e)}")
 
-def rewrite_cv_for_clarity(cv_text: str, jd_text: str) -> dict:
+def _clean_json(text: str) -> str:
+    return text.strip().replace('```json', '').replace('```', '')
+
+def _is_json(text: str) -> bool:
+    try:
+        json.loads(_clean_json(text))
+        return True
+    except ValueError:
+        return False
+
+def rewrite_cv_for_clarity(cv_text: str, jd_text: str, bypass_cache: bool = False) -> dict:
     """
     Uses an LLM to extract structured data from the CV text.
     Corresponds to the 'CV Rewriter Agent'[cite: 9].
     """
-    model = genai.GenerativeModel('gemini-1.5-flash')
-    prompt = f"""
+    model = GenerativeModel('gemini-1.5-flash')
+    parts = fit_sections('gemini-1.5-flash', cv=Section(cv_text, jd_text), jd=Section(jd_text, max_tokens=125))
+    prompt = strip_indent(f"""
     Analyze the following resume and extract key information into a structured JSON format.
-    Focus on details relevant to this job description: {jd_text[:500]}...
+    Focus on details relevant to this job description: {parts['jd']}
 
     Resume Text:
     ---
-    {cv_text}
+    {parts['cv']}
     ---
 
     Output only a JSON object with keys: "name", "contact", "summary", "experience", and "skills".
-    """
+    """)
     try:
-        response = model.generate_content(prompt)
+        response_text = cached_completion(
+            'gemini-1.5-flash', prompt,
+            lambda: llm_gateway.call('gemini-1.5-flash', prompt, lambda: model.generate_content(prompt).text),
+            bypass_cache=bypass_cache, validate=_is_json
+        )
         # A simple way to clean and parse the JSON from the LLM response
-        json_str = response.text.strip().replace('```json', '').replace('```', '')
-        return json.loads(json_str)
+        return json.loads(_clean_json(response_text))
     except (json.JSONDecodeError, ValueError):
          # Fallback for when the LLM response isn't valid JSON
         return {"error": "Failed to parse CV into JSON", "raw_cv": cv_text}
 
 
-def generate_cover_letter_text(cv_json: dict, jd_text: str, tone: str) -> str:
+def generate_cover_letter_text(cv_json: dict, jd_text: str, tone: str, bypass_cache: bool = False, on_chunk=None) -> str:
     """
     Generates the cover letter text using the structured CV data.
     Corresponds to the 'Cover Letter Writer'[cite: 9].
     """
-    model = genai.GenerativeModel('gemini-1.5-flash') # As specified in the tech stack [cite: 27]
-    prompt = f"""
+    model = GenerativeModel('gemini-1.5-flash') # As specified in the tech stack [cite: 27]
+    parts = fit_sections(
+        'gemini-1.5-flash',
+        jd=Section(jd_text, compact_json(cv_json)),
+        cv=Section(select_relevant(cv_json, jd_text), jd_text)
+    )
+    prompt = strip_indent(f"""
     You are a professional career coach writing a compelling cover letter.
 
     **Instructions:**
@@ -131,29 +179,82 @@ def generate_cover_letter_text(cv_json: dict, jd_text: str, tone: str) -> str:
 
     **Job Description:**
     ---
-    {jd_text}
+    {parts['jd']}
     ---
 
     **Candidate's Resume Data (JSON):**
     ---
-    {json.dumps(cv_json, indent=2)}
+    {parts['cv']}
     ---
 
     **Cover Letter:**
+    """)
+    def generate() -> str:
+        if on_chunk is None:
+            return model.generate_content(prompt).text
+        # Stream so the first words reach the client while the rest is generated
+        parts = []
+        for chunk in model.generate_content(prompt, stream=True):
+            if chunk.text:
+                parts.append(chunk.text)
+                on_chunk(chunk.text)
+        return "".join(parts)
+
+    return cached_completion(
+        'gemini-1.5-flash', prompt,
+        lambda: llm_gateway.call('gemini-1.5-flash', prompt, generate),
+        bypass_cache=bypass_cache
+    )
+
+# --- CPU stage ---
+@celery_app.task(bind=True, time_limit=120, acks_late=True)
+def extract_cv_text(self, cv_content, then: dict):
+    """Lay out the CV (CPU queue) and queue `then` with the text passed in as `cv`.
+
+    `then` always runs: when extraction failed it gets cv=None, extracts itself
+    and reports the failure through its own retries.
     """
-    response = model.generate_content(prompt)
-    return response.text
+    stages = StageTimer(self.name)
+    cv = None
+    try:
+        stages.enter('extracting_text')
+        cv_bytes, resume_hash = load_cv_bytes(cv_content)
+        if len(cv_bytes) == 0:
+            raise ValueError("Empty CV content received")
+        cv = {"cv_key": resume_hash, "cv_text": extract_text_from_cv(cv_bytes, "cv_debug", self.request.id, resume_hash)}
+    except Exception as e:
+        logger.warning(f"CV extraction stage failed, leaving it to the next stage: {str(e)}")
+    finally:
+        stages.close()
+    then = signature(then, app=celery_app)
+    # `then` is immutable (.si), so the keyword goes onto it directly
+    then.kwargs["cv"] = cv
+    then.apply_async()
+
+def after_cv_extraction(cv_content, then) -> AsyncResult:
+    """Queue extract_cv_text (CPU queue) -> `then` (I/O queue); `then` gets the text as `cv`.
+
+    The task id of `then` is fixed here, so the result can be handed out before it is queued.
+    """
+    result = then.freeze()
+    extract_cv_text.s(cv_content, then).apply_async()
+    return result
 
 # --- Main Celery Task ---
 @celery_app.task(bind=True, max_retries=3, time_limit=300, acks_late=True)
-def generation_pipeline_task(self, job_description: str, cv_content: str, tone: str):
+def generation_pipeline_task(self, job_description: str, cv_content, tone: str, bypass_cache: bool = False, stream: bool = False, cv: dict = None):
     """
     Ultimate cover letter generation pipeline with:
     - Multi-format CV support (PDF, text, docx)
     - Comprehensive error handling
     - Detailed debugging
     - Automatic fallbacks
+    - Optional token streaming to /stream/{task_id}
+    - cv_content is a blob-store ref for uploads or a base64 string
+    - cv carries the text when extract_cv_text already laid the CV out
     """
+    publisher = open_publisher(self.request.id, stream)
+    stages = StageTimer(self.name)
     try:
         # Debug setup
         debug_dir = "cv_debug"
@@ -163,27 +264,51 @@ def generation_pipeline_task(self, job_description: str, cv_content: str, tone:
         
         # 1. Decode and validate input
         self.update_state(state='PROGRESS', meta={'stage': 'validating_input'})
+        stages.enter('validating_input')
+        publisher.stage('validating_input')
         try:
-            cv_bytes = base64.b64decode(cv_content)
-            with open(debug_path, "wb") as f:
-                f.write(cv_bytes)
-                
-            if len(cv_bytes) == 0:
-                raise ValueError("Empty CV content received")
+            if cv is not None:
+                # extract_cv_text already decoded and laid out the CV
+                cv_bytes, resume_hash = None, cv["cv_key"]
+            else:
+                cv_bytes, resume_hash = load_cv_bytes(cv_content)
+                if len(cv_bytes) == 0:
+                    raise ValueError("Empty CV content received")
+            if isinstance(cv_content, dict):
+                # The blob store already keeps the upload; no second copy needed
+                debug_path = f"{blob_store.backend}:{cv_content['key']}"
+            elif cv_bytes is not None:
+                with open(debug_path, "wb") as f:
+                    f.write(cv_bytes)
         except Exception as e:
             raise ValueError(f"CV content decoding failed: {str(e)}")
 
         # 2. Determine content type and extract text
         self.update_state(state='PROGRESS', meta={'stage': 'extracting_text'})
-        cv_text = extract_text_from_cv(cv_bytes, debug_dir, task_id)
+        stages.enter('extracting_text')
+        publisher.stage('extracting_text')
+        cv_text = cv["cv_text"] if cv is not None else extract_text_from_cv(cv_bytes, debug_dir, task_id, resume_hash)
         
         # 3. Analyze CV content
         self.update_state(state='PROGRESS', meta={'stage': 'analyzing_cv'})
-        cv_json = analyze_cv_content(cv_text, job_description)
+        stages.enter('analyzing_cv')
+        publisher.stage('analyzing_cv')
+        # No user id reaches this pipeline, so the resume hash doubles as the owner key
+        cv_json = structured_cv_store.get_or_create(
+            resume_hash, resume_hash,
+            lambda: analyze_cv_content(cv_text, job_description, bypass_cache),
+            refresh=bypass_cache
+        )
         
         # 4. Generate cover letter
         self.update_state(state='PROGRESS', meta={'stage': 'generating_letter'})
-        cover_letter = generate_cover_letter_text(cv_json, job_description, tone)
+        stages.enter('generating_letter')
+        publisher.stage('generating_letter')
+        cover_letter = generate_cover_letter_text(
+            cv_json, job_description, tone, bypass_cache,
+            on_chunk=publisher.chunk if stream else None
+        )
+        publisher.done(cover_letter)
         
         return {
             "status": "success",
@@ -198,24 +323,38 @@ def generation_pipeline_task(self, job_description: str, cv_content: str, tone:
             f.write(f"Error: {error_msg}\n")
             f.write(f"Job Description: {job_description[:200]}\n")
             f.write(f"CV Content Type: {type(cv_content)}\n")
-            f.write(f"CV Content Sample: {cv_content[:200]}\n")
+            f.write(f"CV Content Sample: {str(cv_content)[:200]}\n")
         
         if self.request.retries == self.max_retries:
+            publisher.error(error_msg)
             return {
                 "status": "failed",
                 "error": error_msg,
                 "debug_path": debug_path
             }
+        publisher.reset()
+        publisher.stage('retrying')
         raise self.retry(exc=e, countdown=min(300, 60 * (2 ** self.request.retries)))
+    finally:
+        stages.close()
+
+def load_cv_bytes(cv_content):
+    """Resolve the task's CV argument to (bytes, resume hash).
+
+    Uploads arrive as a blob-store ref (content hash included); profile CVs
+    still arrive base64-encoded and are decoded and hashed here, once.
+    """
+    if isinstance(cv_content, dict):
+        return blob_store.get(cv_content["key"]), cv_content["key"]
+    cv_bytes = base64.b64decode(cv_content)
+    return cv_bytes, ExtractionCache.key_for(cv_bytes)
 
-def extract_text_from_cv(cv_bytes: bytes, debug_dir: str, task_id: str) -> str:
+def extract_text_from_cv(cv_bytes: bytes, debug_dir: str, task_id: str, resume_hash: str = None) -> str:
     """Universal CV text extractor with multiple fallbacks"""
     try:
         # Try PDF first
         if cv_bytes.startswith(b'%PDF-'):
-            output = StringIO()
-            extract_text_to_fp(BytesIO(cv_bytes), output, laparams=LAParams())
-            return output.getvalue()
+            return extract_pdf_text(cv_bytes, resume_hash)
         
         # Try text decoding
         try:
@@ -238,10 +377,10 @@ def extract_text_from_cv(cv_bytes: bytes, debug_dir: str, task_id: str) -> str:
     except Exception as e:
         raise ValueError(f"Text extraction failed: {str(e)}")
 
-def analyze_cv_content(cv_text: str, job_description: str) -> dict:
+def analyze_cv_content(cv_text: str, job_description: str, bypass_cache: bool = False) -> dict:
     """CV analysis with improved error handling"""
     try:
-        cv_json = rewrite_cv_for_clarity(cv_text, job_description)
+        cv_json = rewrite_cv_for_clarity(cv_text, job_description, bypass_cache)
         if "error" in cv_json:
             raise ValueError(cv_json["error"])
         return cv_json